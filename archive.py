@@ -0,0 +1,407 @@
+import os
+import json
+import gzip
+import time
+import uuid
+import zlib
+import logging
+import threading
+import requests
+from contextlib import contextmanager
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from sessions import ConnectionStats
+from scheduler import HostScheduler
+
+# Headers which describe encoding of the body on the wire, body in archive is already decoded
+_WIRE_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+_REVISIT_PROFILE = 'http://netpreserve.org/warc/1.0/revisit/server-not-modified'
+
+
+class CrawlArchive:
+    """
+    Append-only archive of raw responses in WARC format, so extraction can be replayed offline.
+    Each record (status line, headers and body of a response, or html rendered in browser) is a separate gzip
+    member of a .warc.gz segment, so a record can be read without reading the whole segment.
+    Each segment has an index (.cdx.jsonl) with offsets of its records. Segments are never rewritten:
+    each run appends new segments and the latest record of each page wins.
+    """
+
+    def __init__(self, path, max_segment=1024 * 2 ** 20):
+        """
+        Creates the instance of archive. Records of previous runs are indexed, new segment is started lazily
+        :param path: Path to the folder of the archive
+        :param max_segment: Size of segment in bytes after which the next segment is started
+        """
+        self.path = path
+        self.max_segment = max_segment
+
+        self.recorded = {'response': 0, 'revisit': 0, 'resource': 0}
+        self.recorded_bytes = 0
+        self.read = 0
+        self.missing = 0
+
+        # Latest record of each page in format {(type of record, url): (segment, offset, length)}
+        self.__entries = {}
+
+        self.__segment = None
+        self.__warc = None
+        self.__index = None
+        self.__segments = 0
+        self.__lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        self.__load()
+
+    def record(self, url, response):
+        """
+        Appends response to the archive. Response 304 is appended as revisit of the previously archived page
+        :param url: Requested URL of the page
+        :param response: Response with downloaded content
+        :return: None
+        """
+        revisit = response.status_code == 304
+
+        # Body is stored decoded, so headers of wire encoding are dropped and length is set to the decoded one
+        body = b'' if revisit else response.content
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() not in _WIRE_HEADERS]
+        headers.append(('Content-Length', str(len(body))))
+
+        http = f'HTTP/1.1 {response.status_code} {response.reason or ""}\r\n'
+        http += ''.join(f'{name}: {value}\r\n' for name, value in headers)
+        block = http.encode('latin-1', errors='replace') + b'\r\n' + body
+
+        if revisit:
+            self.__append('revisit', url, block, 'application/http; msgtype=response',
+                          {'WARC-Profile': _REVISIT_PROFILE})
+        else:
+            self.__append('response', url, block, 'application/http; msgtype=response')
+
+    def record_render(self, url, html):
+        """
+        Appends html of the page rendered in browser to the archive
+        :param url: URL of the page
+        :param html: Html of rendered page
+        :return: None
+        """
+        self.__append('resource', url, html.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def has(self, url):
+        """
+        Checks if response of the page is archived
+        :param url: URL of the page
+        :return: True if archive has response of the page
+        """
+        with self.__lock:
+            return ('response', url) in self.__entries
+
+    def response(self, url):
+        """
+        Reads the latest archived response of the page. If the page was only rendered in browser
+        (e.g. its host was switched to browser earlier than in this run), rendered html is returned as response 200
+        :param url: URL of the page
+        :return: response with content, or None if page isn't archived
+        """
+        kind, block = self.__read(('response', 'resource'), url)
+        if block is None:
+            return None
+
+        if kind == 'resource':
+            return self.__response(url, b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n' + block)
+
+        return self.__response(url, block)
+
+    def render(self, url):
+        """
+        Reads the latest archived html of the page rendered in browser. If the page was only downloaded
+        (e.g. its host was switched to browser later than in this run), downloaded html is returned
+        :param url: URL of the page
+        :return: html, or None if page isn't archived
+        """
+        kind, block = self.__read(('resource', 'response'), url)
+        if block is None:
+            return None
+
+        return self.__response(url, block).text if kind == 'response' else block.decode('utf-8')
+
+    def summary(self):
+        """
+        Returns counters of the archive
+        :return: dict with numbers of recorded records of each type, recorded bytes, read and missing records
+                 and number of archived pages
+        """
+        with self.__lock:
+            return {**self.recorded,
+                    'recorded_bytes': self.recorded_bytes,
+                    'read': self.read,
+                    'missing': self.missing,
+                    'pages': len(self.__entries)}
+
+    def report(self):
+        """
+        Prints out and logs counters of the archive
+        :return: None
+        """
+        summary = self.summary()
+        logging.info(f'[Crawl Archive] {summary["response"]} responses, {summary["revisit"]} revisits, '
+                     f'{summary["resource"]} rendered pages recorded ({summary["recorded_bytes"] / 2 ** 20:.1f} MB), '
+                     f'{summary["read"]} records read, {summary["missing"]} missing, {summary["pages"]} pages archived.')
+
+    def flush(self):
+        """
+        Writes buffered records and their index to disk
+        :return: None
+        """
+        with self.__lock:
+            # Index never points behind the end of the written segment
+            if self.__warc:
+                self.__warc.flush()
+                self.__index.flush()
+
+    def close(self):
+        """
+        Closes the current segment
+        :return: None
+        """
+        with self.__lock:
+            if self.__warc:
+                self.__warc.close()
+                self.__index.close()
+                self.__warc = self.__index = None
+
+    def __append(self, kind, url, block, content_type, fields=None):
+        """
+        Appends record as a separate gzip member of the current segment and adds it to the index
+        :param kind: Type of WARC record: response, revisit or resource
+        :param url: URL of the page
+        :param block: Content block of the record
+        :param content_type: Content type of the block
+        :param fields: Additional WARC header fields
+        :return: None
+        """
+        header = {'WARC-Type': kind,
+                  'WARC-Record-ID': f'<urn:uuid:{uuid.uuid4()}>',
+                  'WARC-Date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                  'WARC-Target-URI': url,
+                  **(fields or {}),
+                  'Content-Type': content_type,
+                  'Content-Length': str(len(block))}
+
+        # Compressed outside of the lock, so scrapers record their pages at the same time
+        data = gzip.compress(b'WARC/1.0\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in header.items())
+                             .encode('utf-8') + b'\r\n' + block + b'\r\n\r\n')
+
+        with self.__lock:
+            if self.__warc is None or self.__warc.tell() + len(data) > self.max_segment:
+                self.__start_segment()
+
+            offset = self.__warc.tell()
+            self.__warc.write(data)
+            self.__index.write(json.dumps({'url': url, 'type': kind, 'offset': offset, 'length': len(data)}) + '\n')
+
+            if kind != 'revisit':
+                self.__entries[(kind, url)] = (self.__segment, offset, len(data))
+            self.recorded[kind] += 1
+            self.recorded_bytes += len(data)
+
+    def __read(self, kinds, url):
+        """
+        Reads content block of the latest record of the page
+        :param kinds: Types of WARC records in order of preference: response or resource
+        :param url: URL of the page
+        :return: tuple (type of the record, content block), or (None, None) if page isn't archived
+        """
+        with self.__lock:
+            kind, entry = next(((kind, self.__entries[(kind, url)]) for kind in kinds if (kind, url) in self.__entries),
+                               (None, None))
+
+            if entry is None:
+                self.missing += 1
+                return None, None
+            self.read += 1
+
+            # Record from the current segment may be still buffered
+            if self.__warc and entry[0] == self.__segment:
+                self.__warc.flush()
+
+        segment, offset, length = entry
+        with open(os.path.join(self.path, segment), 'rb') as f:
+            f.seek(offset)
+            record = gzip.decompress(f.read(length))
+
+        head, _, rest = record.partition(b'\r\n\r\n')
+        length = next(int(line.split(b':', 1)[1]) for line in head.split(b'\r\n')
+                      if line.lower().startswith(b'content-length:'))
+        return kind, rest[:length]
+
+    @staticmethod
+    def __response(url, block):
+        """
+        Creates response from archived status line, headers and body. Content is already read,
+        so response is handled the same way as downloaded one
+        :param url: URL of the page
+        :param block: Content block of response record
+        :return: response
+        """
+        head, _, body = block.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        _, status, *reason = status_line.split(' ', 2)
+
+        r = requests.Response()
+        r.url = url
+        r.status_code = int(status)
+        r.reason = reason[0] if reason else ''
+        r.headers = CaseInsensitiveDict(line.split(': ', 1) for line in header_lines if ': ' in line)
+        r.encoding = get_encoding_from_headers(r.headers)
+        r._content = body
+        r._content_consumed = True
+        return r
+
+    def __start_segment(self):
+        """
+        Closes the current segment and starts the next one, lock should be held by caller
+        :return: None
+        """
+        if self.__warc:
+            self.__warc.close()
+            self.__index.close()
+
+        self.__segments += 1
+        self.__segment = f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{self.__segments:05d}.warc.gz'
+
+        self.__warc = open(os.path.join(self.path, self.__segment), 'ab')
+        self.__index = open(os.path.join(self.path, self.__segment[:-len('.warc.gz')] + '.cdx.jsonl'), 'at')
+
+    def __load(self):
+        """
+        Indexes records of segments written by previous runs, from the oldest to the latest.
+        Segments without index (e.g. copied from other crawler) are scanned
+        :return: None
+        """
+        for segment in sorted(name for name in os.listdir(self.path) if name.endswith('.warc.gz')):
+            index = os.path.join(self.path, segment[:-len('.warc.gz')] + '.cdx.jsonl')
+
+            try:
+                if os.path.exists(index):
+                    with open(index, 'rt') as f:
+                        entries = [json.loads(line) for line in f if line.strip()]
+                else:
+                    entries = self.__scan(segment)
+            except (OSError, ValueError, zlib.error) as e:
+                logging.warning(f'[Crawl Archive] Segment <{segment}> wasn\'t indexed: {e}.')
+                continue
+
+            for entry in entries:
+                if entry['type'] in ('response', 'resource'):
+                    self.__entries[(entry['type'], entry['url'])] = (segment, entry['offset'], entry['length'])
+
+    def __scan(self, segment):
+        """
+        Finds offsets of records of the segment by decompressing its gzip members one by one
+        :param segment: Name of the segment
+        :return: list of entries in format {'url': .., 'type': .., 'offset': .., 'length': ..}
+        """
+        with open(os.path.join(self.path, segment), 'rb') as f:
+            data = f.read()
+
+        entries = []
+        offset = 0
+        while offset < len(data):
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            record = decompressor.decompress(data[offset:])
+            length = len(data) - offset - len(decompressor.unused_data)
+
+            fields = dict(line.split(': ', 1) for line in record.partition(b'\r\n\r\n')[0].decode('utf-8').split('\r\n')
+                          if ': ' in line)
+            if 'WARC-Target-URI' in fields:
+                entries.append({'url': fields['WARC-Target-URI'], 'type': fields.get('WARC-Type'), 'offset': offset,
+                                'length': length})
+            offset += length
+
+        return entries
+
+
+class ReplaySession:
+    """
+    Session which answers requests with responses from the archive instead of sending them
+    """
+
+    def __init__(self, archive):
+        """
+        Creates the instance of replay session
+        :param archive: Archive of recorded responses
+        """
+        self.archive = archive
+        self.stats = ConnectionStats()
+
+    def get(self, url, **kwargs):
+        """
+        Reads archived response of the page
+        :param url: URL of the page
+        :param kwargs: Ignored, used by SessionPool only
+        :return: response
+        """
+        r = self.archive.response(url)
+
+        # Page which wasn't recorded is handled as unreachable
+        if r is None:
+            raise requests.exceptions.ConnectionError(f'Page <{url}> isn\'t archived!')
+
+        return r
+
+    def close(self):
+        pass
+
+
+class ReplayBrowsers:
+    """
+    Pool of browsers which returns pages rendered by recorded run instead of rendering them
+    """
+
+    def __init__(self, archive):
+        """
+        Creates the instance of replay browsers
+        :param archive: Archive of recorded pages
+        """
+        self.archive = archive
+
+    def render(self, url):
+        """
+        Reads archived html of the page rendered in browser
+        :param url: URL of the page
+        :return: html of rendered page
+        """
+        html = self.archive.render(url)
+
+        if html is None:
+            raise requests.exceptions.ConnectionError(f'Rendered page <{url}> isn\'t archived!')
+
+        return html
+
+    def close(self):
+        pass
+
+
+class ReplayScheduler(HostScheduler):
+    """
+    Scheduler of replayed crawl. Responses are read from disk, so requests are neither paced nor retried
+    """
+
+    def __init__(self):
+        """
+        Creates the instance of scheduler
+        """
+        super().__init__(retries=0)
+
+    @contextmanager
+    def slot(self, url):
+        yield
+
+    def succeeded(self, url, latency):
+        pass
+
+    def failed(self, url, attempt, retry_after=None, throttled=False):
+        return 0.0
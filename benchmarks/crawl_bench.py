@@ -0,0 +1,232 @@
+"""
+End-to-end benchmark of web scrapers against the local fixture server.
+
+Each scraper is run by the crawl runner in its own process, so peak memory and CPU time belong to one scraper.
+Reports pages/sec, p50/p95 latency of requests, peak RSS and CPU time, and flags regressions against
+the stored baseline.
+
+Usage: python -m benchmarks.crawl_bench [--sources tudelft,fontys] [--latency 0.05] [--forbidden 0.05]
+                                        [--timeouts 0.01] [--save-baseline] [--tolerance 0.15]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import statistics
+import threading
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.fixtures import FIXTURES_PATH
+from benchmarks.server import FixtureServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# Sources which are benchmarked by default
+SOURCES = ('tudelft', 'fontys', 'buas', 'boskalis', 'general')
+
+# Number of partners' websites and pages of each website in partners file for general web scraper
+PARTNERS = 8
+PARTNER_PAGES = 5
+
+# Metrics which are better when they are higher, all others are better when they are lower
+HIGHER_IS_BETTER = ('pages_per_sec',)
+
+# Smallest absolute change of metric which is reported as regression, smaller changes are noise of timer and scheduler
+MIN_CHANGE = {'pages_per_sec': 0.0, 'p95_ms': 10.0, 'peak_rss_mb': 5.0, 'cpu_sec': 0.1}
+
+
+class RewritingSession:
+    """
+    Session which sends requests for live websites to the fixture server and measures latency of each request
+    """
+
+    def __init__(self, session, base_url, timeout):
+        """
+        Creates the instance of session
+        :param session: Session which sends requests
+        :param base_url: Base URL of the fixture server
+        :param timeout: Timeout in seconds which replaces timeout of each request
+        """
+        self.session = session
+        self.base_url = base_url
+        self.timeout = timeout
+        self.stats = session.stats
+        self.latencies = []
+        self.__lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        parts = url.split('://', 1)[-1]
+        kwargs['timeout'] = self.timeout
+
+        start = time.perf_counter()
+        try:
+            return self.session.get(f'{self.base_url}/{parts}', **kwargs)
+        finally:
+            with self.__lock:
+                self.latencies.append(time.perf_counter() - start)
+
+    def close(self):
+        self.session.close()
+
+
+def write_partners(path):
+    """
+    Writes partners file with websites served by the fixture server
+    :param path: Path to the .xlsx file
+    :return: path to the file
+    """
+    import pandas as pd
+
+    rows = [(f'Partner {i}', f'https://partner{i}.example/en/page-{j}', 'EN')
+            for i in range(PARTNERS) for j in range(PARTNER_PAGES)]
+    pd.DataFrame(rows, columns=['Organization', 'Page', 'Language']).to_excel(path, index=False)
+    return path
+
+
+def bench_source(source, base_url, timeout=2.0, parse_workers=0, verbose=False):
+    """
+    Runs one scraper end to end against the fixture server. Runs in separate process
+    :param source: Name of the registered source
+    :param base_url: Base URL of the fixture server
+    :param timeout: Timeout of requests in seconds
+    :param parse_workers: Number of processes which parse pages
+    :param verbose: If True, output of the scraper is printed out
+    :return: dict with metrics
+    """
+    # Logs of the scrapers aren't written to app.log during benchmark
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    if not verbose:
+        sys.stdout = open(os.devnull, 'wt')
+
+    from runner import CrawlRunner
+    from sessions import SessionPool
+    from scheduler import HostScheduler
+    from browser import BrowserPool, StubDriver
+
+    with tempfile.TemporaryDirectory() as path:
+        session = RewritingSession(SessionPool(default_pool_size=16), base_url, timeout)
+        scheduler = HostScheduler(rate=1000.0, burst=100, concurrency=8, max_rate=1000.0, max_concurrency=16,
+                                  retries=1, backoff=0.05, max_backoff=0.5)
+        browsers = BrowserPool(size=2, max_pages=50, driver_factory=lambda: StubDriver(session))
+
+        runner = CrawlRunner(os.path.join(path, ''), [source], partners=write_partners(os.path.join(path, 'p.xlsx')),
+                             parse_workers=parse_workers, session=session, scheduler=scheduler, browsers=browsers)
+
+        cpu_start = os.times()
+        summary = runner.run()[source]
+        runner.close()
+        cpu_end = os.times()
+
+    latencies = sorted(session.latencies) or [0.0]
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+    return {'pages': summary['written'],
+            'requests': len(session.latencies),
+            'seconds': summary['seconds'],
+            'pages_per_sec': summary['written'] / summary['seconds'] if summary['seconds'] else 0.0,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+            'peak_rss_mb': peak_rss,
+            'cpu_sec': sum(cpu_end[:4]) - sum(cpu_start[:4]),
+            'error': str(summary['error']) if summary['error'] else None}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Finds regressions against the baseline
+    :param results: Results in format {source: metrics}
+    :param baseline: Baseline in the same format
+    :param tolerance: Allowed relative change, e.g. 0.15 for 15 %. Changes smaller than MIN_CHANGE are ignored
+    :return: list of regressions in format (source, metric, baseline value, current value)
+    """
+    regressions = []
+
+    for source, metrics in results.items():
+        for metric in ('pages_per_sec', 'p95_ms', 'peak_rss_mb', 'cpu_sec'):
+            before = baseline.get(source, {}).get(metric)
+            if not before:
+                continue
+
+            after = metrics[metric]
+            if abs(after - before) < MIN_CHANGE[metric]:
+                continue
+
+            if metric in HIGHER_IS_BETTER and after < before * (1 - tolerance):
+                regressions.append((source, metric, before, after))
+            elif metric not in HIGHER_IS_BETTER and after > before * (1 + tolerance):
+                regressions.append((source, metric, before, after))
+
+    return regressions
+
+
+def run(sources=SOURCES, path=FIXTURES_PATH, latency=0.0, jitter=0.0, forbidden=0.0, timeouts=0.0, timeout=2.0,
+        parse_workers=0, verbose=False):
+    """
+    Runs the benchmark of given sources and prints out metrics
+    :param sources: Names of registered sources
+    :param path: Path to the folder with fixture pages
+    :param latency: Delay in seconds added to each response
+    :param jitter: Maximum random delay in seconds added to latency
+    :param forbidden: Share of requests answered with 403
+    :param timeouts: Share of requests which time out
+    :param timeout: Timeout of requests in seconds
+    :param parse_workers: Number of processes which parse pages
+    :param verbose: If True, output of scrapers is printed out
+    :return: dict in format {source: metrics}
+    """
+    results = {}
+
+    with FixtureServer(path, latency, jitter, forbidden, timeouts, timeout_delay=timeout + 1) as server:
+        print(f'{"source":<10}{"pages":>7}{"requests":>10}{"pages/s":>10}{"p50, ms":>10}{"p95, ms":>10}'
+              f'{"RSS, MB":>10}{"CPU, s":>8}')
+
+        for source in sources:
+            # Each scraper runs in fresh process, so peak memory isn't inherited from previous scrapers
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+                metrics = executor.submit(bench_source, source, server.url, timeout, parse_workers, verbose).result()
+            results[source] = metrics
+
+            print(f'{source:<10}{metrics["pages"]:>7}{metrics["requests"]:>10}{metrics["pages_per_sec"]:>10.1f}'
+                  f'{metrics["p50_ms"]:>10.1f}{metrics["p95_ms"]:>10.1f}{metrics["peak_rss_mb"]:>10.1f}'
+                  f'{metrics["cpu_sec"]:>8.2f}' + (f'  error: {metrics["error"]}' if metrics['error'] else ''))
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of web scrapers against local fixture server')
+    parser.add_argument('--sources', default=','.join(SOURCES), help='comma-separated sources to benchmark')
+    parser.add_argument('--fixtures', default=FIXTURES_PATH, help='folder with fixture pages')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay in seconds added to each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='maximum random delay in seconds added to latency')
+    parser.add_argument('--forbidden', type=float, default=0.0, help='share of requests answered with 403')
+    parser.add_argument('--timeouts', type=float, default=0.0, help='share of requests which time out')
+    parser.add_argument('--timeout', type=float, default=2.0, help='timeout of requests in seconds')
+    parser.add_argument('--parse-workers', type=int, default=0, help='number of processes which parse pages')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='file with baseline metrics')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative change against baseline')
+    parser.add_argument('--verbose', action='store_true', help='print out output of scrapers')
+    args = parser.parse_args()
+
+    results = run(args.sources.split(','), args.fixtures, args.latency, args.jitter, args.forbidden, args.timeouts,
+                  args.timeout, args.parse_workers, args.verbose)
+
+    if args.save_baseline:
+        with open(args.baseline, 'wt') as f:
+            json.dump(results, f, indent=1)
+        print(f'Baseline was saved to {args.baseline}.')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'rt') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+        for source, metric, before, after in regressions:
+            print(f'REGRESSION {source}: {metric} {before:.2f} -> {after:.2f}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against baseline.')
@@ -0,0 +1,155 @@
+"""
+Fixture pages for benchmarks.
+
+Pages are either recorded from live websites (python -m benchmarks.fixtures record)
+or synthesized with the same markup that the scrapers extract (python -m benchmarks.fixtures synthesize).
+Synthesized pages carry navigation, scripts and footers of a similar size as the real pages.
+"""
+import os
+import random
+import argparse
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Pages which are recorded by default, name of the fixture: URL
+RECORDED_PAGES = {
+    'tudelft_listing': 'https://www.tudelft.nl/en/innovatie-impact/ontwikkeling-innovatie/innovation-projects'
+                       '?lookup[254940][filter][51][]=2020',
+    'fontys_listing': 'https://fontys.nl/Onderzoek/High-Tech-Systems-and-Materials/SmartMan/Student-Projects.htm',
+    'buas_listing': 'https://pure.buas.nl/en/projects/?format=&projectStartYear=2020',
+    'boskalis_listing': 'https://boskalis.com/about-us/projects.html#view/list/page/1',
+}
+
+_WORDS = ('project innovation research student design energy water port offshore data system model dredging '
+          'sustainable maritime smart manufacturing sensor robot analysis digital twin climate coastal '
+          'infrastructure logistics engineering prototype university partner').split()
+
+
+def _text(rnd, words):
+    return ' '.join(rnd.choice(_WORDS) for _ in range(words))
+
+
+def _page(rnd, body, links=150):
+    """
+    Wraps body into page with head, navigation, scripts and footer
+    """
+    head = ''.join(f'<link rel="stylesheet" href="/static/css/{i}.css"><meta name="m{i}" content="{_text(rnd, 5)}">'
+                   for i in range(20))
+    scripts = ''.join(f'<script>var config{i} = {{"items": [{", ".join(str(j) for j in range(200))}]}};</script>'
+                      for i in range(10))
+    nav = ''.join(f'<li class="nav-item"><a href="/en/section/{i}">{_text(rnd, 2)}</a>'
+                  f'<ul>{"".join(f"<li><a href=/en/section/{i}/{j}>{_text(rnd, 2)}</a></li>" for j in range(5))}</ul></li>'
+                  for i in range(links // 6))
+    footer = ''.join(f'<div class="footer-col"><h4>{_text(rnd, 2)}</h4><p>{_text(rnd, 30)}</p></div>' for i in range(8))
+    cookie = f'<div class="cookie-banner"><p>{_text(rnd, 60)}</p><button>Accept</button></div>'
+
+    return (f'<!DOCTYPE html><html><head><title>{_text(rnd, 4)}</title>{head}</head><body>'
+            f'<header><nav><ul>{nav}</ul></nav></header><main>{body}</main>'
+            f'<footer>{footer}</footer>{cookie}{scripts}</body></html>')
+
+
+def synthesize(path=FIXTURES_PATH, seed=0):
+    """
+    Writes synthesized fixture pages
+    :param path: Path to the folder where the fixtures should be
+    :param seed: Seed of random generator
+    :return: list of written files
+    """
+    rnd = random.Random(seed)
+    pages = {}
+
+    pages['tudelft_listing'] = _page(rnd, ''.join(
+        f'<div class="card"><a href="/en/innovatie-impact/ontwikkeling-innovatie/innovation-projects/project-{i}">'
+        f'{_text(rnd, 4)}</a><p>{_text(rnd, 25)}</p></div>' for i in range(12)) +
+        '<a aria-label="Last page" href="?tx_lookup_results%5Bpage-254940%5D%5BcurrentPage%5D=14">Last</a>')
+    pages['tudelft_project'] = _page(rnd, f'<h2>{_text(rnd, 5)}</h2>' + ''.join(
+        f'<div class="sm-12 md-6"><p>{_text(rnd, 120)}</p></div>' for _ in range(2)))
+
+    pages['fontys_listing'] = _page(rnd, ''.join(
+        f'<a href="/Onderzoek/High-Tech-Systems-and-Materials/SmartMan/Student-Projects/Project-{i}.htm">'
+        f'{_text(rnd, 4)}</a>' for i in range(58)))
+    pages['fontys_project'] = _page(rnd, f'<h1>{_text(rnd, 5)}</h1>'
+                                         f'<div class="columns small-12 medium-6 large-6 frd_column"><p>{_text(rnd, 250)}</p></div>' +
+                                    ''.join(f'<div class="columns small-12 large-4 frd_column"><p>{_text(rnd, 30)}</p></div>'
+                                            for _ in range(3)))
+
+    pages['buas_listing'] = _page(rnd, ''.join(
+        f'<a class="link" rel="UPMProject" href="https://pure.buas.nl/en/projects/project-{i}">{_text(rnd, 4)}</a>'
+        for i in range(50)) + '<ul class="pages">' +
+        ''.join(f'<li><a href="?format=&page={i}">{i + 1}</a></li>' for i in range(5)) +
+        '</ul><li class="next"><a href="?format=&page=1">Next</a></li>')
+    pages['buas_project'] = _page(rnd, f'<h1>{_text(rnd, 5)}</h1><div class="projectdescription">{_text(rnd, 200)}</div>'
+                                       f'<ul class="relations persons">{"".join(f"<li>{_text(rnd, 2)} (PI)</li>" for _ in range(4))}</ul>'
+                                       f'<ul>{"".join(f"<li class=userdefined-keyword>{_text(rnd, 1)}</li>" for _ in range(6))}</ul>')
+
+    pages['boskalis_listing'] = _page(rnd, ''.join(
+        f'<a target="_top" href="https://boskalis.com/about-us/projects/project-{i}.html">{_text(rnd, 4)}</a>'
+        for i in range(12)))
+    pages['boskalis_project'] = _page(rnd, f'<h1 class="heading--section">{_text(rnd, 5)}</h1>'
+                                           f'<section><p>{_text(rnd, 400)}</p></section>')
+
+    pages['partner_page'] = _page(rnd, ''.join(f'<section><h2>{_text(rnd, 4)}</h2><p>{_text(rnd, 150)}</p></section>'
+                                               for _ in range(6)), links=300)
+
+    return _write(pages, path)
+
+
+def record(pages=None, path=FIXTURES_PATH):
+    """
+    Downloads live pages and writes them as fixtures
+    :param pages: Pages in format {name of the fixture: URL}. If not provided, RECORDED_PAGES are used
+    :param path: Path to the folder where the fixtures should be
+    :return: list of written files
+    """
+    from sessions import SessionPool
+
+    session = SessionPool()
+    recorded = {}
+
+    for name, url in (pages or RECORDED_PAGES).items():
+        try:
+            recorded[name] = session.get(url, timeout=30).text
+        except Exception as e:
+            print(f'[Fixtures] Page <{url}> wasn\'t recorded: {e}.')
+
+    session.close()
+    return _write(recorded, path)
+
+
+def load(path=FIXTURES_PATH):
+    """
+    Loads fixture pages, synthesizing them if folder is empty
+    :param path: Path to the folder with fixtures
+    :return: dict in format {name of the fixture: content in bytes}
+    """
+    if not os.path.exists(path) or not os.listdir(path):
+        synthesize(path)
+
+    pages = {}
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.html'):
+            with open(os.path.join(path, name), 'rb') as f:
+                pages[name[:-5]] = f.read()
+    return pages
+
+
+def _write(pages, path):
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    written = []
+    for name, html in pages.items():
+        with open(os.path.join(path, f'{name}.html'), 'wt', encoding='utf-8') as f:
+            f.write(html)
+        written.append(os.path.join(path, f'{name}.html'))
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Creates fixture pages for benchmarks')
+    parser.add_argument('mode', choices=['synthesize', 'record'])
+    parser.add_argument('--path', default=FIXTURES_PATH, help='folder for fixture pages')
+    args = parser.parse_args()
+
+    files = synthesize(args.path) if args.mode == 'synthesize' else record(path=args.path)
+    print(f'[Fixtures] {len(files)} pages were written to {args.path}.')
@@ -0,0 +1,78 @@
+"""
+Benchmark of page parsing: full parse with html.parser (before) against partial parse
+with the fastest available parser and the selectors declared by scrapers (after).
+
+Usage: python -m benchmarks.parse_bench [--repeat N] [--fixtures PATH]
+"""
+import time
+import argparse
+import statistics
+from bs4 import BeautifulSoup
+from parsing import make_soup, PARSER
+from universities import TUDelftWebScraper, FontysWebScraper, BuasWebScraper
+from boskalis import BoskalisWebScraper
+from benchmarks.fixtures import load, FIXTURES_PATH
+
+# Selectors used for each fixture page
+SELECTORS = {
+    'tudelft_listing': TUDelftWebScraper.listing_tags,
+    'tudelft_project': TUDelftWebScraper.project_tags,
+    'fontys_listing': FontysWebScraper.listing_tags,
+    'fontys_project': FontysWebScraper.project_tags,
+    'buas_listing': BuasWebScraper.listing_tags,
+    'buas_project': BuasWebScraper.project_tags,
+    'boskalis_listing': BoskalisWebScraper.listing_tags,
+    'boskalis_project': BoskalisWebScraper.project_tags,
+    'partner_page': None,
+}
+
+
+def measure(parse, content, repeat):
+    """
+    Measures median time of parsing
+    :param parse: Function which parses the page
+    :param content: Content of the page
+    :param repeat: Number of repetitions
+    :return: median time in milliseconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(content)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def run(repeat=20, path=FIXTURES_PATH):
+    """
+    Runs the benchmark and prints out per-page parse time before and after
+    :param repeat: Number of repetitions for each page
+    :param path: Path to the folder with fixture pages
+    :return: dict in format {name of the fixture: (before, after)}
+    """
+    results = {}
+
+    print(f'{"page":<20}{"size, KB":>10}{"before, ms":>12}{"after, ms":>12}{"speedup":>10}')
+    for name, content in load(path).items():
+        only = SELECTORS.get(name)
+        before = measure(lambda c: BeautifulSoup(c, 'html.parser'), content, repeat)
+        after = measure(lambda c: make_soup(c, only), content, repeat)
+        results[name] = (before, after)
+
+        print(f'{name:<20}{len(content) / 1024:>10.1f}{before:>12.2f}{after:>12.2f}{before / after:>9.1f}x')
+
+    total_before = sum(before for before, _ in results.values())
+    total_after = sum(after for _, after in results.values())
+    print(f'{"total":<20}{"":>10}{total_before:>12.2f}{total_after:>12.2f}{total_before / total_after:>9.1f}x')
+    print(f'Parser used after: {PARSER}')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of page parsing')
+    parser.add_argument('--repeat', type=int, default=20, help='number of repetitions for each page')
+    parser.add_argument('--fixtures', default=FIXTURES_PATH, help='folder with fixture pages')
+    args = parser.parse_args()
+
+    run(args.repeat, args.fixtures)
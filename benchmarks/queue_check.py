@@ -0,0 +1,172 @@
+"""
+Check of work queues of distributed crawl: the same scenario (leases, acknowledgements, nacks, expired leases
+reclaimed by workers and by coordinator, failed tasks, drained queue, pacing of hosts) runs against SQLiteQueue
+and against RedisQueue. RedisQueue runs in process against fakeredis (with lupa for Lua scripts), so no Redis server
+is needed; it's skipped if fakeredis isn't installed.
+
+Usage: python -m benchmarks.queue_check [--lease 0.3]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from workqueue import SQLiteQueue, RedisQueue
+
+
+def scenario(make, lease):
+    """
+    Runs the scenario with two workers and coordinator
+    :param make: Function which creates work queue of given worker, queues of all workers share the same tasks
+    :param lease: Time in seconds for which leased task is reserved for the worker
+    :return: list of tuples (check, True if passed)
+    """
+    checks = []
+    w1, w2, coordinator = make('w1'), make('w2'), make('coordinator')
+
+    w1.start('s')
+    checks.append(('put ignores tasks which were already queued',
+                   w1.put('s', [('a', {'url': 'a'}), ('b', 'b'), ('c', 'c')]) == 3 and
+                   w2.put('s', [('a', 'a'), ('d', 'd')]) == 1))
+    checks.append(('tasks are leased in order of queueing', w1.lease('s', 2) == [('a', {'url': 'a'}), ('b', 'b')]))
+    checks.append(('leased tasks aren\'t leased again', [url for url, _ in w2.lease('s', 5)] == ['c', 'd']))
+    checks.append(('not drained before discovery is finished', not w2.drained('s')))
+
+    w1.finish('s')
+    checks.append(('not drained while another worker holds leases', not w1.drained('s')))
+
+    w1.ack('s', 'a')
+    w1.ack('s', 'b')
+    checks.append(('not drained while worker holds its own leases', not w2.drained('s')))
+
+    # Leases of w2 expire as if it crashed, its tasks are leased again by w1
+    time.sleep(lease * 1.5)
+    checks.append(('not drained while expired leases aren\'t leased again', not w1.drained('s')))
+    checks.append(('expired leases are leased again', sorted(url for url, _ in w1.lease('s', 5)) == ['c', 'd']))
+
+    w1.ack('s', 'c')
+    w1.ack('s', 'd')
+    w1.ack('s', 'x')
+    checks.append(('drained when all tasks are done', w1.drained('s') and w2.drained('s')))
+    checks.append(('summary counts done tasks', _counts(w1.summary('s')) == {'done': 4}))
+
+    # Task which is never acknowledged fails after max_attempts (2) leases
+    w1.start('t')
+    w1.put('t', [('e', 'e')])
+    w1.finish('t')
+    w1.lease('t')
+    time.sleep(lease * 1.5)
+    w2.lease('t')
+    time.sleep(lease * 1.5)
+    checks.append(('task fails after max attempts', w1.lease('t') == [] and _counts(w1.summary('t')) == {'failed': 1}))
+    checks.append(('drained when remaining tasks failed', w1.drained('t') and w2.drained('t')))
+
+    # Failed task is queued again, it's marked failed after max_attempts (2) leases
+    w1.start('u')
+    w1.put('u', [('f', 'f')])
+    w1.finish('u')
+    w1.lease('u')
+    w2.nack('u', 'f')
+    checks.append(('nack of task leased by another worker is ignored', _counts(w1.summary('u')) == {'leased': 1}))
+    w1.nack('u', 'f')
+    checks.append(('nacked task is leased again', w2.lease('u') == [('f', 'f')]))
+    w2.nack('u', 'f')
+    checks.append(('nacked task fails after max attempts', _counts(w1.summary('u')) == {'failed': 1}
+                   and w1.drained('u')))
+
+    # Coordinator which never leases reclaims leases of crashed workers
+    coordinator.start('v')
+    coordinator.put('v', [('g', 'g')])
+    coordinator.finish('v')
+    w1.lease('v')
+    time.sleep(lease * 1.5)
+    coordinator.reclaim('v')
+    checks.append(('coordinator queues expired lease again', _counts(coordinator.summary('v')) == {'queued': 1}
+                   and not coordinator.drained('v')))
+    w2.lease('v')
+    time.sleep(lease * 1.5)
+    coordinator.reclaim('v')
+    checks.append(('coordinator marks expired lease failed after max attempts',
+                   _counts(coordinator.summary('v')) == {'failed': 1} and coordinator.drained('v')))
+
+    w1.start('t', resume=True)
+    checks.append(('resumed discovery keeps tasks', w1.put('t', [('e', 'e')]) == 0))
+    w1.start('t')
+    checks.append(('new discovery removes tasks', w1.put('t', [('e', 'e')]) == 1 and not w1.drained('t')))
+
+    # Requests to the host are spaced across workers, block pauses requests of all workers
+    first, second = w1.reserve('example.com', 0.5), w2.reserve('example.com', 0.5)
+    checks.append(('requests to host are spaced across workers', abs(first) < 0.05 and abs(second - 0.5) < 0.05))
+    w2.block('example.com', 2)
+    checks.append(('blocked host pauses requests of all workers', abs(w1.reserve('example.com', 0.5) - 2) < 0.05))
+
+    w1.close()
+    w2.close()
+    coordinator.close()
+
+    return checks
+
+
+def sqlite_queues(folder, lease):
+    """
+    Returns function which creates SQLiteQueue of given worker
+    :param folder: Folder of the queue file
+    :param lease: Time in seconds of lease
+    :return: function
+    """
+    return lambda worker: SQLiteQueue(os.path.join(folder, 'queue.db'), lease=lease, max_attempts=2, worker=worker)
+
+
+def redis_queues(lease):
+    """
+    Returns function which creates RedisQueue of given worker, all of them share one in-process fakeredis server
+    :param lease: Time in seconds of lease
+    :return: function or None if fakeredis isn't installed
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+
+    server = fakeredis.FakeServer()
+
+    return lambda worker: RedisQueue(None, lease=lease, max_attempts=2, worker=worker,
+                                     client=fakeredis.FakeRedis(server=server, decode_responses=True))
+
+
+def run(lease=0.3):
+    """
+    Runs the scenario against all queues and prints out results
+    :param lease: Time in seconds of lease
+    :return: dict in format {queue: list of tuples (check, True if passed)}, None if the queue was skipped
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        results['sqlite'] = scenario(sqlite_queues(folder, lease), lease)
+
+    make = redis_queues(lease)
+    results['redis'] = scenario(make, lease) if make else None
+
+    for name, checks in results.items():
+        if checks is None:
+            print(f'{name}: skipped (fakeredis isn\'t installed)')
+            continue
+
+        for check, passed in checks:
+            print(f'{name:<8}{"ok" if passed else "FAILED":<8}{check}')
+
+    return results
+
+
+def _counts(summary):
+    return {state: count for state, count in summary.items() if count}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check of work queues of distributed crawl')
+    parser.add_argument('--lease', type=float, default=0.3, help='time in seconds of lease in the scenario')
+    args = parser.parse_args()
+
+    results = run(args.lease)
+    sys.exit(any(not passed for checks in results.values() if checks for _, passed in checks))
@@ -0,0 +1,113 @@
+"""
+Benchmark of re-extraction from crawl archive.
+
+All scrapers crawl the local fixture server once with recording of raw responses, then the fixture server is stopped
+and all scrapers run again against the archive only. Reports pages and time of both runs for each source.
+
+Usage: python -m benchmarks.replay_bench [--sources tudelft,fontys] [--latency 0.02] [--parse-workers 0]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.fixtures import FIXTURES_PATH
+from benchmarks.server import FixtureServer
+from benchmarks.crawl_bench import SOURCES, RewritingSession, write_partners
+
+
+def crawl(path, sources, partners, base_url=None, parse_workers=0, verbose=False):
+    """
+    Runs all scrapers at the same time: live with recording if base URL is given, otherwise replayed from archive.
+    Runs in separate process
+    :param path: Folder with results of both runs
+    :param sources: Names of registered sources
+    :param partners: Path to the partners file
+    :param base_url: Base URL of the fixture server. If not provided, archive of the previous run is replayed
+    :param parse_workers: Number of processes which parse pages
+    :param verbose: If True, output of the scrapers is printed out
+    :return: tuple (dict in format {source: number of written pages}, seconds, summary of the archive)
+    """
+    logging.basicConfig(handlers=[logging.NullHandler()])
+    if not verbose:
+        sys.stdout = open(os.devnull, 'wt')
+
+    from runner import CrawlRunner
+    from archive import CrawlArchive
+    from sessions import SessionPool
+    from scheduler import HostScheduler
+    from browser import BrowserPool, StubDriver
+
+    archive = CrawlArchive(os.path.join(path, 'archive', ''))
+
+    start = time.perf_counter()
+    if base_url:
+        session = RewritingSession(SessionPool(default_pool_size=16), base_url, 2.0)
+        scheduler = HostScheduler(rate=1000.0, burst=100, concurrency=8, max_rate=1000.0, max_concurrency=16,
+                                  retries=1, backoff=0.05, max_backoff=0.5)
+        browsers = BrowserPool(size=2, max_pages=50, driver_factory=lambda: StubDriver(session), archive=archive)
+
+        runner = CrawlRunner(os.path.join(path, 'live', ''), sources, partners=partners, parse_workers=parse_workers,
+                             session=session, scheduler=scheduler, browsers=browsers, archive=archive)
+    else:
+        runner = CrawlRunner(os.path.join(path, 'replay', ''), sources, partners=partners,
+                             parse_workers=parse_workers, replay=archive)
+
+    summary = runner.run()
+    runner.close()
+    seconds = time.perf_counter() - start
+
+    return {source: stats['written'] for source, stats in summary.items()}, seconds, archive.summary()
+
+
+def run(sources=SOURCES, path=FIXTURES_PATH, latency=0.02, parse_workers=0, verbose=False):
+    """
+    Runs the benchmark and prints out results
+    :param sources: Names of registered sources
+    :param path: Path to the folder with fixture pages
+    :param latency: Delay in seconds added to each response of the fixture server
+    :param parse_workers: Number of processes which parse pages
+    :param verbose: If True, output of scrapers is printed out
+    :return: dict in format {'live': {..}, 'replay': {..}} with pages of each source, seconds and archive summary
+    """
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        partners = write_partners(os.path.join(folder, 'p.xlsx'))
+
+        # Each run is in fresh process, replay starts only when the fixture server is stopped
+        with FixtureServer(path, latency) as server:
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+                results['live'] = executor.submit(crawl, folder, sources, partners, server.url, parse_workers,
+                                                  verbose).result()
+
+        with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+            results['replay'] = executor.submit(crawl, folder, sources, partners, None, parse_workers,
+                                                verbose).result()
+
+    print(f'{"source":<10}{"live":>8}{"replay":>8}')
+    for source in sources:
+        print(f'{source:<10}{results["live"][0].get(source, 0):>8}{results["replay"][0].get(source, 0):>8}')
+
+    for name, (pages, seconds, archive) in results.items():
+        print(f'{name}: {sum(pages.values())} pages in {seconds:.2f} s ({sum(pages.values()) / seconds:.1f} pages/s), '
+              f'archive: {archive["response"]} responses and {archive["resource"]} rendered pages recorded '
+              f'({archive["recorded_bytes"] / 2 ** 20:.1f} MB), {archive["read"]} read, {archive["missing"]} missing')
+
+    return {name: {'pages': pages, 'seconds': seconds, 'archive': archive}
+            for name, (pages, seconds, archive) in results.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of re-extraction from crawl archive')
+    parser.add_argument('--sources', default=','.join(SOURCES), help='comma-separated sources to benchmark')
+    parser.add_argument('--fixtures', default=FIXTURES_PATH, help='folder with fixture pages')
+    parser.add_argument('--latency', type=float, default=0.02, help='delay in seconds added to each live response')
+    parser.add_argument('--parse-workers', type=int, default=0, help='number of processes which parse pages')
+    parser.add_argument('--verbose', action='store_true', help='print out output of scrapers')
+    args = parser.parse_args()
+
+    run(args.sources.split(','), args.fixtures, args.latency, args.parse_workers, args.verbose)
@@ -0,0 +1,202 @@
+"""
+Local web server which serves fixture pages in place of the live websites.
+
+Page of https://<host>/<path> is requested as http://127.0.0.1:<port>/<host>/<path>.
+Links to projects on listing pages are made unique for each listing page, so every listing page leads to
+its own projects. Sitemap of each website lists pages linked from its listing page. Text of other pages
+is varied for each page, so they aren't duplicates of each other. Latency, 403 responses and timeouts can be injected.
+"""
+import re
+import time
+import random
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from benchmarks.fixtures import load, FIXTURES_PATH, _WORDS
+
+# Number of pages with list of projects on BUAS website, the last one has no button 'Next page'
+BUAS_PAGES = 6
+
+
+def route(host, path, query):
+    """
+    Returns fixture which is served for given page
+    :param host: Host of the live website
+    :param path: Path of the page
+    :param query: Query string of the page
+    :return: name of the fixture
+    """
+    if 'tudelft' in host:
+        return 'tudelft_project' if re.search(r'innovation-projects/.+', path) else 'tudelft_listing'
+    elif 'fontys' in host:
+        return 'fontys_project' if re.search(r'Student-Projects/.+', path) else 'fontys_listing'
+    elif 'buas' in host:
+        return 'buas_project' if re.search(r'/projects/.+', path) else 'buas_listing'
+    elif 'boskalis' in host:
+        return 'boskalis_project' if re.search(r'/projects/.+', path) else 'boskalis_listing'
+    return 'partner_page'
+
+
+def vary(content, seed):
+    """
+    Replaces words of the text in main part of the page with random words, markup stays the same
+    :param content: Content of the page
+    :param seed: Seed of random generator, e.g. URL of the page
+    :return: content
+    """
+    rnd = random.Random(seed)
+    words = set(_WORDS)
+
+    def replace_words(text):
+        return re.sub(r'\w+', lambda m: rnd.choice(_WORDS) if m.group(0) in words else m.group(0), text.group(0))
+
+    return re.sub(r'<main>.*?</main>', lambda m: re.sub(r'>[^<]+<', replace_words, m.group(0)), content, flags=re.S)
+
+
+class FixtureServer:
+    """
+    Threaded HTTP server with fixture pages running in background
+    """
+
+    def __init__(self, path=FIXTURES_PATH, latency=0.0, jitter=0.0, forbidden=0.0, timeouts=0.0, timeout_delay=5.0,
+                 seed=0):
+        """
+        Creates the instance of server
+        :param path: Path to the folder with fixture pages
+        :param latency: Delay in seconds added to each response
+        :param jitter: Maximum random delay in seconds added to latency
+        :param forbidden: Share of requests answered with 403
+        :param timeouts: Share of requests answered only after timeout_delay
+        :param timeout_delay: Delay in seconds of requests which should time out
+        :param seed: Seed of random generator
+        """
+        self.pages = load(path)
+        self.latency = latency
+        self.jitter = jitter
+        self.forbidden = forbidden
+        self.timeouts = timeouts
+        self.timeout_delay = timeout_delay
+
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__server = None
+
+    @property
+    def url(self):
+        """
+        Base URL of the server
+        """
+        host, port = self.__server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Starts the server on free port
+        :return: base URL of the server
+        """
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        # Default backlog of 5 connections drops connections opened at once, and client retries them after 1 s
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 128
+
+        self.__server = Server(('127.0.0.1', 0), Handler)
+        self.__server.daemon_threads = True
+        threading.Thread(target=self.__server.serve_forever, name='fixture-server', daemon=True).start()
+        return self.url
+
+    def stop(self):
+        """
+        Stops the server
+        :return: None
+        """
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def render(self, host, path, query):
+        """
+        Returns content of the page
+        :param host: Host of the live website
+        :param path: Path of the page
+        :param query: Query string of the page
+        :return: content in bytes
+        """
+        if path == '/robots.txt':
+            return f'User-agent: *\nSitemap: https://{host}/sitemap.xml\n'.encode('utf-8')
+        elif path == '/sitemap.xml':
+            return self.sitemap(host)
+
+        name = route(host, path, query)
+        content = self.pages[name].decode('utf-8')
+
+        if name.endswith('_listing'):
+            # Each listing page leads to its own projects
+            tag = hashlib.sha1(f'{path}?{query}'.encode('utf-8')).hexdigest()[:8]
+            content = re.sub(r'([Pp]roject-)(\d+)', rf'\g<1>{tag}-\2', content)
+        else:
+            # Each page has its own text, so deduplication strips only navigation and footers
+            content = vary(content, f'{host}{path}?{query}')
+
+        if name == 'buas_listing' and int(parse_qs(query).get('page', ['0'])[0]) >= BUAS_PAGES - 1:
+            content = re.sub(r'<li class="next">.*?</li>', '', content)
+
+        return content.encode('utf-8')
+
+    def sitemap(self, host):
+        """
+        Returns sitemap of the website with all pages of the website linked from its listing page
+        :param host: Host of the live website
+        :return: content in bytes
+        """
+        listing = self.render(host, '/', '').decode('utf-8')
+        links = dict.fromkeys(re.findall(rf'href="(https?://{re.escape(host)}/[^"]+)"', listing))
+
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                + ''.join(f'<url><loc>{link}</loc></url>' for link in links)
+                + '</urlset>').encode('utf-8')
+
+    def handle(self, request):
+        """
+        Answers one request, injecting latency, 403 responses and timeouts
+        :param request: Request handler
+        :return: None
+        """
+        parts = urlsplit(request.path)
+        host, _, path = parts.path.lstrip('/').partition('/')
+
+        with self.__lock:
+            delay = self.latency + self.__random.uniform(0, self.jitter)
+            status = 403 if self.__random.random() < self.forbidden else 200
+            if self.__random.random() < self.timeouts:
+                delay = self.timeout_delay
+
+        time.sleep(delay)
+        content = self.render(host, '/' + path, parts.query) if status == 200 else b'<html>Forbidden</html>'
+
+        try:
+            request.send_response(status)
+            request.send_header('Content-Type', 'text/html; charset=utf-8')
+            request.send_header('Content-Length', str(len(content)))
+            request.end_headers()
+            request.wfile.write(content)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client has already given up
+            pass
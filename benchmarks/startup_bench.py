@@ -0,0 +1,115 @@
+"""
+Benchmark of cold start: each scenario runs in a fresh interpreter, so nothing is imported in advance.
+Reports median wall time of each scenario (with and without start of bare interpreter)
+and which heavy dependencies the scenario loaded.
+
+Usage: python -m benchmarks.startup_bench [--repeat N] [--scenarios help,fontys] [--importtime fontys]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencies which are heavy to import
+HEAVY = ('selenium', 'pandas', 'openpyxl', 'pyarrow', 'bs4', 'lxml', 'requests', 'multiprocessing', 'http.server',
+         'sqlite3')
+
+# Code run in fresh interpreter for each scenario
+SCENARIOS = {
+    'python': 'pass',
+    'help': 'import runner, contextlib, io\n'
+            'with contextlib.suppress(SystemExit), contextlib.redirect_stdout(io.StringIO()):\n'
+            '    runner.main(["--help"])',
+    'fontys': 'import tempfile\n'
+              'from registry import load\n'
+              'from parse_pool import ParsePool\n'
+              'load("fontys")["class"](tempfile.mkdtemp(), parser=ParsePool(0))',
+    'tudelft': 'from registry import load\n'
+               'load("tudelft")',
+    'runner': 'import tempfile\n'
+              'from runner import CrawlRunner\n'
+              'CrawlRunner(tempfile.mkdtemp() + "/", ["fontys"], parse_workers=0).close()',
+}
+
+# Printed out by each scenario, so loaded dependencies can be reported
+REPORT = f'\nimport sys, json\nprint(json.dumps([name for name in {HEAVY!r} if name in sys.modules]))'
+
+
+def measure(code, repeat):
+    """
+    Measures median time of running the code in fresh interpreter
+    :param code: Python code
+    :param repeat: Number of repetitions
+    :return: tuple (median time in milliseconds, list of loaded heavy dependencies)
+    """
+    times = []
+    loaded = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code + REPORT], cwd=ROOT, capture_output=True, text=True)
+        times.append((time.perf_counter() - start) * 1000)
+
+        if result.returncode:
+            raise RuntimeError(f'Scenario failed: {result.stderr}')
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+
+    return statistics.median(times), loaded
+
+
+def import_times(code, top=15):
+    """
+    Lists modules which took the longest to import (cumulative time, with their own imports)
+    :param code: Python code
+    :param top: Number of listed modules
+    :return: list of tuples (cumulative time in milliseconds, name of the module)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True, text=True)
+    modules = []
+
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((int(parts[1]) / 1000, parts[2].rstrip()))
+
+    return sorted(modules, reverse=True)[:top]
+
+
+def run(scenarios=tuple(SCENARIOS), repeat=10):
+    """
+    Runs the benchmark and prints out results
+    :param scenarios: Names of scenarios
+    :param repeat: Number of repetitions of each scenario
+    :return: dict in format {name of the scenario: {'ms': .., 'over_python_ms': .., 'loaded': ..}}
+    """
+    python, _ = measure(SCENARIOS['python'], repeat)
+    results = {}
+
+    print(f'{"scenario":<12}{"ms":>10}{"+python":>10}  loaded')
+    for name in scenarios:
+        ms, loaded = measure(SCENARIOS[name], repeat)
+        results[name] = {'ms': ms, 'over_python_ms': ms - python, 'loaded': loaded}
+
+        print(f'{name:<12}{ms:>10.1f}{ms - python:>10.1f}  {", ".join(loaded) or "-"}')
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of cold start')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios')
+    parser.add_argument('--repeat', type=int, default=10, help='number of repetitions of each scenario')
+    parser.add_argument('--importtime', default=None, help='scenario for which the slowest imports are listed')
+    args = parser.parse_args()
+
+    run(args.scenarios.split(','), args.repeat)
+
+    if args.importtime:
+        print(f'\nSlowest imports of scenario {args.importtime}:')
+        for ms, module in import_times(SCENARIOS[args.importtime]):
+            print(f'{ms:>10.1f} ms  {module}')
@@ -1,101 +1,262 @@
 import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
 import os
 import logging
+from fetcher import ConcurrentFetcher
+from browser import BrowserPool
+from cache import ResponseCache
+from manifest import CrawlManifest
+from checkpoint import Checkpoint
+from parsing import make_soup, parsed, parse_only, text_blocks
+from parse_pool import ParsePool
+from store import TextWriter, make_record
+from registry import register
+from sitemaps import sitemap_links
 
 
+@register('boskalis')
 class BoskalisWebScraper:
     """
     Web scraper for organization "Boskalis"
     """
-    # Configuring file for logs
-    logging.basicConfig(filename='app.log',
-                        format='%(asctime)s - %(levelname)s - %(message)s',
-                        level=logging.INFO,
-                        datefmt='%d.%m.%Y %H:%M:%S')
-
     __projects_url = 'https://boskalis.com/about-us/projects.html#view/list/page'
+    __pages = 29
+
+    # Links with projects in sitemap of the website
+    __project_pattern = r'/about-us/projects/.+'
 
-    def __init__(self, path_to_results):
+    # Parts of pages which are parsed, everything else is skipped by parser
+    # (the whole text of project page is exported, so project page is parsed fully)
+    listing_tags = parse_only(('a', {'target': '_top'}))
+    project_tags = None
+
+    def __init__(self, path_to_results, fetcher=None, browsers=None, incremental=False, resume=False, parser=None, writer=None,
+                 dedup=None, render_listing=False, tasks=None):
         """
         Creates the instance of web scraper for organization "Boskalis"
         :param path_to_results: Path to the folder where the results should be
+        :param fetcher: Shared fetch engine. If not provided, new one is created
+        :param browsers: Shared pool of browsers. If not provided, new one is created
+        :param incremental: If True, only new or changed projects are written
+        :param resume: If True, crawl continues from the checkpoint of the previous run
+        :param parser: Shared pool of processes which parse pages. If not provided, new one is created
+        :param writer: Shared writer of results. If not provided, projects are written to .txt files
+        :param dedup: Shared deduplicator. If not provided, duplicate pages are written and boilerplate isn't stripped
+        :param render_listing: If True, pages with list of projects are rendered in browser instead of reading sitemap
+        :param tasks: Work queue of distributed crawl. If provided, links are leased from the queue instead of discovered
         """
         self.path_to_results = path_to_results + '/Boskalis/'
+        self.fetcher = fetcher or ConcurrentFetcher(cache=ResponseCache(path_to_results + '/.cache/'))
+        self.browsers = browsers or BrowserPool()
+        self.manifest = CrawlManifest(self.path_to_results + 'manifest.json') if incremental else None
+        self.checkpoint = Checkpoint(self.path_to_results + 'checkpoint.db', resume,
+                                     on_save=self.save_state, on_done=self.page_done, on_failed=self.page_failed)
+        self.parser = parser or ParsePool()
+        self.writer = writer or TextWriter()
+        self.dedup = dedup
+        self.render_listing = render_listing
+        self.tasks = tasks
 
     def export(self):
         """
         Exports web scraped content to .txt files
         :return: None
         """
-        project_links = []
         if not os.path.exists(self.path_to_results):
             os.makedirs(self.path_to_results)
 
-        # Finding all links with projects within page with pagination
-        for i in range(1, 30):
-            project_links.extend(self.find_links(f'{self.__projects_url}/{i}'))
+        # Number of project pages which were read in this run (completed or failed)
+        pages = 0
 
-        # Iterating through unique links from list
-        for link in set(project_links):
-            try:
-                r = requests.get(link)
-            except requests.exceptions.ConnectionError:
-                print(f'[Boskalis Web Scraper] Error for page <{link}>: connection refused!')
-                logging.exception(f'[Boskalis Web Scraper] Error for page <{link}>: connection refused!')
+        # Fetching unique links concurrently while they are still being discovered, pages are parsed in processes of parse pool
+        for link, r, record, error in self.parser.parse_all(self.fetcher.fetch_all(self.discover_links()), self.extract_project):
+            pages += 1
+            if isinstance(error, requests.exceptions.ConnectionError):
+                logging.error(f'[Boskalis Web Scraper] Error for page <{link}>: connection refused!')
+                self.checkpoint.mark_failed(link)
                 continue
-            except Exception as e:
-                print(f'[Boskalis Web Scraper] Error for page {link}: {e}.')
-                logging.exception(f'[Boskalis Web Scraper] Error for page {link}: {e}.')
+            elif error and r is None:
+                logging.error(f'[Boskalis Web Scraper] Error for page {link}: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+            elif error:
+                logging.error(f'[Boskalis Web Scraper] Project <{link}> wasn\'t scraped: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
                 continue
 
-            soup = BeautifulSoup(r.content, 'html.parser')
+            # If project wasn't modified since previous run
+            if r.status_code == 304:
+                self.writer.keep(link)
+                self.checkpoint.mark_done(link)
+                continue
+            elif r.status_code != 200:
+                logging.error(f'[Boskalis Web Scraper] Project <{link}> wasn\'t scraped due Error {r.status_code}.')
+                self.checkpoint.mark_failed(link)
+                continue
 
             try:
-                # Getting project title
-                title = soup.find('h1', attrs={'class': 'heading--section'}).text.replace('/', '').replace('\n', '')
+                title = record['title']
+                text = ' '.join(self.dedup.strip(link, record['blocks']) if self.dedup else record['blocks'])
+
+                # If project didn't change since previous run
+                if self.manifest and not self.manifest.changed(link, text):
+                    self.writer.keep(link)
+                    self.checkpoint.mark_done(link)
+                    continue
+
+                # If the same project was already scraped from another page
+                original = self.dedup.duplicate(link, text) if self.dedup else None
+                if original:
+                    logging.info(f'[Boskalis Web Scraper] Project <{link}> was skipped, it\'s duplicate of <{original}>.')
+                    self.checkpoint.mark_done(link)
+                    continue
+
+                # In incremental mode each project is listed only once
+                listing = self.path_to_results + 'Projects.txt' if not self.manifest or self.manifest.is_new(link) else None
+
+                result = make_record('Boskalis', link, title, text)
+                file = self.writer.write(result, self.path_to_results + f'{title}.txt', listing)
+
+                if self.manifest:
+                    self.manifest.record(link, text, file)
 
-                with open(self.path_to_results + f'{title}.txt', 'wt') as f:
-                    f.write(soup.get_text(' '))
-                with open(self.path_to_results + 'Projects.txt', 'a+') as f1:
-                    f1.write(title)
+                self.checkpoint.mark_done(link)
 
             except Exception as e:
-                print(f'[Boskalis Web Scraper] Project <{link}> wasn\'t scraped: {e}.')
                 logging.exception(f'[Boskalis Web Scraper] Project <{link}> wasn\'t scraped: {e}.')
+                self.checkpoint.mark_failed(link)
+
+        self.save_state()
+
+        # If crawl is finished, next run starts from scratch, otherwise resumed run continues it
+        # (progress of distributed crawl is kept by work queue)
+        if self.tasks or self.checkpoint.is_complete():
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+            logging.warning('[Boskalis Web Scraper] Crawl wasn\'t finished, checkpoint is kept for resumed run.')
+
+        logging.info(f'[Boskalis Web Scraper] {pages - self.checkpoint.failed} projects were scraped, '
+                     f'{self.checkpoint.failed} failed.')
+
+    def page_done(self, url):
+        """
+        Called for each completed page: cached response of the page can be revalidated by the next run
+        and task of work queue is acknowledged
+        :param url: URL of the page
+        :return: None
+        """
+        self.fetcher.confirm(url)
+
+        if self.tasks:
+            self.tasks.ack(url)
+
+    def page_failed(self, url):
+        """
+        Called for each failed page: task of work queue is released, so it's retried or marked failed
+        :param url: URL of the page
+        :return: None
+        """
+        if self.tasks:
+            self.tasks.nack(url)
+
+    def save_state(self):
+        """
+        Flushes written projects and index of duplicates and saves manifest. Called before each save of checkpoint,
+        so pages are never marked completed before their results are stored
+        :return: None
+        """
+        self.writer.flush()
 
-        print(f'[Boskalis Web Scraper] {len(set(project_links))} projects were scraped.')
-        logging.info(f'[Boskalis Web Scraper] {len(set(project_links))} projects were scraped.')
+        if self.manifest:
+            self.manifest.save()
+        if self.dedup:
+            self.dedup.save()
 
     @staticmethod
-    def find_links(url):
+    def extract_project(content):
+        """
+        Extracts project from its page. Runs in parse pool
+        :param content: Content of project page
+        :return: record in format {'title': .., 'blocks': list of blocks of text without navigation and footers}
+        """
+        with parsed(content, BoskalisWebScraper.project_tags) as soup:
+            # Getting project title
+            title = soup.find('h1', attrs={'class': 'heading--section'}).text.replace('/', '').replace('\n', '')
+
+            return {'title': title, 'blocks': text_blocks(soup)}
+
+    def discover_links(self):
+        """
+        Discovers links with projects. Links are read from sitemap of the website over HTTP,
+        if sitemap has no projects, all pages with pagination are rendered in browser at the same time
+        :return: generator of unique links with projects which weren't completed yet
+        """
+        # Links are discovered by coordinator of distributed crawl
+        if self.tasks:
+            yield from self.tasks.items()
+            return
+
+        # Links discovered but not completed by previous run
+        yield from self.checkpoint.pending()
+
+        if self.checkpoint.discovered:
+            return
+
+        links = [] if self.render_listing else sitemap_links(self.fetcher, self.__projects_url, self.__project_pattern)
+
+        # If sitemap has no projects, list of projects is loaded by scripts of the page, so it's rendered in browser
+        if not links:
+            if not self.render_listing:
+                logging.warning('[Boskalis Web Scraper] Sitemap has no projects, pages with projects are rendered in browser.')
+            complete = yield from self.render_links()
+        else:
+            logging.info(f'[Boskalis Web Scraper] {len(links)} projects were found in sitemap.')
+            yield from self.checkpoint.add_links(links)
+            complete = True
+
+        # Discovery is finished only if all pages were read, otherwise resumed run renders failed pages again
+        if complete:
+            self.checkpoint.finish_discovery()
+        else:
+            logging.warning('[Boskalis Web Scraper] Some pages with projects weren\'t rendered, discovery will be '
+                            'continued by resumed run.')
+
+    def render_links(self):
         """
-        Finds all links with projects on given page
+        Discovers links with projects by rendering all pages with pagination at the same time
+        :return: generator of unique links with projects, returns True if all pages were rendered
+        """
+        pages = [f'{self.__projects_url}/{i}' for i in range(1, self.__pages + 1)]
+        complete = True
+
+        for url, links, error in self.fetcher.fetch_all([url for url in pages if not self.checkpoint.is_done(url)],
+                                                        fetch=self.find_links):
+            if error:
+                logging.error(f'[Boskalis Web Scraper] Error while getting links from page <{url}>: {error}.',
+                              exc_info=error)
+                complete = False
+                continue
+
+            yield from self.checkpoint.add_links(links)
+            self.checkpoint.mark_done(url)
+
+        return complete
+
+    def find_links(self, url):
+        """
+        Finds all links with projects on given page. Errors are raised to the caller
         :param url: URL for page with list of projects
         :return: list of links with projects
         """
-        driver = webdriver.Safari()
-        try:
-            driver.get(url)
-        except Exception as e:
-            print(f'[Boskalis Web Scraper] Error while getting links from page <{url}>: {e}.')
-            logging.exception(f'[Boskalis Web Scraper] Error while getting links from page <{url}>: {e}.')
-            return
+        html = self.browsers.render(url)
 
-        html = driver.page_source
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = make_soup(html, self.listing_tags)
         a_tags = soup.find_all('a', attrs={'target': '_top'})
         to_add = []
 
-        try:
-            for a_tag in a_tags:
-                # Check if link refers to project
-                if 'projects/' in str(a_tag.get('href')):
-                    to_add.append((a_tag.get('href')))
-        except Exception as e:
-            print(f'[Boskalis Web Scraper] Error while extracting links from tags on page <{url}>: {e}.')
-            return
+        for a_tag in a_tags:
+            # Check if link refers to project
+            if 'projects/' in str(a_tag.get('href')):
+                to_add.append((a_tag.get('href')))
 
-        driver.close()
         return to_add
@@ -0,0 +1,232 @@
+import requests
+import threading
+import logging
+import atexit
+import time
+from queue import LifoQueue, Empty
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from metrics import metrics
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class StubDriver:
+    """
+    Local stand-in for selenium web driver.
+    Pages are downloaded over plain HTTP, so the browser pool can be used without installed browser.
+    """
+
+    def __init__(self, session=None):
+        """
+        Creates the instance of stub driver
+        :param session: Session used for downloading pages. If not provided, requests module is used
+        """
+        self.session = session or requests
+        self.page_source = ''
+        self.current_url = None
+        self.timeout = 60
+
+    def get(self, url):
+        """
+        Downloads the page
+        :param url: URL of the page
+        :return: None
+        """
+        r = self.session.get(url, timeout=self.timeout)
+        self.current_url = url
+        self.page_source = r.text
+
+    def close(self):
+        self.page_source = ''
+
+    def quit(self):
+        self.close()
+
+
+def headless_driver(browser='chrome', timeout=60):
+    """
+    Creates web driver for headless browser
+    :param browser: Name of the browser: chrome, firefox, safari (can't run headless) or stub
+    :param timeout: Maximum time in seconds for loading one page
+    :return: web driver
+    """
+    if browser == 'stub':
+        driver = StubDriver()
+        driver.timeout = timeout
+        return driver
+
+    # Selenium is heavy to import, so it's loaded only when real browser is started
+    from selenium import webdriver
+
+    if browser == 'chrome':
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        driver = webdriver.Chrome(options=options)
+    elif browser == 'firefox':
+        options = webdriver.FirefoxOptions()
+        options.add_argument('-headless')
+        driver = webdriver.Firefox(options=options)
+    elif browser == 'safari':
+        driver = webdriver.Safari()
+    else:
+        raise ValueError(f'Unknown browser: {browser}!')
+
+    driver.set_page_load_timeout(timeout)
+    return driver
+
+
+def driver_memory(driver):
+    """
+    Returns memory used by the browser (driver process with all its children)
+    :param driver: Web driver
+    :return: used memory in MB, or None if it can't be measured
+    """
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+        return sum(p.memory_info().rss for p in processes) / 2 ** 20
+    except Exception:
+        return None
+
+
+class _Worker:
+    """
+    Long-lived browser with number of rendered pages
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    Bounded pool of long-lived headless browsers shared by all web scrapers.
+    Browser is checked out for each render and recycled after a number of pages or on memory threshold.
+    """
+
+    def __init__(self, size=2, max_pages=50, max_memory=1024, browser='chrome', driver_factory=None, archive=None):
+        """
+        Creates the instance of browser pool. Browsers are started lazily
+        :param size: Maximum number of browsers running at the same time
+        :param max_pages: Number of rendered pages after which browser is restarted
+        :param max_memory: Memory threshold in MB after which browser is restarted (requires psutil)
+        :param browser: Name of the browser: chrome, firefox, safari or stub
+        :param driver_factory: Function creating web driver. If provided, browser is ignored
+        :param archive: Archive into which rendered pages are recorded. If not provided, pages aren't recorded
+        """
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory = max_memory
+        self.driver_factory = driver_factory or (lambda: headless_driver(browser))
+        self.archive = archive
+
+        if self.max_memory and psutil is None:
+            logging.warning('[Browser Pool] psutil isn\'t installed, browsers are restarted only after '
+                            f'{self.max_pages} pages, not on memory threshold.')
+
+        self.__idle = LifoQueue()
+        self.__slots = threading.BoundedSemaphore(size)
+        self.__closed = False
+
+        atexit.register(self.close)
+
+    def render(self, url):
+        """
+        Renders the page in browser from the pool
+        :param url: URL of the page
+        :return: html of rendered page
+        """
+        host = urlsplit(url).netloc.lower()
+        waiting = time.perf_counter()
+
+        with self.checkout() as driver:
+            start = time.perf_counter()
+            metrics.observe('browser_wait_seconds', start - waiting, host=host)
+
+            driver.get(url)
+            metrics.observe('render_seconds', time.perf_counter() - start, host=host)
+            html = driver.page_source
+
+        if self.archive:
+            self.archive.record_render(url, html)
+
+        return html
+
+    @contextmanager
+    def checkout(self):
+        """
+        Checks out browser from the pool, waits if all browsers are busy
+        :return: web driver
+        """
+        if self.__closed:
+            raise RuntimeError('Browser pool is closed!')
+
+        self.__slots.acquire()
+        try:
+            try:
+                worker = self.__idle.get_nowait()
+            except Empty:
+                worker = _Worker(self.driver_factory())
+        except Exception:
+            self.__slots.release()
+            raise
+
+        broken = False
+        try:
+            yield worker.driver
+        except Exception:
+            broken = True
+            raise
+        finally:
+            worker.pages += 1
+            self.__release(worker, broken)
+            self.__slots.release()
+
+    def close(self):
+        """
+        Quits all idle browsers
+        :return: None
+        """
+        self.__closed = True
+
+        while True:
+            try:
+                self.__quit(self.__idle.get_nowait())
+            except Empty:
+                break
+
+    def __release(self, worker, broken):
+        """
+        Returns browser to the pool or quits it if it should be recycled
+        :param worker: Checked out browser
+        :param broken: True if render failed
+        :return: None
+        """
+        if broken or self.__closed or worker.pages >= self.max_pages:
+            self.__quit(worker)
+            return
+
+        memory = driver_memory(worker.driver) if psutil else None
+        if memory is not None and memory > self.max_memory:
+            self.__quit(worker)
+            return
+
+        self.__idle.put(worker)
+
+    @staticmethod
+    def __quit(worker):
+        """
+        Quits the browser
+        :param worker: Browser from the pool
+        :return: None
+        """
+        try:
+            worker.driver.quit()
+        except Exception as e:
+            logging.warning(f'[Browser Pool] Error while quitting browser: {e}.')
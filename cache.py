@@ -0,0 +1,251 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import logging
+import threading
+
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP responses with conditional revalidation.
+    Bodies are stored together with validators (ETag, Last-Modified), so next runs can send
+    If-None-Match / If-Modified-Since and receive 304 instead of the whole page.
+    Validators are sent only for pages confirmed by scraper (page was completed), so page whose extraction failed
+    is downloaded and extracted again instead of being skipped as not modified.
+    """
+
+    def __init__(self, path, ttl=30 * 24 * 3600, max_size=512 * 2 ** 20):
+        """
+        Creates the instance of response cache
+        :param path: Path to the folder where cached responses should be
+        :param ttl: Time in seconds after which cached response is evicted
+        :param max_size: Maximum size of cached bodies in bytes, least recently used are evicted first
+                         (down to 90% of the maximum, so entries aren't sorted again for each stored response)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__lock = threading.Lock()
+        self.__entries = {}
+
+        # Total size of cached bodies in bytes
+        self.__size = 0
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        self.__load()
+
+    def validators(self, url):
+        """
+        Returns headers for conditional request
+        :param url: URL of the page
+        :return: dict with If-None-Match / If-Modified-Since headers (empty if page is not cached)
+        """
+        meta = self.__meta(url)
+        headers = {}
+
+        if meta and meta.get('confirmed'):
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        return headers
+
+    def update(self, url, response):
+        """
+        Stores new response or fills body of 304 response from cache
+        :param url: URL of the page
+        :param response: Response to the (conditional) request
+        :return: response (304 response gets the cached body as content)
+        """
+        if response.status_code == 304:
+            body = self.__body(url)
+
+            if body is not None:
+                with self.__lock:
+                    self.hits += 1
+                response._content = body
+                return response
+
+        with self.__lock:
+            self.misses += 1
+
+        if response.status_code == 200 and (response.headers.get('ETag') or response.headers.get('Last-Modified')):
+            self.__store(url, response)
+
+        return response
+
+    def confirm(self, url):
+        """
+        Confirms that the cached response of the page was completed by scraper, so it can be revalidated
+        :param url: URL of the page
+        :return: None
+        """
+        key = self.key(url)
+
+        with self.__lock:
+            meta = self.__entries.get(key)
+            if meta is None or meta.get('confirmed'):
+                return
+            meta['confirmed'] = True
+
+        try:
+            self.__write(key + '.json', json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            logging.warning(f'[Response Cache] Response <{url}> wasn\'t confirmed: {e}.')
+
+    def summary(self):
+        """
+        Returns counters of the cache
+        :return: dict with hits, misses, evictions, number of entries and their size in bytes
+        """
+        with self.__lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self.__entries),
+                    'size': self.__size}
+
+    def report(self):
+        """
+        Prints out and logs counters of the cache
+        :return: None
+        """
+        summary = self.summary()
+        logging.info(f'[Response Cache] {summary["hits"]} hits, {summary["misses"]} misses, '
+                     f'{summary["evictions"]} evictions, {summary["entries"]} entries '
+                     f'({summary["size"] / 2 ** 20:.1f} MB).')
+
+    @staticmethod
+    def key(url):
+        """
+        Returns the key of cache entry for given URL
+        :param url: URL of the page
+        :return: key
+        """
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def __meta(self, url):
+        """
+        Returns metadata of cached response, expired entries are evicted
+        :param url: URL of the page
+        :return: dict with metadata or None
+        """
+        key = self.key(url)
+
+        with self.__lock:
+            meta = self.__entries.get(key)
+
+            if meta and time.time() - meta['stored_at'] > self.ttl:
+                self.__evict(key)
+                return None
+
+            return meta
+
+    def __body(self, url):
+        """
+        Reads cached body and marks the entry as recently used
+        :param url: URL of the page
+        :return: body or None if it is not cached
+        """
+        key = self.key(url)
+
+        try:
+            with gzip.open(os.path.join(self.path, key + '.body'), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries[key]['used_at'] = time.time()
+
+        return body
+
+    def __store(self, url, response):
+        """
+        Stores body and validators of the response
+        :param url: URL of the page
+        :param response: Response with status 200
+        :return: None
+        """
+        key = self.key(url)
+        meta = {'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'stored_at': time.time(),
+                'used_at': time.time(),
+                'size': len(response.content),
+                'confirmed': False}
+
+        try:
+            self.__write(key + '.body', gzip.compress(response.content))
+            self.__write(key + '.json', json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            logging.warning(f'[Response Cache] Response <{url}> wasn\'t cached: {e}.')
+            return
+
+        with self.__lock:
+            previous = self.__entries.get(key)
+            self.__size += meta['size'] - (previous['size'] if previous else 0)
+            self.__entries[key] = meta
+
+            # Evicting least recently used entries if cache is too large
+            if self.__size > self.max_size:
+                for old_key in sorted(self.__entries, key=lambda k: self.__entries[k]['used_at']):
+                    if self.__size <= 0.9 * self.max_size:
+                        break
+                    self.__evict(old_key)
+
+    def __write(self, name, data):
+        """
+        Atomically writes file into the cache folder
+        :param name: Name of the file
+        :param data: Content of the file
+        :return: None
+        """
+        tmp = os.path.join(self.path, f'{name}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def __evict(self, key):
+        """
+        Removes entry from the cache, lock should be held by caller
+        :param key: Key of the entry
+        :return: None
+        """
+        entry = self.__entries.pop(key, None)
+        if entry:
+            self.__size -= entry['size']
+        self.evictions += 1
+
+        for ext in ('.body', '.json'):
+            try:
+                os.remove(os.path.join(self.path, key + ext))
+            except OSError:
+                pass
+
+    def __load(self):
+        """
+        Loads metadata of responses cached by previous runs
+        :return: None
+        """
+        for name in os.listdir(self.path):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.path, name), 'rt') as f:
+                        self.__entries[name[:-5]] = json.load(f)
+                except (OSError, ValueError):
+                    continue
+
+                self.__size += self.__entries[name[:-5]]['size']
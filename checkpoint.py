@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from dedup import canonical_url
+
+
+class Checkpoint:
+    """
+    Progress of one web scraper: discovered links, completed pages and pagination cursors.
+    Progress is kept in SQLite file instead of memory, so memory doesn't grow with the number of pages.
+    Changes are committed atomically, so a crashed run can be resumed where it stopped.
+    """
+
+    def __init__(self, path, resume=False, interval=5, on_save=None, on_done=None, on_failed=None):
+        """
+        Creates the instance of checkpoint
+        :param path: Path to the checkpoint file
+        :param resume: If True, progress saved by the previous run is loaded, otherwise crawl starts from scratch
+        :param interval: Minimal time in seconds between two saves of completed pages
+        :param on_save: Function called before each save (e.g. to save manifest together with the checkpoint)
+        :param on_done: Function called with URL of each completed page (e.g. to acknowledge task of work queue)
+        :param on_failed: Function called with URL of each failed page (e.g. to release task of work queue)
+        """
+        self.path = path
+        self.interval = interval
+        self.on_save = on_save
+        self.on_done = on_done
+        self.on_failed = on_failed
+
+        self.cursors = {}
+        self.discovered = False
+
+        # Number of pages which failed in this run
+        self.failed = 0
+
+        self.__saved_at = time.time()
+        self.__lock = threading.RLock()
+
+        # Folder of results may not exist yet if only links are discovered (coordinator of distributed crawl)
+        if os.path.dirname(self.path) and not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        if not resume:
+            self.__remove()
+        resumed = os.path.exists(self.path)
+
+        try:
+            self.__db = self.__open()
+        except sqlite3.DatabaseError as e:
+            logging.warning(f'[Checkpoint] Checkpoint <{self.path}> couldn\'t be read, crawl starts from scratch: {e}.')
+            self.__remove()
+            self.__db = self.__open()
+            resumed = False
+
+        state = dict(self.__db.execute('SELECT name, value FROM state').fetchall())
+        self.cursors = json.loads(state.get('cursors', '{}'))
+        self.discovered = json.loads(state.get('discovered', 'false'))
+
+        if resumed:
+            links, done = self.__db.execute('SELECT (SELECT COUNT(*) FROM links), (SELECT COUNT(*) FROM done)').fetchone()
+            logging.info(f'[Checkpoint] Resuming from <{self.path}>: {links} links, {done} pages done.')
+
+    def add_links(self, links):
+        """
+        Records discovered links, different spellings of the same link are ignored. Links are kept as they were
+        discovered (websites may not serve canonical form), canonical form is only compared
+        :param links: Discovered links
+        :return: list of links which weren't discovered before
+        """
+        new_links = []
+
+        with self.__lock:
+            for link in links:
+                if self.__db.execute('INSERT OR IGNORE INTO links (key, url) VALUES (?, ?)',
+                                     (canonical_url(link), link)).rowcount:
+                    new_links.append(link)
+
+        return new_links
+
+    def pending(self, batch_size=500):
+        """
+        Returns links which were discovered but not completed, in order of discovery.
+        Links are read from the file in batches, so they aren't all loaded into memory
+        :param batch_size: Number of links read at once
+        :return: generator of links
+        """
+        last = 0
+
+        while True:
+            with self.__lock:
+                rows = self.__db.execute('SELECT rowid, url FROM links WHERE rowid > ? AND url NOT IN '
+                                         '(SELECT url FROM done) ORDER BY rowid LIMIT ?', (last, batch_size)).fetchall()
+            if not rows:
+                return
+
+            last = rows[-1][0]
+            for _, link in rows:
+                yield link
+
+    def cursor(self, name, default=None):
+        """
+        Returns pagination cursor
+        :param name: Name of the cursor (e.g. year of projects)
+        :param default: Value returned if cursor wasn't set
+        :return: value of the cursor
+        """
+        return self.cursors.get(str(name), default)
+
+    def set_cursor(self, name, value):
+        """
+        Sets pagination cursor and saves the checkpoint
+        :param name: Name of the cursor (e.g. year of projects)
+        :param value: Value of the cursor (e.g. number of the last completed page)
+        :return: None
+        """
+        with self.__lock:
+            self.cursors[str(name)] = value
+            self.save()
+
+    def finish_discovery(self):
+        """
+        Marks that all links were discovered and saves the checkpoint
+        :return: None
+        """
+        with self.__lock:
+            self.discovered = True
+            self.save()
+
+    def is_done(self, url):
+        """
+        Checks if page was completed
+        :param url: URL of the page
+        :return: True if page was completed
+        """
+        with self.__lock:
+            return self.__db.execute('SELECT 1 FROM done WHERE url = ?', (url,)).fetchone() is not None
+
+    def mark_done(self, url):
+        """
+        Records completed page. Checkpoint is saved at most once per interval
+        :param url: URL of the page
+        :return: None
+        """
+        with self.__lock:
+            self.__db.execute('INSERT OR IGNORE INTO done (url) VALUES (?)', (url,))
+
+            if time.time() - self.__saved_at >= self.interval:
+                self.save()
+
+        if self.on_done:
+            self.on_done(url)
+
+    def mark_failed(self, url):
+        """
+        Records page which failed. Page isn't completed, so resumed run requests it again
+        :param url: URL of the page
+        :return: None
+        """
+        with self.__lock:
+            self.failed += 1
+
+        if self.on_failed:
+            self.on_failed(url)
+
+    def is_complete(self):
+        """
+        Checks if crawl is finished: discovery was finished, every discovered link was completed and no page failed
+        :return: True if crawl is finished
+        """
+        with self.__lock:
+            return self.discovered and not self.failed and not self.__db.execute(
+                'SELECT 1 FROM links WHERE url NOT IN (SELECT url FROM done) LIMIT 1').fetchone()
+
+    def save(self):
+        """
+        Commits changes since the previous save, so only new links and completed pages are written
+        :return: None
+        """
+        with self.__lock:
+            if self.on_save:
+                self.on_save()
+
+            self.__db.executemany('INSERT OR REPLACE INTO state (name, value) VALUES (?, ?)',
+                                  [('cursors', json.dumps(self.cursors)), ('discovered', json.dumps(self.discovered))])
+            self.__db.commit()
+
+            self.__saved_at = time.time()
+
+    def clear(self):
+        """
+        Removes the checkpoint after successfully finished crawl
+        :return: None
+        """
+        with self.__lock:
+            self.__db.close()
+            self.__remove()
+
+    def __open(self):
+        """
+        Opens the checkpoint file, tables are created if it's new
+        :return: connection to the checkpoint file
+        """
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute('CREATE TABLE IF NOT EXISTS links (key TEXT PRIMARY KEY, url TEXT)')
+        db.execute('CREATE TABLE IF NOT EXISTS done (url TEXT PRIMARY KEY)')
+        db.execute('CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value TEXT)')
+        db.commit()
+        return db
+
+    def __remove(self):
+        """
+        Removes the checkpoint file together with its journal
+        :return: None
+        """
+        for suffix in ('', '-journal'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
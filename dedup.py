@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters which only track visitors and don't change content of the page
+TRACKING_PARAMETERS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid')
+
+_TOKEN = re.compile(r'\w+')
+
+
+def canonical_url(url):
+    """
+    Normalizes URL, so different spellings of the same page give the same URL: scheme and host in lower case,
+    without default port, fragment, tracking parameters, repeated slashes and trailing slash, with sorted query
+    :param url: URL of the page
+    :return: canonical URL
+    """
+    parts = urlsplit(url.strip())
+    scheme, host = parts.scheme.lower(), parts.netloc.lower()
+
+    if (scheme, host.rpartition(':')[2]) in (('http', '80'), ('https', '443')):
+        host = host.rpartition(':')[0]
+
+    path = re.sub(r'/{2,}', '/', parts.path)
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    query = urlencode(sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                             if name.lower() not in TRACKING_PARAMETERS))
+
+    return urlunsplit((scheme, host, path or '/', query, ''))
+
+
+def content_hash(text):
+    """
+    Returns hash of the text, ignoring differences in whitespace
+    :param text: Text of the page
+    :return: hex digest
+    """
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text, shingle=3):
+    """
+    Returns 64-bit SimHash of the text. Texts which share most of their word shingles have hashes
+    which differ only in a few bits
+    :param text: Text of the page
+    :param shingle: Number of words in one shingle
+    :return: tuple (hash, number of shingles)
+    """
+    tokens = _TOKEN.findall(text.lower())
+    shingles = {}
+
+    for i in range(max(len(tokens) - shingle + 1, 1 if tokens else 0)):
+        h = _hash64(' '.join(tokens[i:i + shingle]))
+        shingles[h] = shingles.get(h, 0) + 1
+
+    weights = [0] * 64
+    for h, weight in shingles.items():
+        for bit in range(64):
+            weights[bit] += weight if h >> bit & 1 else -weight
+
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0), len(shingles)
+
+
+class Deduplicator:
+    """
+    On-disk index of scraped pages which finds exact duplicates (same content hash) and near-duplicates
+    (SimHash within few bits, looked up by bands of the hash) among pages with different URLs.
+    It also learns blocks of text repeated on many pages of the same host (footers, cookie banners) and strips them
+    from extracted text. Boilerplate learned by one run is stripped by the next runs, so all pages of one run
+    are stripped the same way regardless of the order in which they were crawled.
+    """
+
+    # SimHash is split into bands: near-duplicates within `distance` bits share at least one band
+    __bands = 4
+
+    def __init__(self, path, distance=3, min_shingles=50, min_pages=3, max_blocks=100000, min_words=8):
+        """
+        Creates the instance of deduplicator and loads the index saved by previous runs
+        :param path: Path to the folder with the index
+        :param distance: Maximum number of different bits of SimHash of near-duplicates (at most 3)
+        :param min_shingles: Minimal number of shingles of the text for near-duplicate detection,
+                             shorter texts are compared only by content hash
+        :param min_pages: Number of pages of the host on which block should appear to be boilerplate
+        :param max_blocks: Maximum number of counted blocks of one host, rare blocks are forgotten above it
+        :param min_words: Minimal number of words of block which can be boilerplate. Short blocks are often values
+                          of fields repeated on many pages (e.g. client or country of project), so they are kept
+        """
+        self.path = path
+        self.distance = min(distance, self.__bands - 1)
+        self.min_shingles = min_shingles
+        self.min_pages = min_pages
+        self.max_blocks = max_blocks
+        self.min_words = min_words
+
+        self.entries = {}
+        self.duplicates = 0
+
+        # Boilerplate learned by previous runs, which is stripped, and boilerplate learned by this run
+        self.boilerplate = {}
+        self.learned = {}
+
+        self.__hashes = {}
+        self.__bands_index = {}
+        self.__blocks = {}
+        self.__pages = {}
+        self.__lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        self.__load()
+        self.__index_file = open(os.path.join(self.path, 'index.jsonl'), 'at', encoding='utf-8')
+
+    def strip(self, url, blocks):
+        """
+        Removes blocks which repeated on pages of the same host in previous runs and counts long blocks of the page,
+        so boilerplate is learned for the next runs
+        :param url: URL of the page
+        :param blocks: Blocks of text of the page in order of the page
+        :return: list of remaining blocks
+        """
+        host = urlsplit(url).netloc.lower()
+        hashes = [format(_hash64(block), 'x') for block in blocks]
+
+        with self.__lock:
+            counts = self.__blocks.setdefault(host, {})
+            learned = self.learned.setdefault(host, set())
+            self.__pages[host] = self.__pages.get(host, 0) + 1
+
+            for h in {h for block, h in zip(blocks, hashes) if len(block.split()) >= self.min_words}:
+                counts[h] = counts.get(h, 0) + 1
+                if counts[h] >= self.min_pages:
+                    learned.add(h)
+
+            # Blocks seen only once are forgotten first, so memory doesn't grow with number of pages
+            if len(counts) > self.max_blocks:
+                self.__blocks[host] = {h: n for h, n in counts.items() if n > 1}
+
+            boilerplate = self.boilerplate.get(host, set())
+            return [block for block, h in zip(blocks, hashes) if h not in boilerplate]
+
+    def duplicate(self, url, text):
+        """
+        Checks if another page with the same or nearly the same content was already scraped,
+        otherwise records the page in the index
+        :param url: URL of the page
+        :param text: Text of the page
+        :return: URL of the original page or None if page isn't duplicate
+        """
+        url = canonical_url(url)
+        digest = content_hash(text)
+        fingerprint, shingles = simhash(text)
+
+        # Texts which are too short give unreliable SimHash, they are compared only by content hash
+        if shingles < self.min_shingles:
+            fingerprint = None
+
+        with self.__lock:
+            original = self.__hashes.get(digest)
+
+            if original in (None, url) and fingerprint is not None:
+                original = next((candidate for candidate in self.__candidates(fingerprint)
+                                 if candidate != url and self.entries[candidate][1] is not None
+                                 and bin(self.entries[candidate][1] ^ fingerprint).count('1') <= self.distance), None)
+
+            if original not in (None, url):
+                self.duplicates += 1
+                return original
+
+            if self.entries.get(url) != (digest, fingerprint):
+                self.__add(url, digest, fingerprint)
+                self.__index_file.write(json.dumps({'url': url, 'hash': digest, 'simhash': fingerprint}) + '\n')
+
+        return None
+
+    def save(self):
+        """
+        Flushes the index and saves learned boilerplate. Boilerplate of host learned by this run replaces
+        the previous one, if this run saw enough pages of the host, so blocks which are gone aren't stripped forever
+        :return: None
+        """
+        # Index is shared by scrapers, so it may be saved from several threads
+        with self.__lock:
+            self.__index_file.flush()
+
+            boilerplate = dict(self.boilerplate)
+            boilerplate.update({host: hashes for host, hashes in self.learned.items()
+                                if self.__pages.get(host, 0) >= self.min_pages})
+
+            tmp = os.path.join(self.path, 'boilerplate.json.tmp')
+            with open(tmp, 'wt') as f:
+                json.dump({'min_words': self.min_words,
+                           'hosts': {host: sorted(hashes) for host, hashes in boilerplate.items() if hashes}}, f)
+            os.replace(tmp, os.path.join(self.path, 'boilerplate.json'))
+
+    def close(self):
+        """
+        Saves and closes the index
+        :return: None
+        """
+        self.save()
+        self.__index_file.close()
+
+    def report(self):
+        """
+        Prints out statistics of the index
+        :return: None
+        """
+        logging.info(f'[Deduplicator] {len(self.entries)} pages indexed, {self.duplicates} duplicates skipped, '
+                     f'{sum(map(len, self.boilerplate.values()))} boilerplate blocks stripped, '
+                     f'{sum(map(len, self.learned.values()))} learned.')
+
+    def __candidates(self, fingerprint):
+        """
+        Returns URLs of pages which share at least one band of SimHash with given fingerprint
+        """
+        candidates = set()
+
+        for band in range(self.__bands):
+            candidates |= self.__bands_index.get((band, fingerprint >> band * 16 & 0xFFFF), set())
+
+        return candidates
+
+    def __add(self, url, digest, fingerprint):
+        """
+        Adds page to in-memory index, replacing previous content of the page
+        """
+        previous = self.entries.get(url)
+
+        if previous:
+            if self.__hashes.get(previous[0]) == url:
+                del self.__hashes[previous[0]]
+            if previous[1] is not None:
+                for band in range(self.__bands):
+                    self.__bands_index.get((band, previous[1] >> band * 16 & 0xFFFF), set()).discard(url)
+
+        self.entries[url] = (digest, fingerprint)
+        self.__hashes.setdefault(digest, url)
+
+        if fingerprint is not None:
+            for band in range(self.__bands):
+                self.__bands_index.setdefault((band, fingerprint >> band * 16 & 0xFFFF), set()).add(url)
+
+    def __load(self):
+        """
+        Loads the index and learned boilerplate. Index is compacted if most of its lines are outdated
+        """
+        index_path = os.path.join(self.path, 'index.jsonl')
+        lines = 0
+
+        try:
+            if os.path.exists(index_path):
+                with open(index_path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        self.__add(entry['url'], entry['hash'], entry['simhash'])
+                        lines += 1
+
+            if os.path.exists(os.path.join(self.path, 'boilerplate.json')):
+                with open(os.path.join(self.path, 'boilerplate.json'), 'rt') as f:
+                    boilerplate = json.load(f)
+
+                # Boilerplate learned with other minimal length of blocks (or without it) is learned again
+                if boilerplate.get('min_words') == self.min_words:
+                    self.boilerplate = {host: set(hashes) for host, hashes in boilerplate['hosts'].items()}
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f'[Deduplicator] Index <{self.path}> couldn\'t be read, it\'s built again: {e}.')
+            self.entries, self.boilerplate, self.__hashes, self.__bands_index = {}, {}, {}, {}
+            lines = 0
+            if os.path.exists(index_path):
+                os.remove(index_path)
+
+        if lines > 2 * len(self.entries):
+            tmp = index_path + '.tmp'
+            with open(tmp, 'wt', encoding='utf-8') as f:
+                for url, (digest, fingerprint) in self.entries.items():
+                    f.write(json.dumps({'url': url, 'hash': digest, 'simhash': fingerprint}) + '\n')
+            os.replace(tmp, index_path)
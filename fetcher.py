@@ -0,0 +1,270 @@
+import threading
+import queue
+import time
+import contextvars
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from sessions import SessionPool
+from scheduler import HostScheduler, RETRY_STATUSES, THROTTLE_STATUSES
+from metrics import metrics
+
+
+# Marker put into the queue of results when all items were submitted
+_FED = object()
+
+
+class BodyTooLarge(requests.exceptions.RequestException):
+    """
+    Body of the response is larger than the maximum size, so it wasn't downloaded
+    """
+
+
+class ConcurrentFetcher:
+    """
+    Fetch engine shared by all web scrapers.
+    Pages are downloaded by a pool of threads and handed back as soon as they are ready.
+    Requests to each host are paced by the politeness scheduler, transient errors are retried with backoff.
+    """
+
+    def __init__(self, max_workers=16, max_per_host=4, session=None, cache=None, scheduler=None, timeout=(10, 30),
+                 max_body=10 * 2 ** 20, archive=None):
+        """
+        Creates the instance of fetch engine
+        :param max_workers: Maximum number of pages fetched at the same time (global limit)
+        :param max_per_host: Initial number of pages fetched at the same time from one host
+        :param session: Pooled keep-alive session. If not provided, new one is created
+        :param cache: Response cache used for conditional requests. If not provided, responses aren't cached
+        :param scheduler: Politeness scheduler. If not provided, new one is created
+        :param timeout: Default timeout in seconds, number or tuple (connect timeout, read timeout)
+        :param max_body: Maximum size of body in bytes, larger pages aren't downloaded (BodyTooLarge is raised)
+        :param archive: Archive into which raw responses are recorded. If not provided, responses aren't recorded
+        """
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.session = session or SessionPool(default_pool_size=max_per_host)
+        self.cache = cache
+        self.scheduler = scheduler or HostScheduler(concurrency=max_per_host,
+                                                    pool_size=getattr(self.session, 'pool_size', None))
+        self.timeout = timeout
+        self.max_body = max_body
+        self.archive = archive
+
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetcher')
+
+    def get(self, url, **kwargs):
+        """
+        Fetches one page respecting the politeness scheduler.
+        If page is cached and wasn't modified, response has status 304 and the cached body as content
+        :param url: URL of the page
+        :param kwargs: Additional keyword arguments for requests.Session.get
+        :return: response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+
+        if self.cache is None:
+            return self.__request(url, **kwargs)
+
+        headers = kwargs.pop('headers', {})
+        r = self.cache.update(url, self.__request(url, headers={**self.cache.validators(url), **headers}, **kwargs))
+
+        # Cached body is lost (or it isn't archived yet), page should be downloaded again
+        if r.status_code == 304 and (not r.content or self.archive and not self.archive.has(url)):
+            r = self.cache.update(url, self.__request(url, headers=headers, **kwargs))
+
+        return r
+
+    def confirm(self, url):
+        """
+        Confirms that the page was completed by scraper, so its cached response is revalidated by the next run
+        :param url: URL of the page
+        :return: None
+        """
+        if self.cache is not None:
+            self.cache.confirm(url)
+
+    def fetch_all(self, items, key=None, fetch=None, window=None):
+        """
+        Fetches all given pages concurrently.
+        Items are consumed lazily in background, so pages can be requested while items are still being produced
+        (e.g. links streamed from discovery of listing pages)
+        :param items: URLs of pages (or any objects from which URL can be taken by key), can be a generator
+        :param key: Function which returns URL for given item. If not provided, item itself is URL
+        :param fetch: Function which fetches the page (e.g. render in browser). If not provided, page is downloaded
+        :param window: Maximum number of fetched but not yet consumed pages. If not provided, twice the max_workers
+        :return: generator of tuples (item, result of fetch, error) in order of completion
+        """
+        results = queue.Queue()
+        slots = threading.Semaphore(window or self.max_workers * 2)
+        stop = threading.Event()
+        fetch = self.__limited(fetch) if fetch else self.get
+
+        def feed():
+            submitted = 0
+            error = None
+
+            try:
+                for item in items:
+                    slots.acquire()
+                    if stop.is_set():
+                        break
+
+                    # Fetch runs in context of the caller, so its metrics are labelled with the scraped source
+                    future = self.__executor.submit(contextvars.copy_context().run, self.__timed, fetch,
+                                                    key(item) if key else item, time.perf_counter())
+                    future.add_done_callback(lambda f, item=item: results.put((item, f)))
+                    submitted += 1
+            except Exception as e:
+                error = e
+            finally:
+                results.put((_FED, (submitted, error)))
+
+        threading.Thread(target=contextvars.copy_context().run, args=(feed,), name='fetcher-feed', daemon=True).start()
+
+        received, submitted, error = 0, None, None
+        try:
+            while submitted is None or received < submitted:
+                item, future = results.get()
+
+                # All items were submitted
+                if item is _FED:
+                    submitted, error = future
+                    continue
+
+                received += 1
+                slots.release()
+
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+        finally:
+            # Unblocking producer if consumer stopped early
+            stop.set()
+            slots.release()
+
+        if error:
+            raise error
+
+    def close(self):
+        """
+        Shuts down the pool of threads and closes pooled connections
+        :return: None
+        """
+        self.__executor.shutdown(wait=True)
+        self.session.close()
+
+    def __request(self, url, **kwargs):
+        """
+        Sends request when scheduler allows it. Timeouts, connection errors and statuses
+        429, 5xx and 999 are retried with jittered exponential backoff (Retry-After is honoured)
+        :param url: URL of the page
+        :param kwargs: Keyword arguments for requests.Session.get
+        :return: response (the last one if all retries failed)
+        """
+        attempt = 0
+        host = self.scheduler.host(url)
+
+        while True:
+            try:
+                waiting = time.perf_counter()
+                with self.scheduler.slot(url):
+                    start = time.perf_counter()
+                    metrics.observe('scheduler_wait_seconds', start - waiting, host=host)
+
+                    r = self.__download(self.session.get(url, stream=True, **kwargs))
+                    latency = time.perf_counter() - start
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.inc('errors_total', host=host, error=type(e).__name__)
+                attempt += 1
+                delay = self.scheduler.failed(url, attempt)
+
+                if attempt > self.scheduler.retries:
+                    raise
+                time.sleep(delay)
+                continue
+
+            # Time to first byte (until headers are parsed) and time of downloading the body
+            metrics.observe('ttfb_seconds', r.elapsed.total_seconds(), host=host)
+            metrics.observe('download_seconds', max(0.0, latency - r.elapsed.total_seconds()), host=host)
+            metrics.inc('bytes_total', len(r.content), host=host)
+            metrics.inc('responses_total', host=host, status=r.status_code)
+
+            if r.status_code not in RETRY_STATUSES:
+                self.scheduler.succeeded(url, latency)
+                return self.__recorded(url, r)
+
+            attempt += 1
+            delay = self.scheduler.failed(url, attempt, self.scheduler.retry_after(r),
+                                          throttled=r.status_code in THROTTLE_STATUSES)
+
+            if attempt > self.scheduler.retries:
+                return self.__recorded(url, r)
+            time.sleep(delay)
+
+    def __recorded(self, url, r):
+        """
+        Records response into the archive
+        :param url: Requested URL of the page
+        :param r: Response with downloaded content
+        :return: response
+        """
+        if self.archive:
+            self.archive.record(url, r)
+
+        return r
+
+    def __download(self, r):
+        """
+        Downloads body of streamed response in chunks, stopping as soon as it exceeds the maximum size,
+        so a huge page never gets into memory as a whole
+        :param r: Response sent with stream=True
+        :return: response with downloaded content
+        """
+        if int(r.headers.get('Content-Length') or 0) > self.max_body:
+            r.close()
+            raise BodyTooLarge(f'Body of {r.url} has {r.headers["Content-Length"]} bytes, '
+                               f'maximum is {self.max_body} bytes', response=r)
+
+        chunks, size = [], 0
+        for chunk in r.iter_content(64 * 1024):
+            size += len(chunk)
+            if size > self.max_body:
+                r.close()
+                raise BodyTooLarge(f'Body of {r.url} has more than {self.max_body} bytes', response=r)
+            chunks.append(chunk)
+
+        # Connection is returned to the pool when the whole body is read
+        r._content = b''.join(chunks)
+        return r
+
+    @staticmethod
+    def __timed(fetch, url, submitted_at):
+        """
+        Fetches the page, recording how long it waited in queue of the pool of threads
+        :param fetch: Function which fetches the page
+        :param url: URL of the page
+        :param submitted_at: Time when fetch was submitted to the pool
+        :return: result of fetch
+        """
+        metrics.observe('queue_wait_seconds', time.perf_counter() - submitted_at, host=HostScheduler.host(url))
+        return fetch(url)
+
+    def __limited(self, fetch):
+        """
+        Wraps fetch function, so it respects the politeness scheduler
+        :param fetch: Function which fetches the page
+        :return: wrapped function
+        """
+        def limited_fetch(url):
+            with self.scheduler.slot(url):
+                start = time.monotonic()
+                try:
+                    result = fetch(url)
+                except Exception:
+                    self.scheduler.failed(url, 1)
+                    raise
+
+            self.scheduler.succeeded(url, time.monotonic() - start)
+            return result
+
+        return limited_fetch
@@ -1,37 +1,68 @@
-import pandas as pd
 import requests
 import logging
-from bs4 import BeautifulSoup
 import os
-from selenium import webdriver
+import queue
+import threading
+import contextvars
+from collections import Counter
+from fetcher import ConcurrentFetcher
+from browser import BrowserPool
+from cache import ResponseCache
+from checkpoint import Checkpoint
+from parsing import parsed, text_blocks
+from parse_pool import ParsePool
+from store import TextWriter, make_record
+from partners import PartnersReader
+from registry import register
+from strategies import StrategyCache, HTTP, BROWSER, BLOCKED
 
 
+@register('general', discover='discover_rows', key=lambda row: row[1])
 class GeneralWebScraper:
     """
     General web scraper for partners' websites.
     """
-    # Configuring file for logs
-    logging.basicConfig(filename='app.log',
-                        format='%(asctime)s - %(levelname)s - %(message)s',
-                        level=logging.INFO,
-                        datefmt='%d.%m.%Y %H:%M:%S')
 
-    # Some of websites may not allow web scraping via BS4
-    problemed_organizations = ['Van Oord', 'Chronosphere']
+    # Page with less words is considered an empty shell rendered by scripts, so it's rendered in browser
+    min_words = 20
 
-    def __init__(self, source, path_to_results):
+    # Host is switched to browser when at least this many of its pages are shells and they outnumber its pages with text
+    min_shell_pages = 3
+
+    def __init__(self, source, path_to_results, fetcher=None, browsers=None, resume=False, parser=None, strategies=None,
+                 writer=None, languages=('EN',), dedup=None, tasks=None):
         """
         Creates the instance of general web scraper
-        :param source: File with list of websites. The format should be xlsx or csv
+        :param source: File with list of websites. The format should be xlsx, csv or jsonl
         :param path_to_results: Path to the folder where the results should be
+        :param fetcher: Shared fetch engine. If not provided, new one is created
+        :param browsers: Shared pool of browsers. If not provided, new one is created
+        :param resume: If True, crawl continues from the checkpoint of the previous run
+        :param parser: Shared pool of processes which parse pages. If not provided, new one is created
+        :param strategies: Cache of strategies learned for each host. If not provided, it's stored next to results
+        :param writer: Shared writer of results. If not provided, pages are written to .txt files
+        :param languages: Languages of websites which are scraped. If not provided, websites of all languages are scraped
+        :param dedup: Shared deduplicator. If not provided, duplicate pages are written and boilerplate isn't stripped
+        :param tasks: Work queue of distributed crawl. If provided, pages are leased from the queue instead of read
+                      from the source file
         """
 
         self.source = source
         self.path_to_results = path_to_results
+        self.fetcher = fetcher or ConcurrentFetcher(cache=ResponseCache(path_to_results + '.cache/'))
+        self.browsers = browsers or BrowserPool()
+        self.checkpoint = Checkpoint(path_to_results + 'general_checkpoint.db', resume, on_save=self.save_state,
+                                     on_done=self.page_done, on_failed=self.page_failed)
+        self.parser = parser or ParsePool()
+        self.strategies = strategies or StrategyCache(path_to_results + 'strategies.json')
+        self.writer = writer or TextWriter()
+        self.partners = PartnersReader(source, languages)
+        self.dedup = dedup
+        self.tasks = tasks
 
-        if not any(map(lambda x: x in source, ['xlsx', 'csv'])):
-            print('[General Web Scraper] Wrong input file format: should be .xlsx or .csv!')
-            logging.error('[General Web Scraper] Wrong input file format: should be .xlsx or .csv!')
+        # Number of pages of each host downloaded via requests which were empty shells and which had text
+        self.shell_pages = Counter()
+        self.text_pages = Counter()
 
     def export(self):
         """
@@ -42,86 +73,248 @@ class GeneralWebScraper:
         if not os.path.exists(self.path_to_results):
             os.makedirs(self.path_to_results)
 
-        # Reading data from excel file
+        if not self.tasks and not os.path.exists(self.source):
+            logging.error(f'[General Web Scraper] Source file <{self.source}> doesn\'t exist!')
+            return
+
+        rows = self.discover_rows()
+
+        # Pages of hosts which need browser are rendered in background while other pages are requested
+        # (worker of distributed crawl leases next pages only when its leased pages are completed)
+        browser_rows = queue.Queue()
+        rendering = threading.Thread(target=contextvars.copy_context().run, args=(self.render_rows, browser_rows),
+                                     name='general-render', daemon=True)
+        rendering.start()
+
         try:
-            partners = pd.read_excel(self.source)
-        except Exception as e:
-            print(f'[General Web Scraper] Error while reading source file: {e}.')
-            logging.exception(f'[General Web Scraper] Error while reading source file: {e}.')
+            # Fetching filtered websites concurrently and parsing them in processes of parse pool,
+            # results come in order of completion
+            fetched = self.fetcher.fetch_all(self.http_rows(rows, browser_rows), key=lambda row: row[1])
+            for (organization, page, language, i), r, blocks, error in self.parser.parse_all(fetched, self.extract_text):
+                # Getting the whole html page
+                if isinstance(error, requests.exceptions.ConnectionError):
+                    logging.error(f'[General Web Scraper] Error for page <{page}>: connection refused!')
+                    self.checkpoint.mark_failed(page)
+                    continue
+                elif error and r is None:
+                    logging.error(f'[General Web Scraper] Error for page {page}: {error}.', exc_info=error)
+                    self.checkpoint.mark_failed(page)
+                    continue
+
+                # If page wasn't modified since previous run
+                if r.status_code == 304:
+                    logging.info(f'[General Web Scraper] <{organization}>: {page} wasn\'t modified.')
+                    self.writer.keep(page)
+                    self.checkpoint.mark_done(page)
+
+                # If page is an empty shell filled by scripts
+                elif r.status_code == 200 and not error and self.is_shell(blocks):
+                    logging.info(f'[General Web Scraper] <{organization}>: {page} has no text, it\'s rendered in browser.')
+                    self.learn_shell(page)
+                    browser_rows.put((organization, page, language, i))
+
+                # If response is 200
+                elif r.status_code == 200:
+                    self.text_pages[self.strategies.host(page)] += 1
+                    self.strategies.learn(page, HTTP)
+
+                    try:
+                        # If page couldn't be parsed
+                        if error:
+                            raise error
+
+                        self.save_page(organization, page, language, i, blocks)
+
+                    except Exception as e:
+                        logging.exception(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped: {e}.')
+                        self.checkpoint.mark_failed(page)
+
+                # If website doesn't allow web scraping via BS4 and requests
+                elif r.status_code == 403:
+                    self.strategies.learn(page, BROWSER)
+                    browser_rows.put((organization, page, language, i))
+
+                # If website doesn't allow web scraping at all
+                elif r.status_code == 999:
+                    self.strategies.learn(page, BLOCKED)
+                    logging.error(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped, website is blocked.')
+                    self.checkpoint.mark_done(page)
+
+                # If something went wrong
+                else:
+                    logging.error(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped due Error {r.status_code}.')
+                    self.checkpoint.mark_done(page)
+        finally:
+            # All pages were requested, the rest of pages is rendered
+            browser_rows.put(None)
+            rendering.join()
+
+        self.strategies.save()
+        self.save_state()
+
+        # If crawl is finished, next run starts from scratch, otherwise resumed run continues it
+        # (progress of distributed crawl is kept by work queue)
+        if self.tasks or self.checkpoint.is_complete():
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+            logging.warning('[General Web Scraper] Crawl wasn\'t finished, checkpoint is kept for resumed run.')
+
+    def discover_rows(self):
+        """
+        Reads pages of partners' websites. Rows of the source file are read lazily, so pages are requested
+        while the file is still being read. Pages completed by the previous run are skipped
+        :return: generator of rows in format (organization, page, language, number of page)
+        """
+        # Pages are read by coordinator of distributed crawl
+        if self.tasks:
+            yield from (tuple(row) for row in self.tasks.items())
             return
 
-        # Setting conditions for language of websites
-        condition_en = partners["Language"] == "EN"
+        yield from (row for row in self.number_pages(self.partners) if not self.checkpoint.is_done(row[1]))
 
-        websites_result = partners[["Organization", "Page", "Language"]]
-        websites_result = websites_result[condition_en]
+        # All rows of the source file were read
+        self.checkpoint.finish_discovery()
+
+    def http_rows(self, rows, browser_rows):
+        """
+        Filters out pages which shouldn't be requested via requests according to learned strategies.
+        Rows are filtered lazily, so strategy learned from one page applies to pages which weren't requested yet
+        :param rows: Rows in format (organization, page, language, number of page)
+        :param browser_rows: Queue to which rows of pages that should be rendered in browser are put
+        :return: generator of rows which should be requested via requests
+        """
+        for organization, page, language, i in rows:
+            strategy = self.strategies.get(page)
 
-        # Print out number of filtered websites
-        print(f'[General Web Scraper] {len(websites_result)} websites were filtered.')
-        logging.info(f'[General Web Scraper] {len(websites_result)} websites were filtered.')
+            if strategy == BLOCKED:
+                logging.info(f'[General Web Scraper] <{organization}>: {page} was skipped, website is blocked.')
+                self.checkpoint.mark_done(page)
+            elif strategy == BROWSER:
+                browser_rows.put((organization, page, language, i))
+            else:
+                yield organization, page, language, i
 
-        # Iterating through filtered websites
-        for organization, page, language in websites_result.itertuples(index=False):
-            # Getting the whole html page
+    def render_rows(self, rows):
+        """
+        Renders pages in pool of browsers concurrently. Runs in background thread while other pages are requested
+        :param rows: Queue of rows in format (organization, page, language, number of page), None marks the end
+        :return: None
+        """
+        for (organization, page, language, i), html, error in self.fetcher.fetch_all(iter(rows.get, None),
+                                                                                     key=lambda row: row[1],
+                                                                                     fetch=self.browsers.render):
             try:
-                r = requests.get(page)
-            except requests.exceptions.ConnectionError:
-                print(f'[General Web Scraper] Error for page <{page}>: connection refused!')
-                logging.exception(f'[General Web Scraper] Error for page <{page}>: connection refused!')
-                continue
+                # If page couldn't be rendered
+                if error:
+                    raise error
+
+                self.save_page(organization, page, language, i, self.parser.parse(self.extract_text, html))
+
             except Exception as e:
-                print(f'[General Web Scraper] Error for page {page}: {e}.')
-                logging.exception(f'[General Web Scraper] Error for page {page}: {e}.')
-                continue
-
-            path_to_save = self.path_to_results + language + '/' + organization + '/'
-
-            # If it's first page from current organization
-            if not os.path.exists(path_to_save):
-                i = 1
-                os.makedirs(path_to_save)
-
-            # If response is 200
-            if r.status_code == 200 and organization not in self.problemed_organizations:
-                soup = BeautifulSoup(r.content, "html.parser")
-                try:
-                    i = 1
-                    # Creating .txt file and appending the result
-                    if language == 'EN':
-                        with open(path_to_save + organization + '_' + str(i) + '.txt', 'wt') as f:
-                            f.write(soup.get_text(" "))
-
-                    print(f'[General Web Scraper] <{organization}>: {page} was scraped successfully.')
-                    logging.info(f'[General Web Scraper] <{organization}>: {page} was scraped successfully.')
-                    i += 1
-
-                except Exception as e:
-                    print(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped: {e}.')
-                    logging.exception(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped: {e}.')
-
-            # If website doesn't allow web scraping via BS4 and requests
-            elif r.status_code == 403 or organization in self.problemed_organizations:
-                driver = webdriver.Safari()
-                driver.get(page)
-                html = driver.page_source
-                soup = BeautifulSoup(html, 'html.parser')
-                try:
-                    # Creating .txt file and appending the result
-                    if language == 'EN':
-                        with open(path_to_save + organization + '_' + str(i) + '.txt', 'wt') as f:
-                            f.write(soup.get_text(' '))
-
-                    print(f'[General Web Scraper] <{organization}>: {page} was scraped successfully')
-                    logging.info(f'[General Web Scraper] <{organization}>: {page} was scraped successfully')
-                    i += 1
-                    driver.close()
-
-                except Exception as e:
-                    print(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped: {e}.')
-                    logging.exception(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped: {e}.')
-
-            # If something went wrong
-            else:
-                print(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped due Error {r.status_code}.')
-                logging.error(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped due Error {r.status_code}.')
+                logging.exception(f'[General Web Scraper] <{organization}>: {page} wasn\'t scraped: {e}.')
+                self.checkpoint.mark_failed(page)
+
+    def save_page(self, organization, page, language, i, blocks):
+        """
+        Writes text of the page through the writer and marks the page completed.
+        Boilerplate is stripped from the text, duplicates of already scraped pages are skipped
+        :param organization: Name of the organization
+        :param page: URL of the page
+        :param language: Language of the page
+        :param i: Number of the page within the organization
+        :param blocks: Blocks of text of the page
+        :return: None
+        """
+        text = ' '.join(self.dedup.strip(page, blocks) if self.dedup else blocks)
+
+        original = self.dedup.duplicate(page, text) if self.dedup else None
+        if original:
+            logging.info(f'[General Web Scraper] <{organization}>: {page} was skipped, it\'s duplicate of {original}.')
+            self.checkpoint.mark_done(page)
+            return
+
+        path_to_save = self.path_to_results + language + '/' + organization + '/'
+
+        # Only english pages are exported to .txt files
+        file = path_to_save + organization + '_' + str(i) + '.txt' if language == 'EN' else None
+        self.writer.write(make_record(organization, page, f'{organization}_{i}', text), file)
+
+        logging.info(f'[General Web Scraper] <{organization}>: {page} was scraped successfully.')
+        self.checkpoint.mark_done(page)
+
+    def page_done(self, url):
+        """
+        Called for each completed page: cached response of the page can be revalidated by the next run
+        and task of work queue is acknowledged
+        :param url: URL of the page
+        :return: None
+        """
+        self.fetcher.confirm(url)
+
+        if self.tasks:
+            self.tasks.ack(url)
+
+    def page_failed(self, url):
+        """
+        Called for each failed page: task of work queue is released, so it's retried or marked failed
+        :param url: URL of the page
+        :return: None
+        """
+        if self.tasks:
+            self.tasks.nack(url)
+
+    def save_state(self):
+        """
+        Flushes written pages and index of duplicates. Called before each save of checkpoint,
+        so pages are never marked completed before their results are stored
+        :return: None
+        """
+        self.writer.flush()
+
+        if self.dedup:
+            self.dedup.save()
+
+    def learn_shell(self, page):
+        """
+        Records page which is an empty shell. Host is switched to browser only when several of its pages are shells,
+        so one short page doesn't send all pages of the website to browser
+        :param page: URL of the page
+        :return: None
+        """
+        host = self.strategies.host(page)
+        self.shell_pages[host] += 1
+
+        if self.shell_pages[host] >= self.min_shell_pages and self.shell_pages[host] > self.text_pages[host]:
+            self.strategies.learn(page, BROWSER)
+
+    def is_shell(self, blocks):
+        """
+        Checks if page downloaded via requests has almost no text, e.g. page whose content is loaded by scripts
+        :param blocks: Blocks of text of the page
+        :return: True if page should be rendered in browser
+        """
+        return sum(len(block.split()) for block in blocks) < self.min_words
+
+    @staticmethod
+    def extract_text(content):
+        """
+        Extracts text of the page without navigation, footers and scripts. Runs in parse pool
+        :param content: Content of the page
+        :return: list of blocks of text of the page
+        """
+        with parsed(content) as soup:
+            return text_blocks(soup)
+
+    @staticmethod
+    def number_pages(rows):
+        """
+        Numbers pages of each organization in order of the source file
+        :param rows: Rows in format (organization, page, language)
+        :return: generator of rows in format (organization, page, language, number of page)
+        """
+        numbers = {}
 
+        for organization, page, language in rows:
+            numbers[organization] = numbers.get(organization, 0) + 1
+            yield organization, page, language, numbers[organization]
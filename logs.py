@@ -0,0 +1,174 @@
+import os
+import re
+import sys
+import copy
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from metrics import current_source
+
+# Parts of messages which differ between otherwise identical messages: URLs, quoted pages and numbers
+_VARIABLE = re.compile(r'<[^>]*>|https?://\S+|\d+')
+
+
+class RepeatFilter(logging.Filter):
+    """
+    Rate limiter of repeated messages. Messages which differ only in URLs and numbers are considered identical,
+    only first burst of them is let through in each interval, and only the first one keeps its traceback
+    """
+
+    def __init__(self, interval=60, burst=5):
+        """
+        Creates the instance of filter
+        :param interval: Length of interval in seconds
+        :param burst: Number of identical messages let through in one interval
+        """
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+
+        self.__seen = {}
+        self.__lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.levelno, _VARIABLE.sub('#', str(record.msg)))
+        now = time.monotonic()
+
+        with self.__lock:
+            started_at, count, suppressed = self.__seen.get(key, (now, 0, 0))
+
+            # New interval starts
+            if now - started_at >= self.interval:
+                started_at, count = now, 0
+
+            if count >= self.burst:
+                self.__seen[key] = (started_at, count, suppressed + 1)
+                return False
+
+            self.__seen[key] = (started_at, count + 1, 0)
+
+        # Traceback is kept only for the first message, the rest of them are usually the same routine errors
+        if count > 0 and record.exc_info:
+            record.error = f'{record.exc_info[0].__name__}: {record.exc_info[1]}'
+            record.exc_info = None
+
+        if suppressed:
+            record.suppressed = suppressed
+
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Handler which only puts records to the queue, formatting is left to the background thread
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.source = current_source.get()
+
+        # Traceback can't be passed through the queue, so it's formatted here (only for non-repeated errors)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class _QueueListener(QueueListener):
+    """
+    Listener which can be stopped more than once (explicitly and at exit)
+    """
+
+    def stop(self):
+        if self._thread:
+            super().stop()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter of structured records: one JSON object per line
+    """
+
+    def format(self, record):
+        entry = {'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+                 'level': record.levelname,
+                 'message': record.getMessage(),
+                 'source': getattr(record, 'source', ''),
+                 'thread': record.threadName}
+
+        for field in ('error', 'suppressed'):
+            if getattr(record, field, None):
+                entry[field] = getattr(record, field)
+        if record.exc_text:
+            entry['traceback'] = record.exc_text
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _ConsoleFormatter(logging.Formatter):
+    """
+    Formatter of console output: message only, without traceback
+    """
+
+    def format(self, record):
+        suppressed = getattr(record, 'suppressed', None)
+        return record.getMessage() + (f' ({suppressed} similar messages were suppressed)' if suppressed else '')
+
+
+def _compress(source, destination):
+    """
+    Compresses rotated log file
+    """
+    with open(source, 'rb') as f_in, gzip.open(destination, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup_logging(path='app.log', level=logging.INFO, max_bytes=10 * 2 ** 20, backups=5, console=True,
+                  interval=60, burst=5):
+    """
+    Configures logging: records are put to the queue and written by background thread as JSON lines
+    to the log file, which is rotated and compressed by size. Messages are also printed out to console
+    :param path: Path to the log file
+    :param level: Minimal level of logged messages
+    :param max_bytes: Size of log file in bytes after which it's rotated
+    :param backups: Number of kept rotated files (app.log.1.gz, app.log.2.gz, ..)
+    :param console: If True, messages are printed out to console
+    :param interval: Length of interval in seconds for rate limiting of identical messages
+    :param burst: Number of identical messages logged in one interval
+    :return: listener (stopped automatically at exit)
+    """
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    file_handler.namer = lambda name: name + '.gz'
+    file_handler.rotator = _compress
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(_ConsoleFormatter())
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(RepeatFilter(interval, burst))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = _QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return listener
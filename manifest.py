@@ -0,0 +1,78 @@
+import os
+import json
+import hashlib
+import logging
+
+
+class CrawlManifest:
+    """
+    Persistent manifest of scraped pages in format {url: {'hash': content hash, 'file': output file or None}}.
+    Used by incremental mode to skip pages whose content didn't change since the previous run.
+    """
+
+    def __init__(self, path):
+        """
+        Creates the instance of manifest and loads entries saved by the previous run
+        :param path: Path to the manifest file
+        """
+        self.path = path
+        self.entries = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rt') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f'[Manifest] Manifest <{self.path}> couldn\'t be read, full crawl will be done: {e}.')
+
+    @staticmethod
+    def content_hash(text):
+        """
+        Returns hash of the content
+        :param text: Content of the page
+        :return: hex digest
+        """
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def is_new(self, url):
+        """
+        Checks if page wasn't scraped before
+        :param url: URL of the page
+        :return: True if page is not in manifest
+        """
+        return url not in self.entries
+
+    def changed(self, url, text):
+        """
+        Checks if page is new or its content changed since it was recorded
+        :param url: URL of the page
+        :param text: Current content of the page
+        :return: True if page should be written
+        """
+        entry = self.entries.get(url)
+
+        # Output file is missing only if page was exported to .txt file
+        return (entry is None or entry['hash'] != self.content_hash(text)
+                or entry['file'] is not None and not os.path.exists(entry['file']))
+
+    def record(self, url, text, file):
+        """
+        Records scraped page
+        :param url: URL of the page
+        :param text: Written content of the page
+        :param file: Path to the output .txt file or None if page is stored in result store only
+        :return: None
+        """
+        self.entries[url] = {'hash': self.content_hash(text), 'file': file}
+
+    def save(self):
+        """
+        Atomically saves the manifest
+        :return: None
+        """
+        tmp = self.path + '.tmp'
+
+        # Copy is taken, because manifest may be saved from another thread together with checkpoint
+        with open(tmp, 'wt') as f:
+            json.dump(dict(self.entries), f, indent=1)
+        os.replace(tmp, self.path)
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Name of the source which is being scraped in current thread, set by the crawl runner
+current_source = contextvars.ContextVar('current_source', default='')
+
+# Upper bounds of histogram buckets in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+class _Histogram:
+    """
+    Distribution of observed values
+    """
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Returns upper bound of the bucket which contains given quantile
+        """
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """
+    Registry of crawl metrics: histograms of timings (seconds) and counters, labelled by source and host.
+    Metrics can be exposed in Prometheus text format or saved as JSON snapshot
+    """
+
+    def __init__(self):
+        """
+        Creates empty registry
+        """
+        self.histograms = {}
+        self.counters = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        """
+        Records one observed value, e.g. duration of request
+        :param name: Name of the metric, e.g. 'ttfb_seconds'
+        :param value: Observed value
+        :param labels: Labels of the metric, source is added automatically
+        :return: None
+        """
+        key = (name, self.__labels(labels))
+
+        with self.__lock:
+            if key not in self.histograms:
+                self.histograms[key] = _Histogram()
+            self.histograms[key].observe(value)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increases the counter
+        :param name: Name of the metric, e.g. 'bytes_total'
+        :param value: Increment
+        :param labels: Labels of the metric, source is added automatically
+        :return: None
+        """
+        key = (name, self.__labels(labels))
+
+        with self.__lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Measures duration of the block
+        :param name: Name of the metric
+        :param labels: Labels of the metric
+        :return: context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """
+        Returns current values of all metrics
+        :return: dict in format {name: [{'labels': .., 'count': .., 'sum': .., 'p50': .., 'p95': ..} or
+                 {'labels': .., 'value': ..}]}
+        """
+        result = {}
+
+        with self.__lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                result.setdefault(name, []).append({'labels': dict(labels),
+                                                    'count': histogram.count,
+                                                    'sum': histogram.sum,
+                                                    'p50': histogram.quantile(0.5),
+                                                    'p95': histogram.quantile(0.95)})
+            for (name, labels), value in sorted(self.counters.items()):
+                result.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+
+        return result
+
+    def prometheus(self):
+        """
+        Returns all metrics in Prometheus text format
+        :return: text
+        """
+        lines = []
+
+        with self.__lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        for i, ((name, labels), histogram) in enumerate(histograms):
+            if i == 0 or histograms[i - 1][0][0] != name:
+                lines.append(f'# TYPE crawl_{name} histogram')
+
+            seen = 0
+            for bound, n in zip(BUCKETS, histogram.buckets):
+                seen += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'crawl_{name}_bucket{self.__format(labels + (("le", le),))} {seen}')
+            lines.append(f'crawl_{name}_sum{self.__format(labels)} {histogram.sum}')
+            lines.append(f'crawl_{name}_count{self.__format(labels)} {histogram.count}')
+
+        for i, ((name, labels), value) in enumerate(counters):
+            if i == 0 or counters[i - 1][0][0] != name:
+                lines.append(f'# TYPE crawl_{name} counter')
+            lines.append(f'crawl_{name}{self.__format(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Starts HTTP endpoint in background which returns metrics in Prometheus text format
+        :param port: Port of the endpoint
+        :param host: Interface of the endpoint
+        :return: server (call shutdown() to stop it)
+        """
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+
+        logging.info(f'[Metrics] Metrics are served on http://{host}:{server.server_address[1]}/metrics.')
+        return server
+
+    def save(self, path):
+        """
+        Atomically saves JSON snapshot of metrics
+        :param path: Path to the snapshot file
+        :return: None
+        """
+        tmp = path + '.tmp'
+
+        with open(tmp, 'wt') as f:
+            json.dump({'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'metrics': self.snapshot()}, f, indent=1)
+        os.replace(tmp, path)
+
+    def save_periodically(self, path, interval=30):
+        """
+        Saves JSON snapshot of metrics in background every interval seconds
+        :param path: Path to the snapshot file
+        :param interval: Time in seconds between two snapshots
+        :return: event which stops saving when set
+        """
+        stop = threading.Event()
+
+        def save():
+            while not stop.wait(interval):
+                self.save(path)
+
+        threading.Thread(target=save, name='metrics-snapshot', daemon=True).start()
+        return stop
+
+    @staticmethod
+    def __labels(labels):
+        labels.setdefault('source', current_source.get())
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    @staticmethod
+    def __format(labels):
+        return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}' if labels else ''
+
+
+# Registry of metrics shared by all modules
+metrics = Metrics()
+
+
+@contextmanager
+def profile(path, tool='cprofile'):
+    """
+    Profiles the block with cProfile or pyinstrument (if installed)
+    :param path: Path to the output file (.prof for cProfile, .html for pyinstrument)
+    :param tool: 'cprofile' or 'pyinstrument'
+    :return: context manager
+    """
+    if tool == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path, 'wt') as f:
+                f.write(profiler.output_html())
+    else:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
@@ -0,0 +1,154 @@
+import os
+import time
+import queue
+import threading
+import contextvars
+from metrics import metrics
+
+# Marker put into the queue of results when all fetched pages were submitted
+_FED = object()
+
+
+def _timed(extract, content):
+    """
+    Extracts record from content of the page, measuring time of parsing. Runs in process of the pool
+    :param extract: Function which returns record from content of the page
+    :param content: Content of the page
+    :return: tuple (record, time of parsing in seconds)
+    """
+    start = time.perf_counter()
+    record = extract(content)
+    return record, time.perf_counter() - start
+
+
+class ParsePool:
+    """
+    Pool of processes which parse fetched pages and extract compact records from them.
+    Parsing runs on all cores and doesn't block threads which fetch pages.
+    """
+
+    def __init__(self, workers=None, window=None):
+        """
+        Creates the instance of parse pool. Processes are started lazily
+        :param workers: Number of processes. If not provided, number of cores is used. If 0, pages are parsed inline
+        :param window: Maximum number of pages submitted but not yet consumed. If not provided, four per process
+        """
+        self.workers = os.cpu_count() if workers is None else workers
+        self.window = window or max(self.workers, 1) * 4
+
+        self.__executor = None
+
+        if self.workers:
+            # Multiprocessing is loaded only when pages aren't parsed inline
+            from multiprocessing import get_context
+            from concurrent.futures import ProcessPoolExecutor
+
+            # Processes are spawned, because forking a process with running threads isn't safe
+            self.__executor = ProcessPoolExecutor(self.workers, mp_context=get_context('spawn'))
+
+    def parse(self, extract, content):
+        """
+        Parses one page
+        :param extract: Module-level function (or static method) which returns record from content of the page
+        :param content: Content of the page
+        :return: record
+        """
+        if self.__executor is None:
+            record, seconds = _timed(extract, content)
+        else:
+            record, seconds = self.__executor.submit(_timed, extract, content).result()
+
+        metrics.observe('parse_seconds', seconds)
+        return record
+
+    def parse_all(self, fetched, extract):
+        """
+        Parses fetched pages. Only successful responses (status 200) are parsed, others are passed through
+        :param fetched: Iterable of tuples (item, response, error), e.g. from ConcurrentFetcher.fetch_all
+        :param extract: Module-level function (or static method) which returns record from content of the page
+        :return: generator of tuples (item, response, record, error) in order of completion
+        """
+        if self.__executor is None:
+            for item, r, error in fetched:
+                if error or r.status_code != 200:
+                    yield item, r, None, error
+                    continue
+
+                try:
+                    record, seconds = _timed(extract, r.content)
+                except Exception as e:
+                    yield item, r, None, e
+                    continue
+
+                metrics.observe('parse_seconds', seconds)
+                yield item, r, record, None
+            return
+
+        results = queue.Queue()
+        slots = threading.Semaphore(self.window)
+        stop = threading.Event()
+
+        def feed():
+            submitted = 0
+            error = None
+
+            try:
+                for item, r, fetch_error in fetched:
+                    slots.acquire()
+                    if stop.is_set():
+                        break
+
+                    if fetch_error or r.status_code != 200:
+                        results.put((item, r, None, fetch_error))
+                    else:
+                        future = self.__executor.submit(_timed, extract, r.content)
+                        future.add_done_callback(lambda f, item=item, r=r: results.put((item, r, f, None)))
+                    submitted += 1
+            except Exception as e:
+                error = e
+            finally:
+                results.put((_FED, None, None, (submitted, error)))
+
+        # Fetched pages are consumed in context of the caller, so their metrics are labelled with the scraped source
+        threading.Thread(target=contextvars.copy_context().run, args=(feed,), name='parse-feed', daemon=True).start()
+
+        received, submitted, error = 0, None, None
+        try:
+            while submitted is None or received < submitted:
+                item, r, future, fetch_error = results.get()
+
+                # All fetched pages were submitted
+                if item is _FED:
+                    submitted, error = fetch_error
+                    continue
+
+                received += 1
+                slots.release()
+
+                if future is None:
+                    yield item, r, None, fetch_error
+                    continue
+
+                try:
+                    record, seconds = future.result()
+                except Exception as e:
+                    yield item, r, None, e
+                    continue
+
+                metrics.observe('parse_seconds', seconds)
+                yield item, r, record, None
+        finally:
+            # Unblocking producer if consumer stopped early
+            stop.set()
+            slots.release()
+
+        if error:
+            raise error
+
+    def close(self):
+        """
+        Shuts down the processes
+        :return: None
+        """
+        if self.__executor:
+            self.__executor.shutdown(wait=True)
@@ -0,0 +1,111 @@
+import re
+from contextlib import contextmanager
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+
+class AnyOf(SoupStrainer):
+    """
+    Strainer which keeps tags matching any of given strainers (together with everything inside them)
+    """
+
+    def __init__(self, *strainers):
+        """
+        Creates the instance of strainer
+        :param strainers: Strainers for particular tags
+        """
+        super().__init__()
+        self.strainers = strainers
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        # Used by BeautifulSoup >= 4.13
+        return any(strainer.allow_tag_creation(nsprefix, name, attrs) for strainer in self.strainers)
+
+    def allow_string_creation(self, string):
+        # Used by BeautifulSoup >= 4.13, strings outside of kept tags are skipped
+        return False
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        # Used by BeautifulSoup < 4.13
+        for strainer in self.strainers:
+            found = strainer.search_tag(markup_name, markup_attrs)
+            if found:
+                return found
+        return None
+
+    @property
+    def includes_everything(self):
+        return False
+
+    @property
+    def excludes_everything(self):
+        return False
+
+
+def parse_only(*selectors):
+    """
+    Creates strainer for partial parsing. Only tags matching selectors are built by parser
+    :param selectors: Tag names or tuples (tag name, attributes), e.g. 'h1' or ('div', {'class': 'projectdescription'})
+    :return: strainer
+    """
+    return AnyOf(*[SoupStrainer(selector) if isinstance(selector, str) else SoupStrainer(*selector)
+                   for selector in selectors])
+
+
+def make_soup(markup, only=None, parser=None):
+    """
+    Parses the page with the fastest available parser
+    :param markup: Content of the page
+    :param only: Strainer created by parse_only. If not provided, the whole page is parsed
+    :param parser: Name of the parser. If not provided, lxml is used if installed, html.parser otherwise
+    :return: parsed page
+    """
+    return BeautifulSoup(markup, parser or PARSER, parse_only=only)
+
+
+@contextmanager
+def parsed(markup, only=None, parser=None):
+    """
+    Parses the page and releases the parse tree as soon as the block ends. Tags of the tree reference each other,
+    so without it the tree stays in memory until garbage collector finds it.
+    Only plain strings (not tags or strings of the tree) should be kept after the block
+    :param markup: Content of the page
+    :param only: Strainer created by parse_only. If not provided, the whole page is parsed
+    :param parser: Name of the parser. If not provided, lxml is used if installed, html.parser otherwise
+    :return: context manager with parsed page
+    """
+    soup = make_soup(markup, only, parser)
+    try:
+        yield soup
+    finally:
+        soup.decompose()
+
+
+# Tags which never contain content of the page
+BOILERPLATE_TAGS = ('script', 'style', 'noscript', 'template', 'nav', 'footer')
+
+_COOKIE = re.compile(r'cookie|consent|gdpr', re.IGNORECASE)
+
+
+def text_blocks(soup):
+    """
+    Splits text of the page into blocks, leaving out navigation, footers, scripts and cookie banners.
+    Blocks repeated on other pages of the website are stripped later by deduplicator
+    :param soup: Parsed page
+    :return: list of blocks of text in order of the page
+    """
+    for tag in soup.find_all(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    for tag in soup.find_all(attrs={'class': _COOKIE}) + soup.find_all(attrs={'id': _COOKIE}):
+        # If tag wasn't removed together with its parent
+        if not tag.decomposed:
+            tag.decompose()
+
+    # Strings are copied, so they don't keep the parse tree in memory
+    return [str(string) for string in soup.stripped_strings]
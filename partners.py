@@ -0,0 +1,115 @@
+import csv
+import json
+import logging
+from dedup import canonical_url
+
+# Columns of the source file with list of partners' websites
+COLUMNS = ('Organization', 'Page', 'Language')
+
+# Formats of the source file which can be read
+FORMATS = ('.xlsx', '.csv', '.jsonl')
+
+
+class PartnersReader:
+    """
+    Streaming reader of the file with list of partners' websites (.xlsx, .csv or .jsonl).
+    Rows are read one by one, so pages can be requested before the whole file is read.
+    Pages of other languages and repeated pages are skipped.
+    """
+
+    def __init__(self, path, languages=('EN',)):
+        """
+        Creates the instance of reader
+        :param path: Path to the source file
+        :param languages: Languages of pages which are read. If not provided, pages of all languages are read
+        """
+        self.path = path
+        self.languages = {language.strip().upper() for language in languages} if languages else None
+
+        self.read = 0
+        self.filtered = 0
+        self.duplicates = 0
+
+        if not self.path.lower().endswith(FORMATS):
+            raise ValueError(f'Wrong input file format: should be {", ".join(FORMATS)}!')
+
+    def __iter__(self):
+        """
+        Reads rows of the source file
+        :return: generator of rows in format (organization, page, language)
+        """
+        seen = set()
+        self.read, self.filtered, self.duplicates = 0, 0, 0
+
+        for row in self.rows():
+            self.read += 1
+            organization, page, language = (str(row.get(column) or '').strip() for column in COLUMNS)
+            language = language.upper()
+
+            if not organization or not page:
+                continue
+
+            if self.languages and language not in self.languages:
+                continue
+
+            # Different spellings of URL of the same page are the same page, page is requested as it's written
+            key = canonical_url(page)
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+
+            self.filtered += 1
+            yield organization, page, language
+
+        logging.info(f'[Partners Reader] {self.filtered} of {self.read} websites were filtered, '
+                     f'{self.duplicates} duplicates were skipped.')
+
+    def rows(self):
+        """
+        Reads raw rows of the source file
+        :return: generator of rows in format {column: value}
+        """
+        path = self.path.lower()
+
+        if path.endswith('.xlsx'):
+            return self.__xlsx_rows()
+        elif path.endswith('.csv'):
+            return self.__csv_rows()
+        return self.__jsonl_rows()
+
+    def __xlsx_rows(self):
+        from openpyxl import load_workbook
+
+        # In read-only mode rows are loaded lazily instead of loading the whole workbook
+        workbook = load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else '' for cell in next(rows, ())]
+
+            for values in rows:
+                yield dict(zip(header, values))
+        finally:
+            workbook.close()
+
+    def __csv_rows(self):
+        with open(self.path, 'rt', encoding='utf-8-sig', newline='') as f:
+            # Spreadsheets exported with european locale are separated with semicolons
+            try:
+                dialect = csv.Sniffer().sniff(f.read(4096), delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            f.seek(0)
+
+            yield from csv.DictReader(f, dialect=dialect)
+
+    def __jsonl_rows(self):
+        with open(self.path, 'rt', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    logging.warning(f'[Partners Reader] Line {number} of <{self.path}> was skipped: {e}.')
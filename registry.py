@@ -0,0 +1,65 @@
+import os
+import re
+import importlib
+
+# Decorator of registered web scraper with literal name of the source
+_REGISTRATION = re.compile(r'^@register\(\s*[\'"]([\w-]+)[\'"]', re.M)
+
+
+def _find_sources(folder=os.path.dirname(os.path.abspath(__file__))):
+    """
+    Finds registered sources by reading modules next to the registry, modules aren't imported
+    :param folder: Folder with modules of web scrapers
+    :return: dict in format {name of the source: name of the module}
+    """
+    sources = {}
+
+    for file in sorted(os.listdir(folder)):
+        if file.endswith('.py') and file != 'registry.py':
+            with open(os.path.join(folder, file), 'rt', encoding='utf-8') as f:
+                for name in _REGISTRATION.findall(f.read()):
+                    sources[name] = file[:-len('.py')]
+
+    return sources
+
+
+# Modules with web scrapers of each source. Module is imported only when its source is run,
+# so running one scraper doesn't load dependencies of the others
+SOURCES = _find_sources()
+
+# Registered web scrapers in format {name of the source: {'class': .., 'export': .., 'years': .., 'discover': .., 'key': ..}}
+SCRAPERS = {}
+
+
+def register(name, export='export', years=None, discover='discover_links', key=None):
+    """
+    Registers web scraper, so it can be run by the crawl runner
+    :param name: Name of the source used on command line, e.g. 'tudelft'
+    :param export: Name of the method which exports the results
+    :param years: Default list of years for scrapers which take years. If not provided, scraper doesn't take years
+    :param discover: Name of the method which discovers work of distributed crawl (generator of links or rows)
+    :param key: Function which returns URL of discovered item. If not provided, item itself is URL
+    :return: class decorator
+    """
+    def decorate(cls):
+        # Scraper which isn't found by reading modules couldn't be run by its name
+        if SOURCES.get(name) != cls.__module__.rpartition('.')[2]:
+            raise ValueError(f'Source <{name}> of {cls.__name__} isn\'t found in module {cls.__module__}! '
+                             f'Name of the source should be a literal in decorator, e.g. @register(\'{name}\').')
+
+        SCRAPERS[name] = {'class': cls, 'export': export, 'years': years, 'discover': discover, 'key': key}
+        return cls
+
+    return decorate
+
+
+def load(name):
+    """
+    Returns registered web scraper, its module is imported on first use
+    :param name: Name of the source, e.g. 'tudelft'
+    :return: registered scraper in format {'class': .., 'export': .., 'years': .., 'discover': .., 'key': ..}
+    """
+    if name not in SCRAPERS:
+        importlib.import_module(SOURCES[name])
+
+    return SCRAPERS[name]
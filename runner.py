@@ -0,0 +1,431 @@
+import os
+import time
+import inspect
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from registry import SOURCES, load
+from metrics import metrics, current_source, profile
+from logs import setup_logging
+
+
+class _CountingWriter:
+    """
+    Writer of one source which counts written records and passes them to the shared writer
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.written = 0
+        self.__lock = threading.Lock()
+
+    def write(self, record, file=None, listing=None):
+        with self.__lock:
+            self.written += 1
+
+        with metrics.timer('write_seconds'):
+            return self.writer.write(record, file, listing)
+
+    def keep(self, url):
+        self.writer.keep(url)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.flush()
+
+
+class CrawlRunner:
+    """
+    Runner which runs registered web scrapers at the same time.
+    All scrapers share one fetch engine, pool of browsers, pool of parsing processes and writer of results.
+    """
+
+    # Time in seconds between checks whether workers of distributed crawl completed all queued pages
+    __drain_interval = 5.0
+
+    def __init__(self, path_to_results, sources=None, years=None, outputs=('txt',), partners='partners.xlsx',
+                 languages=('EN',), incremental=False, resume=False, dedup=True, snapshots=True, parse_workers=None,
+                 session=None, scheduler=None, browsers=None, profile_path=None, profile_tool='cprofile', queue=None,
+                 archive=None, replay=None, drain_timeout=6 * 3600):
+        """
+        Creates the instance of runner together with resources shared by scrapers
+        :param path_to_results: Path to the folder where the results should be
+        :param sources: Names of registered sources. If not provided, all registered scrapers are run
+        :param years: List of years for scrapers which take years. If not provided, defaults of scrapers are used
+        :param outputs: Outputs of results: 'txt', 'jsonl', 'parquet' or 'search'
+        :param partners: File with list of partners' websites for general web scraper (.xlsx, .csv or .jsonl)
+        :param languages: Languages of partners' websites which are scraped. If not provided, all languages are scraped
+        :param incremental: If True, only new or changed projects are written
+        :param resume: If True, crawl continues from checkpoints of the previous run
+        :param dedup: If True, duplicate and near-duplicate pages are skipped and boilerplate is stripped
+        :param snapshots: If True, each run commits versioned snapshot of results and change feed (path/snapshots/)
+        :param parse_workers: Number of processes which parse pages. If not provided, number of cores is used
+        :param session: Keep-alive session. If not provided, new one is created
+        :param scheduler: Politeness scheduler. If not provided, new one is created
+        :param browsers: Pool of browsers. If not provided, pool of headless Chrome browsers is created
+        :param profile_path: Folder for profiles of export of each source. If not provided, sources aren't profiled
+        :param profile_tool: Profiler: 'cprofile' or 'pyinstrument' (profiles only the thread of the source)
+        :param queue: Work queue of distributed crawl (see workqueue.py). If provided, discover() fills the queue
+                      (coordinator), run() scrapes pages leased from the queue (worker) and requests to each host
+                      are paced across all workers
+        :param archive: Archive into which raw responses and rendered pages are recorded (see archive.py).
+                        If not provided, responses aren't recorded
+        :param replay: Archive from which responses are replayed instead of sending requests, so extraction of
+                       all scrapers runs offline. If provided, session, scheduler and browsers are ignored
+        :param drain_timeout: Maximum time in seconds for which coordinator waits for workers to complete queued pages
+                              before snapshot is committed
+        """
+        unknown = [source for source in sources or [] if source not in SOURCES]
+        if unknown:
+            raise ValueError(f'Unknown sources: {", ".join(unknown)}! Registered sources: {", ".join(SOURCES)}.')
+
+        # Fetch engine is imported only when crawl runs, so command line help and checks of arguments start fast
+        from fetcher import ConcurrentFetcher
+        from sessions import SessionPool
+        from browser import BrowserPool
+        from cache import ResponseCache
+        from scheduler import HostScheduler
+        from parse_pool import ParsePool
+        from store import open_writer, MultiWriter
+        from dedup import Deduplicator
+        from snapshots import SnapshotStore
+        from archive import ReplaySession, ReplayScheduler, ReplayBrowsers
+
+        self.path_to_results = path_to_results
+        self.sources = sources or list(SOURCES)
+        self.years = years
+        self.partners = partners
+        self.languages = languages
+        self.incremental = incremental
+        self.resume = resume
+        self.profile_path = profile_path
+        self.profile_tool = profile_tool
+        self.queue = queue
+        self.archive = archive
+        self.replay = replay
+        self.drain_timeout = drain_timeout
+
+        if not os.path.exists(self.path_to_results):
+            os.makedirs(self.path_to_results)
+
+        if self.profile_path and not os.path.exists(self.profile_path):
+            os.makedirs(self.profile_path)
+
+        if self.replay:
+            # Responses are read from the archive, nothing is sent to websites, so requests aren't paced
+            # and pages aren't revalidated (every page is extracted again)
+            self.session = ReplaySession(self.replay)
+            self.cache = None
+            self.scheduler = ReplayScheduler()
+            self.fetcher = ConcurrentFetcher(max_workers=16, session=self.session, scheduler=self.scheduler)
+            self.browsers = ReplayBrowsers(self.replay)
+        else:
+            # Keep-alive session and fetch engine shared by all scrapers
+            self.session = session or SessionPool(default_pool_size=4,
+                                                  pool_sizes={'www.tudelft.nl': 8, 'fontys.nl': 8, 'pure.buas.nl': 8})
+            self.cache = ResponseCache(path_to_results + '.cache/', ttl=30 * 24 * 3600, max_size=512 * 2 ** 20)
+
+            # Requests to each host start at 2 per second and 4 at a time, limits grow up to connection pool sizes
+            self.scheduler = scheduler or HostScheduler(rate=2.0, burst=4, concurrency=4, max_rate=16.0,
+                                                        max_concurrency=8, retries=3, limiter=queue,
+                                                        pool_size=getattr(self.session, 'pool_size', None))
+            self.fetcher = ConcurrentFetcher(max_workers=16, max_per_host=4, session=self.session, cache=self.cache,
+                                             scheduler=self.scheduler, timeout=(10, 30), archive=archive)
+
+            # Pool of headless browsers for pages which can't be scraped via requests
+            self.browsers = browsers or BrowserPool(size=2, max_pages=50, browser='chrome', archive=archive)
+
+        # Pool of processes which parse pages on all cores
+        self.parser = ParsePool(workers=parse_workers)
+
+        # Writer of results shared by all scrapers
+        self.writer = open_writer(path_to_results, outputs)
+
+        # Snapshots of results get every written page, snapshot of the run is committed when all scrapers finish
+        # (in distributed crawl by the coordinator, when workers completed all queued pages)
+        self.snapshots = SnapshotStore(path_to_results + 'snapshots/',
+                                       worker=queue.worker if queue else None) if snapshots else None
+        if self.snapshots:
+            self.writer = MultiWriter(self.writer, self.snapshots)
+
+        # Index of scraped pages shared by all scrapers, so duplicates are found across sources
+        self.dedup = Deduplicator(path_to_results + '.dedup/') if dedup else None
+
+        # Only modules of selected sources are imported
+        for source in self.sources:
+            load(source)
+
+    def create(self, source, writer=None, tasks=None):
+        """
+        Creates web scraper of registered source. Scraper gets only those shared resources its constructor takes
+        :param source: Name of the source
+        :param writer: Writer of results. If not provided, shared writer is used
+        :param tasks: Work queue of the source from which scraper leases pages. If not provided, scraper discovers them
+        :return: web scraper
+        """
+        scraper = load(source)
+        resources = {'source': self.partners,
+                     'years': self.years or scraper['years'],
+                     'languages': self.languages,
+                     'path_to_results': self.path_to_results,
+                     'fetcher': self.fetcher,
+                     'browsers': self.browsers,
+                     'incremental': self.incremental,
+                     'resume': self.resume,
+                     'parser': self.parser,
+                     'writer': writer or self.writer,
+                     'dedup': self.dedup,
+                     'tasks': tasks}
+        parameters = inspect.signature(scraper['class']).parameters
+
+        return scraper['class'](**{name: value for name, value in resources.items() if name in parameters})
+
+    def run(self):
+        """
+        Runs all selected scrapers at the same time and prints out summary for each source.
+        With work queue, scrapers scrape pages leased from the queue until it's drained
+        :return: dict in format {name of the source: {'written': .., 'seconds': .., 'error': ..}}
+        """
+        summary = {}
+
+        def run_source(source):
+            # Metrics recorded while scraping are labelled with the source
+            current_source.set(source)
+
+            writer = _CountingWriter(self.writer)
+            start = time.time()
+            error = None
+
+            try:
+                scraper = self.create(source, writer, self.queue.source(source) if self.queue else None)
+                export = getattr(scraper, load(source)['export'])
+
+                if self.profile_path:
+                    extension = 'html' if self.profile_tool == 'pyinstrument' else 'prof'
+                    with profile(os.path.join(self.profile_path, f'{source}.{extension}'), self.profile_tool):
+                        export()
+                else:
+                    export()
+            except Exception as e:
+                error = e
+                logging.exception(f'[Crawl Runner] Source <{source}> failed: {e}.')
+
+            summary[source] = {'written': writer.written, 'seconds': time.time() - start, 'error': error}
+
+        with ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix='runner') as executor:
+            list(executor.map(run_source, self.sources))
+
+        for source in self.sources:
+            stats = summary[source]
+            status = f'failed ({stats["error"]})' if stats['error'] else 'finished'
+            logging.info(f'[Crawl Runner] <{source}>: {status}, {stats["written"]} pages written in '
+                         f'{stats["seconds"]:.1f} s.')
+
+        # Pages of failed scrapers aren't removed from snapshot. Worker of distributed crawl only stores its pages,
+        # snapshot is committed by the coordinator
+        if self.snapshots and not self.queue:
+            self.snapshots.commit([source for source in self.sources if not summary[source]['error']])
+
+        return summary
+
+    def discover(self):
+        """
+        Discovers pages of all selected sources at the same time and puts them into the work queue,
+        so workers start scraping them while discovery is still running (coordinator of distributed crawl).
+        With snapshots, waits until workers completed all queued pages and commits snapshot of their pages
+        :return: dict in format {name of the source: {'queued': .., 'seconds': .., 'error': ..}}
+        """
+        summary = {}
+
+        def discover_source(source):
+            current_source.set(source)
+
+            tasks = self.queue.source(source)
+            start = time.time()
+            queued, error = 0, None
+
+            tasks.start(self.resume)
+            try:
+                scraper = load(source)
+                queued = tasks.put(getattr(self.create(source), scraper['discover'])(), scraper['key'])
+            except Exception as e:
+                error = e
+                logging.exception(f'[Crawl Runner] Discovery of <{source}> failed: {e}.')
+            finally:
+                # Workers stop when queue is drained, so discovery is finished even if it failed
+                tasks.finish()
+
+            summary[source] = {'queued': queued, 'seconds': time.time() - start, 'error': error}
+
+        with ThreadPoolExecutor(max_workers=len(self.sources), thread_name_prefix='runner') as executor:
+            list(executor.map(discover_source, self.sources))
+
+        for source in self.sources:
+            stats = summary[source]
+            status = f'failed ({stats["error"]})' if stats['error'] else 'finished'
+            logging.info(f'[Crawl Runner] Discovery of <{source}>: {status}, {stats["queued"]} pages queued in '
+                         f'{stats["seconds"]:.1f} s.')
+
+        if self.snapshots:
+            logging.info('[Crawl Runner] Waiting for workers to complete queued pages, then snapshot is committed.')
+
+            if self.wait_drained():
+                # Pages of sources whose discovery failed or whose tasks failed aren't removed from snapshot
+                self.snapshots.commit([source for source in self.sources if not summary[source]['error']
+                                       and not self.queue.summary(source).get('failed')])
+            else:
+                logging.error(f'[Crawl Runner] Workers didn\'t complete queued pages in {self.drain_timeout} s, '
+                              f'snapshot isn\'t committed. Pages of workers are committed by the next run.')
+
+        return summary
+
+    def wait_drained(self):
+        """
+        Waits until all tasks of selected sources are completed or failed. Tasks whose lease expired (worker crashed)
+        are queued again for other workers, or marked failed if they were leased max_attempts times
+        :return: True if work queue was drained before timeout
+        """
+        deadline = time.time() + self.drain_timeout
+
+        while True:
+            for source in self.sources:
+                self.queue.reclaim(source)
+
+            if all(self.queue.drained(source) for source in self.sources):
+                return True
+            if time.time() >= deadline:
+                return False
+
+            time.sleep(self.__drain_interval)
+
+    def close(self):
+        """
+        Reports statistics and releases shared resources
+        :return: None
+        """
+        self.session.stats.report()
+        self.scheduler.report()
+        self.writer.close()
+
+        if self.cache:
+            self.cache.report()
+
+        if self.dedup:
+            self.dedup.report()
+            self.dedup.close()
+
+        self.browsers.close()
+        self.parser.close()
+        self.fetcher.close()
+
+        for archive in (self.archive, self.replay):
+            if archive:
+                archive.report()
+                archive.close()
+
+        if self.queue:
+            for source in self.sources:
+                logging.info(f'[Crawl Runner] Work queue of <{source}>: {self.queue.summary(source)}.')
+            self.queue.close()
+
+
+def main(argv=None):
+    """
+    Command line entry point of the crawl runner
+    :param argv: Command line arguments. If not provided, sys.argv is used
+    :return: summary for each source
+    """
+    parser = argparse.ArgumentParser(description='Web scraping of partners, Boskalis and universities projects')
+    parser.add_argument('--sources', default=','.join(SOURCES),
+                        help=f'comma-separated sources to scrape (default: all of {", ".join(SOURCES)})')
+    parser.add_argument('--years', nargs='+', default=None,
+                        help='years of projects for sources which take years (default: defaults of sources)')
+    parser.add_argument('--path', default='export/', help='folder where the results should be')
+    parser.add_argument('--partners', default='partners.xlsx',
+                        help='file with list of partners\' websites: .xlsx, .csv or .jsonl')
+    parser.add_argument('--languages', default='EN',
+                        help='comma-separated languages of partners\' websites to scrape (all: all languages)')
+    parser.add_argument('--incremental', action='store_true', help='write only new or changed projects')
+    parser.add_argument('--resume', action='store_true', help='continue from checkpoints of the previous run')
+    parser.add_argument('--no-dedup', action='store_true',
+                        help='write duplicate pages and don\'t strip boilerplate repeated across pages')
+    parser.add_argument('--no-snapshots', action='store_true',
+                        help='don\'t commit snapshot of results and change feed of the run')
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help='number of processes which parse pages (default: number of cores, 0: parse inline)')
+    parser.add_argument('--output', default='txt,search',
+                        help='comma-separated outputs: txt (.txt file per project), jsonl or parquet (result store), '
+                             'search (full-text search index, queried by search.py)')
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help='port of endpoint with metrics in Prometheus text format')
+    parser.add_argument('--metrics-snapshot', default=None, help='JSON file to which metrics are saved periodically')
+    parser.add_argument('--metrics-interval', type=float, default=30, help='time in seconds between JSON snapshots')
+    parser.add_argument('--log-file', default='app.log', help='log file with JSON lines, rotated and compressed by size')
+    parser.add_argument('--log-max-bytes', type=int, default=10 * 2 ** 20, help='size of log file before rotation')
+    parser.add_argument('--quiet', action='store_true', help='don\'t print out log messages to console')
+    parser.add_argument('--profile', default=None, help='folder for profiles of export of each source')
+    parser.add_argument('--profile-tool', choices=['cprofile', 'pyinstrument'], default='cprofile',
+                        help='profiler used with --profile')
+    parser.add_argument('--mode', choices=['local', 'coordinator', 'worker'], default='local',
+                        help='local: discover and scrape in this process, coordinator: discover pages into work queue '
+                             '(and commit snapshot when workers are done), worker: scrape pages leased from work queue')
+    parser.add_argument('--queue', default=None,
+                        help='work queue of distributed crawl: SQLite file or redis:// URL (default: PATH/queue.db)')
+    parser.add_argument('--worker', default=None, help='name of the worker (default: host name and process id)')
+    parser.add_argument('--drain-timeout', type=float, default=6 * 3600,
+                        help='time in seconds for which coordinator waits for workers before snapshot is committed')
+    parser.add_argument('--record', action='store_true',
+                        help='record raw responses and rendered pages into archive (PATH/archive/)')
+    parser.add_argument('--replay', default=None,
+                        help='folder of archive recorded with --record: extraction runs against archived responses '
+                             'without network')
+    args = parser.parse_args(argv)
+
+    setup_logging(args.log_file, max_bytes=args.log_max_bytes, console=not args.quiet)
+
+    sources = args.sources.split(',')
+    unknown = [source for source in sources if source not in SOURCES]
+    if unknown:
+        parser.error(f'unknown sources: {", ".join(unknown)}')
+
+    queue = None
+    if args.mode != 'local':
+        from workqueue import open_queue
+        queue = open_queue(args.queue or os.path.join(args.path, 'queue.db'), worker=args.worker)
+
+    if args.record and args.replay:
+        parser.error('--record and --replay can\'t be used together')
+
+    archive, replay = None, None
+    if args.record or args.replay:
+        from archive import CrawlArchive
+        archive = CrawlArchive(os.path.join(args.path, 'archive', '')) if args.record else None
+        replay = CrawlArchive(os.path.join(args.replay, '')) if args.replay else None
+
+    languages = None if args.languages == 'all' else args.languages.split(',')
+    runner = CrawlRunner(os.path.join(args.path, ''), sources, args.years, args.output.split(','),
+                         args.partners, languages, args.incremental, args.resume, not args.no_dedup,
+                         not args.no_snapshots, args.parse_workers,
+                         profile_path=args.profile, profile_tool=args.profile_tool, queue=queue, archive=archive,
+                         replay=replay, drain_timeout=args.drain_timeout)
+
+    server = metrics.serve(args.metrics_port) if args.metrics_port is not None else None
+    snapshots = metrics.save_periodically(args.metrics_snapshot, args.metrics_interval) if args.metrics_snapshot else None
+
+    try:
+        return runner.discover() if args.mode == 'coordinator' else runner.run()
+    finally:
+        runner.close()
+
+        if snapshots:
+            snapshots.set()
+            metrics.save(args.metrics_snapshot)
+        if server:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
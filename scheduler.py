@@ -0,0 +1,250 @@
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Statuses with which websites ask to slow down (999 is returned by LinkedIn)
+THROTTLE_STATUSES = (429, 503, 999)
+
+# Statuses of transient server errors which are worth retrying
+RETRY_STATUSES = THROTTLE_STATUSES + (500, 502, 504)
+
+
+class _Host:
+    """
+    State of one host: token bucket, adaptive concurrency limit and backoff
+    """
+
+    def __init__(self, rate, burst, concurrency, max_concurrency):
+        self.rate = rate
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.limit = min(concurrency, max_concurrency)
+        self.max_limit = max_concurrency
+        self.active = 0
+        self.blocked_until = 0
+        self.latency = None
+        self.successes = 0
+        self.requests = 0
+        self.failures = 0
+        self.throttled = 0
+        self.condition = threading.Condition()
+
+
+class HostScheduler:
+    """
+    Politeness scheduler which decides when a request to a host may be sent.
+    Each host has a token bucket (requests per second) and a concurrency limit. Both are raised while
+    responses are fast and successful and cut in half when host throttles or fails (AIMD).
+    When host returns 429, 503 or 999, no request is sent to it until backoff (or Retry-After) expires.
+    """
+
+    def __init__(self, rate=2.0, burst=4, concurrency=4, max_rate=16.0, max_concurrency=16, retries=3,
+                 backoff=1.0, max_backoff=120.0, latency_target=2.0, limiter=None, pool_size=None):
+        """
+        Creates the instance of scheduler
+        :param rate: Initial number of requests per second to one host
+        :param burst: Maximum number of requests which may be sent to one host at once after idle period
+        :param concurrency: Initial number of requests sent to one host at the same time
+        :param max_rate: Upper limit for rate of one host
+        :param max_concurrency: Upper limit for concurrency of one host
+        :param retries: Number of retries of one request after transient error
+        :param backoff: Base delay in seconds for exponential backoff
+        :param max_backoff: Maximum delay in seconds between retries
+        :param latency_target: Response time in seconds below which host is considered healthy
+        :param limiter: Limiter shared by processes of distributed crawl (work queue), which spaces requests
+                        to each host across all of them. If not provided, requests are paced only in this process
+        :param pool_size: Function which returns number of kept-alive connections to the host of given URL
+                          (e.g. SessionPool.pool_size). If provided, concurrency of each host doesn't grow above it,
+                          so connections aren't discarded when the pool is full
+        """
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.latency_target = latency_target
+        self.limiter = limiter
+        self.pool_size = pool_size
+
+        self.__hosts = {}
+        self.__lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Waits until request to host of given URL may be sent and holds the slot while request is running
+        :param url: URL of the page
+        :return: context manager
+        """
+        state = self.__host(url)
+
+        with state.condition:
+            while True:
+                now = time.monotonic()
+
+                # Refilling token bucket
+                state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * state.rate)
+                state.refilled_at = now
+
+                if now < state.blocked_until:
+                    delay = state.blocked_until - now
+                elif state.active >= state.limit:
+                    delay = None
+                elif state.tokens < 1:
+                    delay = (1 - state.tokens) / state.rate
+                else:
+                    break
+
+                state.condition.wait(delay)
+
+            state.tokens -= 1
+            state.active += 1
+            state.requests += 1
+            rate = state.rate
+
+        try:
+            # Requests of other processes to the same host are counted as well
+            if self.limiter:
+                time.sleep(self.limiter.reserve(self.host(url), 1 / rate))
+
+            yield
+        finally:
+            with state.condition:
+                state.active -= 1
+                state.condition.notify_all()
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns delay before next attempt: jittered exponential backoff, but not less than Retry-After
+        :param attempt: Number of failed attempts (starting from 1)
+        :param retry_after: Delay in seconds requested by host
+        :return: delay in seconds
+        """
+        delay = random.uniform(0.5, 1.5) * min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return max(delay, min(retry_after, self.max_backoff)) if retry_after is not None else delay
+
+    def succeeded(self, url, latency):
+        """
+        Records successful request. Rate and concurrency are raised while host responds fast
+        :param url: URL of the page
+        :param latency: Response time in seconds
+        :return: None
+        """
+        state = self.__host(url)
+
+        with state.condition:
+            state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+            state.successes += 1
+
+            # Additive increase after each full window of healthy responses
+            if state.successes >= state.limit and state.latency < self.latency_target:
+                state.successes = 0
+                state.limit = min(state.max_limit, state.limit + 1)
+                state.rate = min(self.max_rate, state.rate + 1)
+                state.condition.notify_all()
+
+    def failed(self, url, attempt, retry_after=None, throttled=False):
+        """
+        Records failed request. Rate and concurrency are cut in half, throttled host is paused for all requests
+        :param url: URL of the page
+        :param attempt: Number of failed attempts of this request (starting from 1)
+        :param retry_after: Delay in seconds requested by host
+        :param throttled: True if host asked to slow down (429, 503, 999)
+        :return: delay in seconds before the request may be retried
+        """
+        state = self.__host(url)
+        delay = self.delay(attempt, retry_after)
+
+        with state.condition:
+            state.successes = 0
+            state.limit = max(1, state.limit // 2)
+            state.rate = max(self.rate / 8, state.rate / 2)
+            state.failures += 1
+
+            if throttled:
+                state.throttled += 1
+                state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+
+        if throttled:
+            logging.warning(f'[Scheduler] <{self.host(url)}> throttles requests, backing off for {delay:.1f} s.')
+
+            if self.limiter:
+                self.limiter.block(self.host(url), delay)
+
+        return delay
+
+    @staticmethod
+    def retry_after(response):
+        """
+        Returns delay requested by host in Retry-After header
+        :param response: Response
+        :return: delay in seconds or None if header is missing or invalid
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def host(url):
+        """
+        Returns host of given URL
+        :param url: URL of the page
+        :return: host in lower case
+        """
+        return urlsplit(url).netloc.lower()
+
+    def summary(self):
+        """
+        Returns current limits and counters for each host
+        :return: dict in format {host: {'requests': .., 'failures': .., 'throttled': .., 'rate': .., 'concurrency': ..}}
+        """
+        with self.__lock:
+            hosts = dict(self.__hosts)
+
+        return {host: {'requests': state.requests,
+                       'failures': state.failures,
+                       'throttled': state.throttled,
+                       'rate': state.rate,
+                       'concurrency': state.limit}
+                for host, state in hosts.items()}
+
+    def report(self):
+        """
+        Prints out and logs current limits and counters for each host
+        :return: None
+        """
+        for host, stats in sorted(self.summary().items()):
+            logging.info(f'[Scheduler] <{host}>: {stats["requests"]} requests, {stats["failures"]} failures, '
+                         f'{stats["throttled"]} throttled, {stats["rate"]:.1f} req/s, '
+                         f'concurrency {stats["concurrency"]}.')
+
+    def __host(self, url):
+        """
+        Returns state of host of given URL
+        :param url: URL of the page
+        :return: state of host
+        """
+        host = self.host(url)
+
+        with self.__lock:
+            if host not in self.__hosts:
+                limit = min(self.max_concurrency, self.pool_size(url)) if self.pool_size else self.max_concurrency
+                self.__hosts[host] = _Host(self.rate, self.burst, self.concurrency, limit)
+            return self.__hosts[host]
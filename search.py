@@ -0,0 +1,193 @@
+import os
+import re
+import sqlite3
+import argparse
+import threading
+
+# Indexed fields of records with their weights in ranking
+FIELDS = {'title': 10.0, 'text': 1.0, 'persons': 2.0, 'keywords': 5.0}
+
+
+class SearchIndex:
+    """
+    Full-text search index of scraped pages (SQLite FTS5, BM25 ranking).
+    Pages are indexed as scrapers write them, a page which is written again replaces its previous version,
+    unchanged pages aren't indexed again. Index can be queried while crawl is running.
+    """
+
+    def __init__(self, path, batch_size=500):
+        """
+        Creates the instance of index. Pages indexed by previous runs are kept
+        :param path: Path to the index file, e.g. export/search.db
+        :param batch_size: Number of pages indexed in one transaction
+        """
+        self.path = path
+        self.batch_size = batch_size
+
+        self.__pending = 0
+        self.__lock = threading.Lock()
+
+        if os.path.dirname(self.path) and not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+
+        # Connection is shared by scrapers running in different threads, access is serialized by the lock
+        self.__db = sqlite3.connect(self.path, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('PRAGMA synchronous=NORMAL')
+        self.__db.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5({", ".join(FIELDS)}, '
+                          f'source UNINDEXED, url UNINDEXED, year UNINDEXED, '
+                          f'tokenize="unicode61 remove_diacritics 2")')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS documents (url TEXT PRIMARY KEY, id INTEGER, content_hash TEXT)')
+        self.__db.commit()
+
+    def write(self, record, file=None, listing=None):
+        """
+        Indexes the record, pages are committed in batches
+        :param record: Record created by make_record
+        :param file: Ignored, used by TextWriter only
+        :param listing: Ignored, used by TextWriter only
+        :return: None
+        """
+        with self.__lock:
+            row = self.__db.execute('SELECT id, content_hash FROM documents WHERE url = ?', (record['url'],)).fetchone()
+
+            # If page didn't change since it was indexed
+            if row and row[1] == record['content_hash']:
+                return
+            if row:
+                self.__db.execute('DELETE FROM pages WHERE rowid = ?', (row[0],))
+
+            cursor = self.__db.execute(f'INSERT INTO pages ({", ".join(FIELDS)}, source, url, year) '
+                                       f'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                       [record.get(field) or '' for field in FIELDS]
+                                       + [record['source'], record['url'], record.get('year')])
+            self.__db.execute('INSERT OR REPLACE INTO documents (url, id, content_hash) VALUES (?, ?, ?)',
+                              (record['url'], cursor.lastrowid, record['content_hash']))
+
+            self.__pending += 1
+            if self.__pending >= self.batch_size:
+                self.__commit()
+
+    def keep(self, url):
+        """
+        Called for page which wasn't written, because it didn't change since the previous run. Nothing to do here
+        :param url: URL of the page
+        :return: None
+        """
+        pass
+
+    def flush(self):
+        """
+        Commits indexed pages
+        :return: None
+        """
+        with self.__lock:
+            self.__commit()
+
+    def close(self):
+        """
+        Commits indexed pages, merges segments of the index and closes it
+        :return: None
+        """
+        with self.__lock:
+            self.__commit()
+            self.__db.execute("INSERT INTO pages (pages) VALUES ('optimize')")
+            self.__db.commit()
+            self.__db.close()
+
+    def search(self, query, limit=10, source=None, year=None):
+        """
+        Finds pages matching the query, the best matches first
+        :param query: Words which pages should contain. Words can be restricted to field, e.g. 'keywords:robot',
+                      phrase can be quoted, e.g. '"digital twin"'
+        :param limit: Maximum number of returned pages
+        :param source: If provided, only pages of this source are returned, e.g. 'BUAS'
+        :param year: If provided, only pages of projects from this year are returned
+        :return: list of hits in format {'url': .., 'source': .., 'year': .., 'title': .., 'persons': ..,
+                 'keywords': .., 'snippet': .., 'score': ..}
+        """
+        conditions, parameters = ['pages MATCH ?'], [self.match_expression(query)]
+
+        if source is not None:
+            conditions.append('source = ?')
+            parameters.append(source)
+        if year is not None:
+            conditions.append('year = ?')
+            parameters.append(int(year))
+
+        weights = ', '.join(str(weight) for weight in FIELDS.values())
+        sql = (f'SELECT url, source, year, title, persons, keywords, snippet(pages, 1, "[", "]", " ... ", 16), '
+               f'bm25(pages, {weights}) AS score FROM pages WHERE {" AND ".join(conditions)} ORDER BY score LIMIT ?')
+
+        with self.__lock:
+            rows = self.__db.execute(sql, parameters + [limit]).fetchall()
+
+        return [{'url': url, 'source': source, 'year': year, 'title': title, 'persons': persons or None,
+                 'keywords': keywords or None, 'snippet': snippet, 'score': -score}
+                for url, source, year, title, persons, keywords, snippet, score in rows]
+
+    def __len__(self):
+        with self.__lock:
+            return self.__db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Converts query to FTS5 expression: all words should match, words are quoted,
+        so punctuation in them isn't taken as syntax of FTS5
+        :param query: Query, e.g. 'keywords:robot "digital twin" port'
+        :return: FTS5 expression
+        """
+        terms = []
+
+        for field, phrase, word in re.findall(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))', query):
+            text = (phrase or word).replace('"', '""')
+            if not text:
+                continue
+            terms.append(f'{field} : "{text}"' if field in FIELDS else f'"{text}"')
+
+        return ' AND '.join(terms)
+
+    def __commit(self):
+        if self.__pending:
+            self.__db.commit()
+            self.__pending = 0
+
+
+def main(argv=None):
+    """
+    Command line search in the index of scraped pages
+    :param argv: Command line arguments. If not provided, sys.argv is used
+    :return: list of hits
+    """
+    parser = argparse.ArgumentParser(description='Full-text search in scraped projects and partners\' websites')
+    parser.add_argument('query', help='words to search, e.g. \'keywords:robot "digital twin"\'')
+    parser.add_argument('--index', default='export/search.db', help='index file written by crawl with --output search')
+    parser.add_argument('--source', default=None, help='only pages of this source, e.g. BUAS')
+    parser.add_argument('--year', type=int, default=None, help='only projects from this year')
+    parser.add_argument('--limit', type=int, default=10, help='maximum number of hits')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.index):
+        parser.error(f'index {args.index} doesn\'t exist, run crawl with --output search first')
+
+    index = SearchIndex(args.index)
+    hits = index.search(args.query, args.limit, args.source, args.year)
+
+    for hit in hits:
+        print(f'{hit["score"]:6.2f}  [{hit["source"]}{", " + str(hit["year"]) if hit["year"] else ""}] {hit["title"]}')
+        print(f'        {hit["url"]}')
+        if hit['keywords']:
+            print(f'        Keywords: {hit["keywords"]}')
+        if hit['persons']:
+            print(f'        Persons: {" ".join(hit["persons"].split())}')
+        print(f'        {" ".join(hit["snippet"].split())}')
+
+    if not hits:
+        print('Nothing was found.')
+
+    return hits
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import requests
+import threading
+import logging
+import time
+from importlib.util import find_spec
+from collections import defaultdict
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib.parse import urlsplit
+from metrics import metrics
+
+
+class ConnectionStats:
+    """
+    Statistics of connection reuse for each host
+    """
+
+    def __init__(self):
+        """
+        Creates empty statistics
+        """
+        self.requests = defaultdict(int)
+        self.connections = defaultdict(int)
+        self.__lock = threading.Lock()
+
+    def request_sent(self, host):
+        """
+        Records one sent request
+        :param host: Host which received the request
+        :return: None
+        """
+        with self.__lock:
+            self.requests[host] += 1
+
+    def connection_opened(self, host):
+        """
+        Records one newly opened connection (TCP connection and TLS handshake)
+        :param host: Host to which connection was opened
+        :return: None
+        """
+        with self.__lock:
+            self.connections[host] += 1
+
+    def summary(self):
+        """
+        Returns statistics for each host
+        :return: dict in format {host: {'requests': .., 'connections': .., 'reused': ..}}
+        """
+        with self.__lock:
+            return {host: {'requests': self.requests[host],
+                           'connections': self.connections[host],
+                           'reused': max(self.requests[host] - self.connections[host], 0)}
+                    for host in self.requests}
+
+    def report(self):
+        """
+        Prints out and logs statistics for each host
+        :return: None
+        """
+        for host, stats in sorted(self.summary().items()):
+            logging.info(f'[Sessions] <{host}>: {stats["requests"]} requests, {stats["connections"]} new connections, '
+                         f'{stats["reused"]} reused.')
+
+
+def _counting_pool(pool_cls, stats):
+    """
+    Creates connection pool class which records every newly opened connection and measures how long it took.
+    DNS lookup and TCP connect are measured together, because urllib3 does them in one call
+    :param pool_cls: Connection pool class from urllib3
+    :param stats: Connection statistics
+    :return: connection pool class
+    """
+    class TimedConnection(pool_cls.ConnectionCls):
+        def _new_conn(self):
+            start = time.perf_counter()
+            try:
+                return super()._new_conn()
+            finally:
+                self.connect_seconds = time.perf_counter() - start
+                metrics.observe('connect_seconds', self.connect_seconds, host=self.host)
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+
+            # Time of TLS handshake
+            if pool_cls is HTTPSConnectionPool:
+                metrics.observe('tls_seconds', time.perf_counter() - start - getattr(self, 'connect_seconds', 0),
+                                host=self.host)
+
+    class CountingConnectionPool(pool_cls):
+        ConnectionCls = TimedConnection
+
+        def _new_conn(self):
+            stats.connection_opened(self.host)
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class _CountingAdapter(HTTPAdapter):
+    """
+    HTTP adapter whose connection pools record opened connections
+    """
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _counting_pool(HTTPConnectionPool, self.stats),
+                                                   'https': _counting_pool(HTTPSConnectionPool, self.stats)}
+
+
+class SessionPool:
+    """
+    Keep-alive HTTP session shared by all web scrapers.
+    Connections are pooled per host and reused between requests.
+    """
+
+    # Brotli is negotiated only if urllib3 is able to decode it
+    __brotli = find_spec('brotli') is not None or find_spec('brotlicffi') is not None
+
+    def __init__(self, default_pool_size=4, pool_sizes=None):
+        """
+        Creates the instance of session pool
+        :param default_pool_size: Number of kept-alive connections for each host
+        :param pool_sizes: Number of kept-alive connections for particular hosts in format {host: size}
+        """
+        self.default_pool_size = default_pool_size
+        self.pool_sizes = pool_sizes or {}
+        self.stats = ConnectionStats()
+
+        self.session = requests.Session()
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate, br' if self.__brotli else 'gzip, deflate',
+                                     'Connection': 'keep-alive'})
+
+        for scheme in ('http://', 'https://'):
+            self.session.mount(scheme, self.__adapter(default_pool_size))
+
+        for host, size in self.pool_sizes.items():
+            for scheme in ('http://', 'https://'):
+                self.session.mount(f'{scheme}{host}/', self.__adapter(size))
+
+    def get(self, url, **kwargs):
+        """
+        Sends GET request over pooled connection
+        :param url: URL of the page
+        :param kwargs: Additional keyword arguments for requests.Session.get
+        :return: response
+        """
+        self.stats.request_sent(urlsplit(url).hostname)
+        return self.session.get(url, **kwargs)
+
+    def pool_size(self, url):
+        """
+        Returns number of kept-alive connections to the host of given URL
+        :param url: URL of the page
+        :return: size of connection pool of the host
+        """
+        return self.pool_sizes.get(urlsplit(url).hostname, self.default_pool_size)
+
+    def close(self):
+        """
+        Closes all pooled connections
+        :return: None
+        """
+        self.session.close()
+
+    def __adapter(self, size):
+        """
+        Creates adapter with given number of pooled connections
+        :param size: Number of pooled connections per host
+        :return: adapter
+        """
+        return _CountingAdapter(self.stats, pool_connections=100, pool_maxsize=size)
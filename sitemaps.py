@@ -0,0 +1,75 @@
+import re
+import gzip
+import html
+import logging
+from urllib.parse import urlsplit
+
+_LOC = re.compile(r'<loc>\s*(.*?)\s*</loc>', re.IGNORECASE | re.DOTALL)
+_SITEMAP = re.compile(r'^\s*sitemap\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+
+
+def sitemap_urls(fetcher, site):
+    """
+    Finds sitemaps of the website: sitemaps listed in robots.txt or /sitemap.xml
+    :param fetcher: Fetch engine
+    :param site: Any URL of the website
+    :return: list of URLs of sitemaps
+    """
+    parts = urlsplit(site)
+    root = f'{parts.scheme}://{parts.netloc}'
+
+    try:
+        r = fetcher.get(root + '/robots.txt')
+        if r.status_code in (200, 304):
+            sitemaps = _SITEMAP.findall(r.text)
+            if sitemaps:
+                return sitemaps
+    except Exception as e:
+        logging.warning(f'[Sitemaps] robots.txt of <{root}> couldn\'t be read: {e}.')
+
+    return [root + '/sitemap.xml']
+
+
+def sitemap_links(fetcher, site, pattern=None, max_depth=3):
+    """
+    Reads links of pages from sitemaps of the website. Sitemap indexes are followed, gzipped sitemaps are unpacked.
+    Pages are read without rendering anything, so it's the fastest way to discover pages of the website
+    :param fetcher: Fetch engine
+    :param site: Any URL of the website
+    :param pattern: Regular expression which links of pages should match. If not provided, all links are returned
+    :param max_depth: Maximum depth of nested sitemap indexes
+    :return: list of links in order of sitemaps, empty if website has no sitemap
+    """
+    pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+    sitemaps = sitemap_urls(fetcher, site)
+    seen = set(sitemaps)
+    links = []
+
+    for depth in range(max_depth):
+        nested = []
+
+        for url, r, error in fetcher.fetch_all(sitemaps):
+            if error or r.status_code not in (200, 304):
+                logging.warning(f'[Sitemaps] Sitemap <{url}> couldn\'t be read: {error or r.status_code}.')
+                continue
+
+            content = r.content
+            # If sitemap is gzipped and server didn't unpack it
+            if content[:2] == b'\x1f\x8b':
+                content = gzip.decompress(content)
+
+            text = content.decode('utf-8', errors='replace')
+            locations = [html.unescape(location) for location in _LOC.findall(text)]
+
+            # Sitemap index lists other sitemaps
+            if re.search(r'<sitemapindex', text[:1000], re.IGNORECASE):
+                nested.extend(location for location in locations if location not in seen)
+                seen.update(locations)
+            else:
+                links.extend(location for location in locations if not pattern or pattern.search(location))
+
+        if not nested:
+            break
+        sitemaps = nested
+
+    return links
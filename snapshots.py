@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import gzip
+import time
+import difflib
+import logging
+import threading
+from metrics import current_source
+
+# Text is compared sentence by sentence, so diffs of long single-line texts stay readable
+_SENTENCE = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+class SnapshotStore:
+    """
+    Versioned snapshots of crawl outputs with content-addressed storage: text of each page is stored once
+    per distinct content (objects/), each run commits a snapshot mapping URLs to content hashes (runs/)
+    and a change feed with added, modified and removed pages (changes/).
+    Pages written by a run which was interrupted are kept in pending.jsonl and the next run continues them.
+    In distributed crawl each worker appends its pages to its own pending file and only the coordinator commits,
+    merging pending files of all workers.
+    """
+
+    def __init__(self, path, max_diff_lines=40, max_removed=0.5, worker=None):
+        """
+        Creates the instance of snapshot store. Snapshots committed by previous runs are kept
+        :param path: Path to the folder of the store
+        :param max_diff_lines: Maximum number of lines of text diff of one modified page in change feed
+        :param max_removed: Maximum share of pages of one scraper which can be removed by one run. If more pages
+                            are missing, scraper most likely failed to list them, so they aren't removed
+        :param worker: Name of worker of distributed crawl. If provided, pages are appended to pending file
+                       of the worker right away, so they are stored before their tasks are acknowledged
+        """
+        self.path = path
+        self.max_diff_lines = max_diff_lines
+        self.max_removed = max_removed
+        self.worker = worker
+
+        # Pages written or kept by this run in format {url: {'source': .., 'scraper': .., 'title': .., 'hash': ..}}
+        self.pages = {}
+
+        self.__unsaved = []
+        self.__lock = threading.Lock()
+
+        for folder in ('objects', 'runs', 'changes'):
+            if not os.path.exists(os.path.join(self.path, folder)):
+                os.makedirs(os.path.join(self.path, folder))
+
+        self.head = self.__read_head()
+        self.previous = self.snapshot(self.head) if self.head else {}
+
+        if os.path.exists(self.__pending_path):
+            self.pages.update(self.__read_pending(self.__pending_path))
+            logging.info(f'[Snapshots] {len(self.pages)} pages of interrupted run were loaded, the run is continued.')
+
+    def write(self, record, file=None, listing=None):
+        """
+        Stores text of the record (if it isn't stored yet) and adds the page to the snapshot of this run
+        :param record: Record created by make_record
+        :param file: Ignored, used by TextWriter only
+        :param listing: Ignored, used by TextWriter only
+        :return: None
+        """
+        self.__store_object(record['content_hash'], record['text'])
+
+        entry = {'source': record['source'], 'scraper': current_source.get() or None, 'title': record['title'],
+                 'hash': record['content_hash']}
+
+        with self.__lock:
+            self.pages[record['url']] = entry
+            self.__unsaved.append((record['url'], entry))
+
+        if self.worker:
+            self.flush()
+
+    def keep(self, url):
+        """
+        Adds the page which didn't change since the previous run to the snapshot of this run
+        :param url: URL of the page
+        :return: None
+        """
+        entry = self.previous.get(url)
+
+        # If text of the page wasn't stored by previous runs, page gets into snapshot when it's written
+        if entry is None:
+            return
+
+        with self.__lock:
+            if url not in self.pages:
+                self.pages[url] = entry
+                self.__unsaved.append((url, entry))
+
+        if self.worker:
+            self.flush()
+
+    def flush(self):
+        """
+        Appends pages added to the snapshot of this run to pending file
+        :return: None
+        """
+        with self.__lock:
+            if self.__unsaved:
+                with open(self.__pending_path, 'at') as f:
+                    f.writelines(json.dumps(line, ensure_ascii=False) + '\n' for line in self.__unsaved)
+                self.__unsaved = []
+
+    def close(self):
+        """
+        Saves pages of this run which wasn't committed, so the next run continues it
+        :return: None
+        """
+        self.flush()
+
+    def commit(self, finished=None):
+        """
+        Commits snapshot of this run and writes change feed against the previous snapshot.
+        Pages which weren't written or kept by this run are carried over from the previous snapshot,
+        except pages of finished scrapers, which are removed. Pages of workers of distributed crawl are merged
+        from their pending files, so only one process may commit (the coordinator, when workers are done)
+        :param finished: Names of scrapers which finished the crawl, e.g. ['tudelft', 'general']
+        :return: change feed in format [{'change': 'added', 'modified' or 'removed', 'url': .., 'source': ..,
+                 'title': .., 'hash': .., 'previous_hash': .., 'similarity': .., 'diff': ..}]
+        """
+        self.flush()
+
+        pending = self.__pending_files()
+        with self.__lock:
+            pages = dict(self.pages)
+        for path in pending:
+            if path != self.__pending_path:
+                pages.update(self.__read_pending(path))
+
+        removed = self.__removed(pages, set(finished or []))
+        snapshot = {**{url: entry for url, entry in self.previous.items() if url not in removed}, **pages}
+
+        changes = []
+        for url, entry in pages.items():
+            previous = self.previous.get(url)
+
+            if previous is None:
+                changes.append({'change': 'added', 'url': url, 'source': entry['source'], 'title': entry['title'],
+                                'hash': entry['hash']})
+            elif previous['hash'] != entry['hash']:
+                similarity, diff = self.diff(self.text(previous['hash']), self.text(entry['hash']))
+                changes.append({'change': 'modified', 'url': url, 'source': entry['source'], 'title': entry['title'],
+                                'hash': entry['hash'], 'previous_hash': previous['hash'],
+                                'similarity': round(similarity, 3), 'diff': diff})
+
+        for url in removed:
+            entry = self.previous[url]
+            changes.append({'change': 'removed', 'url': url, 'source': entry['source'], 'title': entry['title'],
+                            'previous_hash': entry['hash']})
+
+        run = self.__new_run()
+        self.__write_file(os.path.join(self.path, 'changes', run + '.jsonl.gz'),
+                          ''.join(json.dumps(change, ensure_ascii=False) + '\n' for change in changes))
+        self.__write_file(os.path.join(self.path, 'runs', run + '.json.gz'),
+                          json.dumps({'run': run, 'parent': self.head, 'pages': snapshot}, ensure_ascii=False))
+
+        # Snapshot becomes the latest one only when it's completely written
+        self.__write_file(os.path.join(self.path, 'HEAD'), run, compress=False)
+        for path in pending:
+            os.remove(path)
+
+        counts = {kind: sum(change['change'] == kind for change in changes) for kind in ('added', 'modified', 'removed')}
+        logging.info(f'[Snapshots] Snapshot {run} with {len(snapshot)} pages was committed: {counts["added"]} added, '
+                     f'{counts["modified"]} modified, {counts["removed"]} removed.')
+
+        self.head, self.previous = run, snapshot
+        with self.__lock:
+            self.pages = {}
+
+        return changes
+
+    def runs(self):
+        """
+        Lists committed snapshots
+        :return: list of run identifiers from the oldest to the latest
+        """
+        return sorted(name[:-len('.json.gz')] for name in os.listdir(os.path.join(self.path, 'runs'))
+                      if name.endswith('.json.gz'))
+
+    def snapshot(self, run):
+        """
+        Reads snapshot of the run
+        :param run: Run identifier
+        :return: dict in format {url: {'source': .., 'scraper': .., 'title': .., 'hash': ..}}
+        """
+        with gzip.open(os.path.join(self.path, 'runs', run + '.json.gz'), 'rt', encoding='utf-8') as f:
+            return json.load(f)['pages']
+
+    def changes(self, since=None):
+        """
+        Reads change feeds of runs committed after the given one
+        :param since: Run identifier. If not provided, change feeds of all runs are read
+        :return: generator of tuples (run identifier, change)
+        """
+        for run in self.runs():
+            if since is not None and run <= since:
+                continue
+
+            with gzip.open(os.path.join(self.path, 'changes', run + '.jsonl.gz'), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield run, json.loads(line)
+
+    def text(self, content_hash):
+        """
+        Reads stored text
+        :param content_hash: Content hash of the text
+        :return: text
+        """
+        with gzip.open(self.__object_path(content_hash), 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def diff(self, before, after):
+        """
+        Compares two versions of text sentence by sentence
+        :param before: Previous text
+        :param after: Current text
+        :return: tuple (similarity from 0 to 1, unified diff without context limited to max_diff_lines lines)
+        """
+        before, after = _SENTENCE.split(before.strip()), _SENTENCE.split(after.strip())
+        similarity = difflib.SequenceMatcher(None, before, after, autojunk=False).ratio()
+
+        lines = list(difflib.unified_diff(before, after, lineterm='', n=0))[2:]
+        if len(lines) > self.max_diff_lines:
+            lines = lines[:self.max_diff_lines] + [f'... {len(lines) - self.max_diff_lines} more lines']
+
+        return similarity, '\n'.join(lines)
+
+    @property
+    def __pending_path(self):
+        return os.path.join(self.path, f'pending-{self.worker}.jsonl' if self.worker else 'pending.jsonl')
+
+    def __pending_files(self):
+        """
+        Lists pending files of this run and of all workers of distributed crawl
+        :return: list of paths
+        """
+        return [os.path.join(self.path, name) for name in sorted(os.listdir(self.path))
+                if name == 'pending.jsonl' or name.startswith('pending-') and name.endswith('.jsonl')]
+
+    @staticmethod
+    def __read_pending(path):
+        """
+        Reads pages from pending file, line which was written partially by interrupted run is skipped
+        :param path: Path to the pending file
+        :return: dict in format {url: {'source': .., 'scraper': .., 'title': .., 'hash': ..}}
+        """
+        pages = {}
+
+        with open(path, 'rt') as f:
+            for line in f:
+                try:
+                    url, entry = json.loads(line)
+                except ValueError:
+                    continue
+                pages[url] = entry
+
+        return pages
+
+    def __removed(self, pages, finished):
+        """
+        Finds pages of the previous snapshot which finished scrapers didn't write or keep
+        :param pages: Pages written or kept by this run
+        :param finished: Names of scrapers which finished the crawl
+        :return: list of URLs of removed pages
+        """
+        missing, total = {}, {}
+
+        for url, entry in self.previous.items():
+            if entry.get('scraper') in finished:
+                total[entry['scraper']] = total.get(entry['scraper'], 0) + 1
+                if url not in pages:
+                    missing.setdefault(entry['scraper'], []).append(url)
+
+        removed = []
+        for scraper, urls in missing.items():
+            if len(urls) > self.max_removed * total[scraper]:
+                logging.warning(f'[Snapshots] {len(urls)} of {total[scraper]} pages of <{scraper}> are missing, '
+                                f'they are kept, because scraper most likely failed to list them.')
+            else:
+                removed.extend(urls)
+
+        return removed
+
+    def __object_path(self, content_hash):
+        return os.path.join(self.path, 'objects', content_hash[:2], content_hash + '.txt.gz')
+
+    def __store_object(self, content_hash, text):
+        """
+        Stores text, if text with the same content hash isn't stored yet
+        :param content_hash: Content hash of the text
+        :param text: Text
+        :return: None
+        """
+        path = self.__object_path(content_hash)
+        if os.path.exists(path):
+            return
+
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Temporary file is unique per thread, so the same text written by two scrapers doesn't collide
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(gzip.compress(text.encode('utf-8')))
+        os.replace(tmp, path)
+
+    def __read_head(self):
+        """
+        Reads identifier of the latest committed snapshot
+        :return: run identifier or None if no snapshot was committed
+        """
+        try:
+            with open(os.path.join(self.path, 'HEAD'), 'rt') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def __new_run(self):
+        """
+        Returns identifier of new run, identifiers are ordered by time of commit
+        :return: run identifier, e.g. '20211130T101500'
+        """
+        run = time.strftime('%Y%m%dT%H%M%S')
+        runs = set(self.runs())
+
+        n = 1
+        while (run if n == 1 else f'{run}-{n}') in runs:
+            n += 1
+
+        return run if n == 1 else f'{run}-{n}'
+
+    @staticmethod
+    def __write_file(path, content, compress=True):
+        """
+        Atomically writes the file
+        :param path: Path to the file
+        :param content: Content of the file
+        :param compress: If True, content is gzipped
+        :return: None
+        """
+        tmp = path + '.tmp'
+
+        with open(tmp, 'wb') as f:
+            f.write(gzip.compress(content.encode('utf-8')) if compress else content.encode('utf-8'))
+        os.replace(tmp, path)
@@ -0,0 +1,371 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from search import SearchIndex
+
+# Fields of one record in result store
+FIELDS = ('source', 'url', 'title', 'text', 'persons', 'keywords', 'year', 'fetched_at', 'content_hash')
+
+
+def _pyarrow():
+    """
+    Imports pyarrow. It's heavy to import, so it's loaded only when Parquet shards are written or read
+    :return: pyarrow module (with pyarrow.parquet)
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet result store requires pyarrow!') from None
+
+    return pyarrow
+
+
+def make_record(source, url, title, text, persons=None, keywords=None, year=None):
+    """
+    Creates record of one scraped page
+    :param source: Name of the source, e.g. 'TU Delft'
+    :param url: URL of the page
+    :param title: Title of the project (or name of the page)
+    :param text: Exported text of the page
+    :param persons: Persons related to the project
+    :param keywords: Keywords of the project
+    :param year: Year of the project, if it's known
+    :return: record in format {field: value}
+    """
+    return {'source': source,
+            'url': url,
+            'title': title,
+            'text': text,
+            'persons': persons or None,
+            'keywords': keywords or None,
+            'year': int(year) if year else None,
+            'fetched_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'content_hash': hashlib.sha256(text.encode('utf-8')).hexdigest()}
+
+
+class TextWriter:
+    """
+    Exporter which writes each record to its own .txt file and lists titles in Projects.txt.
+    Colliding titles get a suffix instead of overwriting files of other projects.
+    """
+
+    def __init__(self):
+        """
+        Creates the instance of exporter
+        """
+        # Paths written during this run are kept in private temporary database on disk (removed when it's closed),
+        # so memory doesn't grow with the number of pages
+        self.__files = sqlite3.connect('', isolation_level=None, check_same_thread=False)
+        self.__files.execute('CREATE TABLE files (path TEXT PRIMARY KEY, url TEXT)')
+        self.__listings = {}
+        self.__lock = threading.Lock()
+
+    def write(self, record, file=None, listing=None):
+        """
+        Writes text of the record
+        :param record: Record created by make_record
+        :param file: Path to the .txt file. If not provided, record isn't exported
+        :param listing: Path to the file with list of titles. If not provided, title isn't listed
+        :return: path to the written file
+        """
+        if file is None:
+            return None
+
+        with self.__lock:
+            file = self.__unique(file, record['url'])
+
+            # If it's first file in the folder
+            if not os.path.exists(os.path.dirname(file)):
+                os.makedirs(os.path.dirname(file))
+
+            with open(file, 'wt') as f:
+                f.write(record['text'])
+
+            if listing:
+                if listing not in self.__listings:
+                    self.__listings[listing] = open(listing, 'a+')
+                self.__listings[listing].write(record['title'] + '\n')
+
+        return file
+
+    def keep(self, url):
+        """
+        Called for page which wasn't written, because it didn't change since the previous run. Nothing to do here
+        :param url: URL of the page
+        :return: None
+        """
+        pass
+
+    def flush(self):
+        """
+        Flushes files with lists of titles
+        :return: None
+        """
+        with self.__lock:
+            for f in self.__listings.values():
+                f.flush()
+
+    def close(self):
+        """
+        Closes files with lists of titles
+        :return: None
+        """
+        with self.__lock:
+            for f in self.__listings.values():
+                f.close()
+            self.__listings = {}
+
+    def __unique(self, file, url):
+        """
+        Returns path which wasn't written for another page during this run
+        :param file: Path to the .txt file
+        :param url: URL of the page
+        :return: path to the .txt file
+        """
+        base, extension = os.path.splitext(file)
+        n = 1
+
+        while True:
+            self.__files.execute('INSERT OR IGNORE INTO files (path, url) VALUES (?, ?)', (file, url))
+            if self.__files.execute('SELECT url FROM files WHERE path = ?', (file,)).fetchone()[0] == url:
+                return file
+
+            n += 1
+            file = f'{base} ({n}){extension}'
+
+
+class ShardWriter:
+    """
+    Result store which streams records into batched compressed shards: gzipped JSONL or Parquet.
+    Index (index.json) maps URL of each page to its shard and position, the latest record of the page wins.
+    """
+
+    def __init__(self, path, format='jsonl', batch_size=500, shard_size=20000):
+        """
+        Creates the instance of result store. Shards written by previous runs are kept
+        :param path: Path to the folder of the store
+        :param format: Format of shards: 'jsonl' (gzipped JSON lines) or 'parquet' (requires pyarrow)
+        :param batch_size: Number of records buffered before they are written
+        :param shard_size: Maximum number of records in one JSONL shard. Parquet file can't be appended,
+                           so each written batch of Parquet records is a shard of its own
+        """
+        if format not in ('jsonl', 'parquet'):
+            raise ValueError(f'Unknown format of result store: {format}!')
+        if format == 'parquet':
+            _pyarrow()
+
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.shard_size = shard_size
+        self.index = {}
+
+        self.__batch = []
+        self.__unsaved = False
+        self.__shard = None
+        self.__shard_records = 0
+        self.__lock = threading.Lock()
+
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+
+        if os.path.exists(self.__index_path):
+            try:
+                with open(self.__index_path, 'rt') as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f'[Result Store] Index <{self.__index_path}> couldn\'t be read, it starts empty: {e}.')
+
+        self.__shards = len([name for name in os.listdir(self.path) if name.startswith('shard-')])
+
+    def write(self, record, file=None, listing=None):
+        """
+        Buffers the record, full batch is written to the current shard
+        :param record: Record created by make_record
+        :param file: Ignored, used by TextWriter only
+        :param listing: Ignored, used by TextWriter only
+        :return: None
+        """
+        with self.__lock:
+            self.__batch.append(record)
+
+            if len(self.__batch) >= self.batch_size:
+                self.__write_batch()
+
+    def keep(self, url):
+        """
+        Called for page which wasn't written, because it didn't change since the previous run. Nothing to do here
+        :param url: URL of the page
+        :return: None
+        """
+        pass
+
+    def flush(self):
+        """
+        Writes buffered records and saves the index
+        :return: None
+        """
+        with self.__lock:
+            if self.__batch:
+                self.__write_batch()
+
+            # Full batches may have been written by write() since the index was saved
+            if self.__unsaved:
+                self.__save_index()
+
+    def close(self):
+        """
+        Writes buffered records and saves the index
+        :return: None
+        """
+        self.flush()
+
+    def read(self):
+        """
+        Reads the latest record of each page
+        :return: generator of records
+        """
+        self.flush()
+
+        shards = {}
+        for url, entry in self.index.items():
+            shards.setdefault(entry['shard'], set()).add(entry['position'])
+
+        for shard, positions in sorted(shards.items()):
+            for i, record in enumerate(self.__read_shard(shard)):
+                if i in positions:
+                    yield record
+
+    @property
+    def __index_path(self):
+        return os.path.join(self.path, 'index.json')
+
+    def __write_batch(self):
+        """
+        Writes buffered records to the current shard. JSONL shard gets one gzip member per batch,
+        Parquet shard is written at once, so each batch starts a new one
+        :return: None
+        """
+        if (self.__shard is None or self.format == 'parquet'
+                or self.__shard_records + len(self.__batch) > self.shard_size):
+            self.__shard = f'shard-{self.__shards:05d}.{"jsonl.gz" if self.format == "jsonl" else "parquet"}'
+            self.__shard_records = 0
+            self.__shards += 1
+
+        file = os.path.join(self.path, self.__shard)
+
+        if self.format == 'jsonl':
+            lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in self.__batch)
+            with open(file, 'ab') as f:
+                f.write(gzip.compress(lines.encode('utf-8')))
+        else:
+            pyarrow = _pyarrow()
+            table = pyarrow.Table.from_pylist([{field: record.get(field) for field in FIELDS}
+                                               for record in self.__batch])
+            pyarrow.parquet.write_table(table, file, compression='zstd')
+
+        for i, record in enumerate(self.__batch):
+            self.index[record['url']] = {'shard': self.__shard,
+                                         'position': self.__shard_records + i,
+                                         'source': record['source'],
+                                         'title': record['title'],
+                                         'content_hash': record['content_hash']}
+
+        self.__shard_records += len(self.__batch)
+        self.__batch = []
+        self.__unsaved = True
+
+    def __read_shard(self, shard):
+        """
+        Reads all records of the shard
+        :param shard: Name of the shard
+        :return: generator of records
+        """
+        file = os.path.join(self.path, shard)
+
+        if shard.endswith('.jsonl.gz'):
+            with gzip.open(file, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+        else:
+            yield from _pyarrow().parquet.read_table(file).to_pylist()
+
+    def __save_index(self):
+        """
+        Atomically saves the index
+        :return: None
+        """
+        tmp = self.__index_path + '.tmp'
+
+        with open(tmp, 'wt') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.__index_path)
+
+        self.__unsaved = False
+
+
+class MultiWriter:
+    """
+    Writer which passes each record to several writers, e.g. to .txt exporter and to result store
+    """
+
+    def __init__(self, *writers):
+        """
+        Creates the instance of writer
+        :param writers: Writers
+        """
+        self.writers = writers
+
+    def write(self, record, file=None, listing=None):
+        """
+        Writes the record with all writers
+        :param record: Record created by make_record
+        :param file: Path to the .txt file
+        :param listing: Path to the file with list of titles
+        :return: path to the written .txt file (if any)
+        """
+        written = None
+        for writer in self.writers:
+            written = writer.write(record, file, listing) or written
+        return written
+
+    def keep(self, url):
+        for writer in self.writers:
+            writer.keep(url)
+
+    def flush(self):
+        for writer in self.writers:
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+
+
+def open_writer(path, outputs=('txt',)):
+    """
+    Creates writer shared by all web scrapers
+    :param path: Path to the folder where the results should be
+    :param outputs: Outputs: 'txt' (.txt file per project), 'jsonl' or 'parquet' (shards in path/store/),
+                    'search' (full-text search index path/search.db)
+    :return: writer
+    """
+    writers = []
+
+    for output in outputs:
+        if output == 'txt':
+            writers.append(TextWriter())
+        elif output in ('jsonl', 'parquet'):
+            writers.append(ShardWriter(os.path.join(path, 'store'), output))
+        elif output == 'search':
+            writers.append(SearchIndex(os.path.join(path, 'search.db')))
+        else:
+            raise ValueError(f'Unknown output: {output}!')
+
+    return writers[0] if len(writers) == 1 else MultiWriter(*writers)
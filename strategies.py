@@ -0,0 +1,91 @@
+import os
+import json
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+# Page is downloaded via requests
+HTTP = 'http'
+# Page is rendered in headless browser
+BROWSER = 'browser'
+# Host doesn't allow web scraping at all (e.g. LinkedIn returns 999)
+BLOCKED = 'blocked'
+
+
+class StrategyCache:
+    """
+    Persistent cache of strategies learned for each host in format {host: {'strategy': .., 'learned_at': ..}}.
+    Pages of host which needs browser aren't requested via requests first, pages of blocked host are skipped.
+    Entries expire, so strategy is learned again when website changes.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        """
+        Creates the instance of cache and loads strategies learned by previous runs
+        :param path: Path to the cache file
+        :param ttl: Time in seconds after which learned strategy expires
+        """
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+        self.__lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rt') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f'[Strategies] Cache <{self.path}> couldn\'t be read, strategies will be learned '
+                                f'again: {e}.')
+
+    def get(self, url):
+        """
+        Returns strategy learned for host of given URL
+        :param url: URL of the page
+        :return: HTTP, BROWSER, BLOCKED or None if strategy isn't known or expired
+        """
+        with self.__lock:
+            entry = self.entries.get(self.host(url))
+
+        if entry is None or time.time() - entry['learned_at'] > self.ttl:
+            return None
+        return entry['strategy']
+
+    def learn(self, url, strategy):
+        """
+        Records strategy for host of given URL. Already known strategy isn't renewed, so it expires in time
+        :param url: URL of the page
+        :param strategy: HTTP, BROWSER or BLOCKED
+        :return: None
+        """
+        if self.get(url) == strategy:
+            return
+
+        with self.__lock:
+            self.entries[self.host(url)] = {'strategy': strategy, 'learned_at': time.time()}
+
+        logging.info(f'[Strategies] <{self.host(url)}> needs strategy "{strategy}".')
+
+    @staticmethod
+    def host(url):
+        """
+        Returns host of given URL
+        :param url: URL of the page
+        :return: host in lower case
+        """
+        return urlsplit(url).netloc.lower()
+
+    def save(self):
+        """
+        Atomically saves the cache
+        :return: None
+        """
+        tmp = self.path + '.tmp'
+
+        with self.__lock:
+            entries = dict(self.entries)
+
+        with open(tmp, 'wt') as f:
+            json.dump(entries, f, indent=1)
+        os.replace(tmp, self.path)
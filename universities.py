@@ -1,10 +1,19 @@
 import requests
-from bs4 import BeautifulSoup
 import os
-from selenium import webdriver
+import re
 import logging
-
-
+from fetcher import ConcurrentFetcher
+from browser import BrowserPool
+from cache import ResponseCache
+from manifest import CrawlManifest
+from checkpoint import Checkpoint
+from parsing import make_soup, parsed, parse_only
+from parse_pool import ParsePool
+from store import TextWriter, make_record
+from registry import register
+
+
+@register('tudelft', export='export_projects', years=[2019, 2020], discover='discover_tasks', key=lambda task: task[0])
 class TUDelftWebScraper:
     """
     Web scraper for university "TU Delft"
@@ -12,123 +21,328 @@ class TUDelftWebScraper:
 
     __projects_url = 'https://www.tudelft.nl/en/innovatie-impact/ontwikkeling-innovatie/innovation-projects?lookup[254940][filter][51][]='
 
-    def __init__(self, years, path_to_results):
+    # Parts of pages which are parsed, everything else is skipped by parser
+    listing_tags = parse_only('a')
+    project_tags = parse_only('h2', ('div', {'class': 'sm-12 md-6'}))
+
+    def __init__(self, years, path_to_results, fetcher=None, incremental=False, resume=False, parser=None, writer=None,
+                 dedup=None, tasks=None):
         """
         Creates the instance of web scraper for university "TU Delft"
         :param years: List of years from which projects should be web scraped
         :param path_to_results: Path to the folder where the results should be
+        :param fetcher: Shared fetch engine. If not provided, new one is created
+        :param incremental: If True, only new or changed projects are written
+        :param resume: If True, crawl continues from the checkpoint of the previous run
+        :param parser: Shared pool of processes which parse pages. If not provided, new one is created
+        :param writer: Shared writer of results. If not provided, projects are written to .txt files
+        :param dedup: Shared deduplicator. If not provided, duplicate projects are written
+        :param tasks: Work queue of distributed crawl. If provided, links are leased from the queue instead of discovered
         """
         self.years = years
         self.path_to_results = path_to_results + '/TUDelft_projects/'
+        self.fetcher = fetcher or ConcurrentFetcher(cache=ResponseCache(path_to_results + '/.cache/'))
+        self.manifest = CrawlManifest(self.path_to_results + 'manifest.json') if incremental else None
+        self.checkpoint = Checkpoint(self.path_to_results + 'checkpoint.db', resume,
+                                     on_save=self.save_state, on_done=self.page_done, on_failed=self.page_failed)
+        self.parser = parser or ParsePool()
+        self.writer = writer or TextWriter()
+        self.dedup = dedup
+        self.tasks = tasks
+
+        # Year of each discovered project which wasn't scraped yet (known from page with list of projects where project
+        # was found), year is removed once the project is scraped
+        self.link_years = {}
 
         if not isinstance(years, list):
-            print('[TU Delft Web Scraper] Years should be provided as a list!')
+            logging.error('[TU Delft Web Scraper] Years should be provided as a list!')
 
     def export_projects(self):
         """
         Exports web scraped projects to .txt files
         :return: None
         """
-        project_links = []
-
         if not os.path.exists(self.path_to_results):
             os.makedirs(self.path_to_results)
 
-        # Iterating through pages with projects from each given year
-        for year in self.years:
-            url = f'{self.__projects_url}{year}'
+        # Number of project pages which were read in this run (completed or failed)
+        pages = 0
 
-            try:
-                r = requests.get(url)
-            except requests.exceptions.ConnectionError:
-                print(f'[TU Delft Web Scraper] Error for page <{url}>: connection refused!')
-                logging.exception(f'[TU Delft Web Scraper] Error for page <{url}>: connection refused!')
+        # Fetching links concurrently while they are still being discovered, pages are parsed in processes of parse pool
+        for link, r, record, error in self.parser.parse_all(self.fetcher.fetch_all(self.discover_links()), self.extract_project):
+            pages += 1
+            year = self.link_years.pop(link, None)
+
+            if isinstance(error, requests.exceptions.ConnectionError):
+                logging.error(f'[TU Delft Web Scraper] Error for page <{link}>: connection refused!')
+                self.checkpoint.mark_failed(link)
                 continue
-            except Exception as e:
-                print(f'[TU Delft Web Scraper] Error for page {url}: {e}.')
-                logging.exception(f'[TU Delft Web Scraper] Error for page {url}: {e}.')
+            elif error and r is None:
+                logging.error(f'[TU Delft Web Scraper] Error for page {link}: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+            elif error:
+                logging.error(f'[TU Delft Web Scraper] Error while scraping page <{link}>: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+
+            # If project wasn't modified since previous run
+            if r.status_code == 304:
+                self.writer.keep(link)
+                self.checkpoint.mark_done(link)
+                continue
+            elif r.status_code != 200:
+                logging.error(f'[TU Delft Web Scraper] Project <{link}> wasn\'t scraped due Error {r.status_code}.')
+                self.checkpoint.mark_failed(link)
                 continue
 
             try:
-                soup = BeautifulSoup(r.content, 'html.parser')
+                title = record['title']
+                text = f'Title: {title} \n' + record['text']
 
-                # Looking for button 'Last page'
-                button_lst_page = soup.find('a', attrs={'aria-label': 'Last page'})
+                # If project didn't change since previous run
+                if self.manifest and not self.manifest.changed(link, text):
+                    self.writer.keep(link)
+                    self.checkpoint.mark_done(link)
+                    continue
 
-                # If page has button 'Last page'
-                if button_lst_page:
-                    pos = button_lst_page.get('href').find('Page%5D=')
+                # If the same project was already scraped from another page
+                original = self.dedup.duplicate(link, text) if self.dedup else None
+                if original:
+                    logging.info(f'[TU Delft Web Scraper] Project <{link}> was skipped, it\'s duplicate of <{original}>.')
+                    self.checkpoint.mark_done(link)
+                    continue
 
-                    # Find the number of last page
-                    last_page = int(button_lst_page.get('href')[pos+8])
+                # In incremental mode each project is listed only once
+                listing = self.path_to_results + 'Projects.txt' if not self.manifest or self.manifest.is_new(link) else None
 
-                    # Iterating through all pages till the last one
-                    for i in range(1, last_page+1):
-                        r = requests.get(f'{self.__projects_url}{year}&tx_lookup_results[page-254940][currentPage]={i}')
-                        soup = BeautifulSoup(r.content, 'html.parser')
-                        a_tags = soup.find_all('a')
+                result = make_record('TU Delft', link, title, text, year=year)
+                file = self.writer.write(result, self.path_to_results + f'{title}.txt', listing)
 
-                        # Adding links with projects
-                        for a_tag in a_tags:
+                if self.manifest:
+                    self.manifest.record(link, text, file)
 
-                            # Checking if link refers to project
-                            if '/en/innovatie-impact/ontwikkeling-innovatie/innovation-projects/' in a_tag.get('href'):
-                                project_links.append('https://www.tudelft.nl' + a_tag.get('href'))
+                self.checkpoint.mark_done(link)
 
-                # If current page is last
-                else:
-                    a_tags = soup.find_all('a')
+            except Exception as e:
+                logging.exception(f'[TU Delft Web Scraper] Error while scraping page <{link}>: {e}.')
+                self.checkpoint.mark_failed(link)
+
+        self.save_state()
+
+        # If crawl is finished, next run starts from scratch, otherwise resumed run continues it
+        # (progress of distributed crawl is kept by work queue)
+        if self.tasks or self.checkpoint.is_complete():
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+            logging.warning('[TU Delft Web Scraper] Crawl wasn\'t finished, checkpoint is kept for resumed run.')
+
+        logging.info(f'[TU Delft Web Scraper] {pages - self.checkpoint.failed} projects were scraped, '
+                     f'{self.checkpoint.failed} failed.')
+
+    def page_done(self, url):
+        """
+        Called for each completed page: cached response of the page can be revalidated by the next run
+        and task of work queue is acknowledged
+        :param url: URL of the page
+        :return: None
+        """
+        self.fetcher.confirm(url)
+
+        if self.tasks:
+            self.tasks.ack(url)
+
+    def page_failed(self, url):
+        """
+        Called for each failed page: task of work queue is released, so it's retried or marked failed
+        :param url: URL of the page
+        :return: None
+        """
+        if self.tasks:
+            self.tasks.nack(url)
+
+    def save_state(self):
+        """
+        Flushes written projects and index of duplicates and saves manifest. Called before each save of checkpoint,
+        so pages are never marked completed before their results are stored
+        :return: None
+        """
+        self.writer.flush()
+
+        if self.manifest:
+            self.manifest.save()
+        if self.dedup:
+            self.dedup.save()
+
+    def discover_links(self):
+        """
+        Discovers links with projects. First pages of all years are requested at the same time to find
+        the number of pages, then all remaining pages are requested at the same time
+        :return: generator of links with projects which weren't completed yet
+        """
+        # Links are discovered by coordinator of distributed crawl, year of each project is queued with its link
+        if self.tasks:
+            for link, year in self.tasks.items():
+                self.link_years[link] = year
+                yield link
+            return
+
+        # Links discovered but not completed by previous run
+        yield from self.checkpoint.pending()
+
+        if self.checkpoint.discovered:
+            return
+
+        first_pages = {f'{self.__projects_url}{year}': year for year in self.years}
+        pages = {}
+
+        # Discovery is finished only if all pages were read, otherwise resumed run requests failed pages again
+        complete = True
+
+        # Number of pages of each year is known from previous run
+        for url, year in list(first_pages.items()):
+            if self.checkpoint.is_done(url) and self.checkpoint.cursor(year):
+                pages.update(dict.fromkeys(self.__page_urls(year, self.checkpoint.cursor(year)), year))
+                del first_pages[url]
 
-                    # Adding links with projects
-                    for a_tag in a_tags:
+        for url, r, error in self.fetcher.fetch_all(first_pages):
+            year = first_pages[url]
 
-                        # Checking if link refers to project
-                        if '/en/innovatie-impact/ontwikkeling-innovatie/innovation-projects/' in a_tag.get('href'):
-                            project_links.append('https://www.tudelft.nl' + a_tag.get('href'))
+            if isinstance(error, requests.exceptions.ConnectionError):
+                logging.error(f'[TU Delft Web Scraper] Error for page <{url}>: connection refused!')
+                complete = False
+                continue
+            elif error:
+                logging.error(f'[TU Delft Web Scraper] Error for page {url}: {error}.', exc_info=error)
+                complete = False
+                continue
+            elif r.status_code not in (200, 304):
+                logging.error(f'[TU Delft Web Scraper] Page <{url}> wasn\'t read due Error {r.status_code}.')
+                complete = False
+                continue
+
+            try:
+                soup = make_soup(r.content, self.listing_tags)
+                yield from self.__add_links(self.find_links(soup), year)
+
+                # Number of the last page (1 if page has no button 'Last page')
+                last_page = self.find_last_page(soup)
+                pages.update(dict.fromkeys(self.__page_urls(year, last_page), year))
+
+                self.checkpoint.set_cursor(year, last_page)
+                self.checkpoint.mark_done(url)
 
             except Exception as e:
-                print(f'[TU Delft Web Scraper] Error while extracting project links from page <{url}>: {e}.')
                 logging.exception(f'[TU Delft Web Scraper] Error while extracting project links from page <{url}>: {e}.')
+                complete = False
 
-        # Iterating through links from list
-        for link in project_links:
-            try:
-                r = requests.get(link)
-            except requests.exceptions.ConnectionError:
-                print(f'[TU Delft Web Scraper] Error for page <{link}>: connection refused!')
-                logging.exception(f'[TU Delft Web Scraper] Error for page <{link}>: connection refused!')
+        # Requesting all remaining pages at the same time
+        for url, r, error in self.fetcher.fetch_all([url for url in pages if not self.checkpoint.is_done(url)]):
+            if error:
+                logging.error(f'[TU Delft Web Scraper] Error for page {url}: {error}.', exc_info=error)
+                complete = False
                 continue
-            except Exception as e:
-                print(f'[TU Delft Web Scraper] Error for page {link}: {e}.')
-                logging.exception(f'[TU Delft Web Scraper] Error for page {link}: {e}.')
+            elif r.status_code not in (200, 304):
+                logging.error(f'[TU Delft Web Scraper] Page <{url}> wasn\'t read due Error {r.status_code}.')
+                complete = False
                 continue
 
             try:
-                soup = BeautifulSoup(r.content, 'html.parser')
+                soup = make_soup(r.content, self.listing_tags)
+                yield from self.__add_links(self.find_links(soup), pages[url])
+                self.checkpoint.mark_done(url)
 
-                # Getting project title
-                title = soup.find('h2').text.replace('/', '').replace('\n', '')
+            except Exception as e:
+                logging.exception(f'[TU Delft Web Scraper] Error while extracting project links from page <{url}>: {e}.')
+                complete = False
 
-                # Getting project content
-                content = soup.find_all('div', attrs={'class': 'sm-12 md-6'})[1]
+        if complete:
+            self.checkpoint.finish_discovery()
+        else:
+            logging.warning('[TU Delft Web Scraper] Some pages with projects weren\'t read, discovery will be '
+                            'continued by resumed run.')
 
-                with open(self.path_to_results + f'{title}.txt', 'wt') as f:
-                    f.write(f'Title: {title} \n')
+    def discover_tasks(self):
+        """
+        Discovers links with projects for work queue of distributed crawl
+        :return: generator of tuples (link, year of project)
+        """
+        for link in self.discover_links():
+            yield link, self.link_years.pop(link, None)
 
-                    # If project content is not empty
-                    if content:
-                        f.write(content.get_text(' '))
-                with open(self.path_to_results + 'Projects.txt', 'a+') as f1:
-                    f1.write(title + '\n')
+    @staticmethod
+    def extract_project(content):
+        """
+        Extracts project from its page. Runs in parse pool
+        :param content: Content of project page
+        :return: record in format {'title': .., 'text': .., 'persons': None, 'keywords': None}
+        """
+        with parsed(content, TUDelftWebScraper.project_tags) as soup:
+            # Getting project title
+            title = soup.find('h2').text.replace('/', '').replace('\n', '')
 
-            except Exception as e:
-                print(f'[TU Delft Web Scraper] Error while scraping page <{link}>: {e}.')
-                logging.exception(f'[TU Delft Web Scraper] Error while scraping page <{link}>: {e}.')
+            # Getting project content
+            content = soup.find_all('div', attrs={'class': 'sm-12 md-6'})[1]
+
+            return {'title': title, 'text': content.get_text(' ') if content else '', 'persons': None, 'keywords': None}
+
+    @staticmethod
+    def find_links(soup):
+        """
+        Finds all links with projects on page with list of projects
+        :param soup: Parsed page
+        :return: list of links with projects
+        """
+        links = []
+
+        for a_tag in soup.find_all('a'):
+
+            # Checking if link refers to project
+            if '/en/innovatie-impact/ontwikkeling-innovatie/innovation-projects/' in str(a_tag.get('href')):
+                links.append('https://www.tudelft.nl' + a_tag.get('href'))
+
+        return links
+
+    @staticmethod
+    def find_last_page(soup):
+        """
+        Finds the number of the last page from button 'Last page'
+        :param soup: Parsed page
+        :return: number of the last page, 1 if page has no button 'Last page'
+        """
+        button_lst_page = soup.find('a', attrs={'aria-label': 'Last page'})
 
-        print(f'[TU Delft Web Scraper] {len(project_links)} projects were scraped.')
-        logging.info(f'[TU Delft Web Scraper] {len(project_links)} projects were scraped.')
+        if button_lst_page:
+            match = re.search(r'Page%5D=(\d+)', button_lst_page.get('href', ''))
+            if match:
+                return int(match.group(1))
 
+        return 1
+
+    def __add_links(self, links, year):
+        """
+        Adds links found on page with list of projects from given year to checkpoint
+        :param links: Links with projects
+        :param year: Year of projects
+        :return: generator of links which weren't discovered before
+        """
+        for link in self.checkpoint.add_links(links):
+            self.link_years[link] = year
+            yield link
+
+    def __page_urls(self, year, last_page):
+        """
+        Returns URLs of pages 2..last_page of projects from given year (the first page is the page without number)
+        :param year: Year of projects
+        :param last_page: Number of the last page
+        :return: list of URLs
+        """
+        return [f'{self.__projects_url}{year}&tx_lookup_results[page-254940][currentPage]={i}'
+                for i in range(2, last_page + 1)]
 
+
+@register('fontys', export='export_projects')
 class FontysWebScraper:
     """
     Web scraper for university "Fontys"
@@ -136,96 +350,229 @@ class FontysWebScraper:
 
     __projects_url = 'https://fontys.nl/Onderzoek/High-Tech-Systems-and-Materials/SmartMan/Student-Projects.htm'
 
-    def __init__(self, path_to_results):
+    # Parts of pages which are parsed, everything else is skipped by parser
+    listing_tags = parse_only('a')
+    project_tags = parse_only('h1',
+                              ('div', {'class': 'columns small-12 medium-6 large-6 frd_column'}),
+                              ('div', {'class': 'columns small-12 large-4 frd_column'}))
+
+    def __init__(self, path_to_results, fetcher=None, incremental=False, resume=False, parser=None, writer=None,
+                 dedup=None, tasks=None):
         """
         Creates the instance of web scraper for university "Fontys"
         :param path_to_results: Path to the folder where the results should be
+        :param fetcher: Shared fetch engine. If not provided, new one is created
+        :param incremental: If True, only new or changed projects are written
+        :param resume: If True, crawl continues from the checkpoint of the previous run
+        :param parser: Shared pool of processes which parse pages. If not provided, new one is created
+        :param writer: Shared writer of results. If not provided, projects are written to .txt files
+        :param dedup: Shared deduplicator. If not provided, duplicate projects are written
+        :param tasks: Work queue of distributed crawl. If provided, links are leased from the queue instead of discovered
         """
         self.path_to_results = path_to_results + '/Fontys_projects/'
+        self.fetcher = fetcher or ConcurrentFetcher(cache=ResponseCache(path_to_results + '/.cache/'))
+        self.manifest = CrawlManifest(self.path_to_results + 'manifest.json') if incremental else None
+        self.checkpoint = Checkpoint(self.path_to_results + 'checkpoint.db', resume,
+                                     on_save=self.save_state, on_done=self.page_done, on_failed=self.page_failed)
+        self.parser = parser or ParsePool()
+        self.writer = writer or TextWriter()
+        self.dedup = dedup
+        self.tasks = tasks
 
     def export_projects(self):
         """
         Exports web scraped projects to .txt files
         :return: None
         """
-        project_links = []
-
         if not os.path.exists(self.path_to_results):
             os.makedirs(self.path_to_results)
 
-        try:
-            r = requests.get(self.__projects_url)
-        except requests.exceptions.ConnectionError:
-            print(f'[Fontys Web Scraper] Error for page <{self.__projects_url}>: connection refused!')
-            logging.exception(f'[Fontys Web Scraperr] Error for page <{self.__projects_url}>: connection refused!')
-            return
-        except Exception as e:
-            print(f'[Fontys Web Scraper] Error for page {self.__projects_url}: {e}.')
-            logging.exception(f'[Fontys Web Scraper] Error for page {self.__projects_url}: {e}.')
-            return
+        # Number of project pages which were read in this run (completed or failed)
+        pages = 0
 
-        try:
-            soup = BeautifulSoup(r.content, 'html.parser')
-            a_tags = soup.find_all('a')
+        # Fetching links which weren't completed yet concurrently, pages are parsed in processes of parse pool
+        fetched = self.fetcher.fetch_all(self.discover_links())
+        for link, r, record, error in self.parser.parse_all(fetched, self.extract_project):
+            pages += 1
+            if isinstance(error, requests.exceptions.ConnectionError):
+                logging.error(f'[Fontys Web Scraper] Error for page <{link}>: connection refused!')
+                self.checkpoint.mark_failed(link)
+                continue
+            elif error and r is None:
+                logging.error(f'[Fontys Web Scraper] Error for page {link}: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+            elif error:
+                logging.error(f'[Fontys Web Scraper] Error while scraping page <{link}>: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+
+            # If project wasn't modified since previous run
+            if r.status_code == 304:
+                self.writer.keep(link)
+                self.checkpoint.mark_done(link)
+                continue
+            elif r.status_code != 200:
+                logging.error(f'[Fontys Web Scraper] Project <{link}> wasn\'t scraped due Error {r.status_code}.')
+                self.checkpoint.mark_failed(link)
+                continue
+
+            try:
+                title = record['title']
+                text = f'Title: {title} \n' + record['text']
 
-            # Adding links with projects
-            for a_tag in a_tags:
+                # If project didn't change since previous run
+                if self.manifest and not self.manifest.changed(link, text):
+                    self.writer.keep(link)
+                    self.checkpoint.mark_done(link)
+                    continue
 
-                # Checking if link refers to project
-                if '/SmartMan/Student-Projects/' in a_tag.get('href'):
-                    project_links.append('https://fontys.nl/' + a_tag.get('href'))
+                # If the same project was already scraped from another page
+                original = self.dedup.duplicate(link, text) if self.dedup else None
+                if original:
+                    logging.info(f'[Fontys Web Scraper] Project <{link}> was skipped, it\'s duplicate of <{original}>.')
+                    self.checkpoint.mark_done(link)
+                    continue
 
-        except Exception as e:
-            print(f'[Fontys Web Scraper] Error while extracting projects\' links: {e}.')
-            logging.exception(f'[Fontys Web Scraper] Error while extracting projects\' links: {e}.')
+                # In incremental mode each project is listed only once
+                listing = self.path_to_results + 'Projects.txt' if not self.manifest or self.manifest.is_new(link) else None
 
-        # Iterating through links from list
-        for link in project_links:
+                result = make_record('Fontys', link, title, text)
+                file = self.writer.write(result, self.path_to_results + f'{title}.txt', listing)
+
+                if self.manifest:
+                    self.manifest.record(link, text, file)
+
+                self.checkpoint.mark_done(link)
+
+            except Exception as e:
+                logging.exception(f'[Fontys Web Scraper] Error while scraping page <{link}>: {e}.')
+                self.checkpoint.mark_failed(link)
+
+        self.save_state()
+
+        # If crawl is finished, next run starts from scratch, otherwise resumed run continues it
+        # (progress of distributed crawl is kept by work queue)
+        if self.tasks or self.checkpoint.is_complete():
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+            logging.warning('[Fontys Web Scraper] Crawl wasn\'t finished, checkpoint is kept for resumed run.')
+
+        logging.info(f'[Fontys Web Scraper] {pages - self.checkpoint.failed} projects were scraped, '
+                     f'{self.checkpoint.failed} failed.')
+
+    def page_done(self, url):
+        """
+        Called for each completed page: cached response of the page can be revalidated by the next run
+        and task of work queue is acknowledged
+        :param url: URL of the page
+        :return: None
+        """
+        self.fetcher.confirm(url)
+
+        if self.tasks:
+            self.tasks.ack(url)
+
+    def page_failed(self, url):
+        """
+        Called for each failed page: task of work queue is released, so it's retried or marked failed
+        :param url: URL of the page
+        :return: None
+        """
+        if self.tasks:
+            self.tasks.nack(url)
+
+    def save_state(self):
+        """
+        Flushes written projects and index of duplicates and saves manifest. Called before each save of checkpoint,
+        so pages are never marked completed before their results are stored
+        :return: None
+        """
+        self.writer.flush()
+
+        if self.manifest:
+            self.manifest.save()
+        if self.dedup:
+            self.dedup.save()
+
+    def discover_links(self):
+        """
+        Discovers links with projects on the page with list of projects
+        :return: generator of links with projects which weren't completed yet
+        """
+        # Links are discovered by coordinator of distributed crawl
+        if self.tasks:
+            yield from self.tasks.items()
+            return
+
+        # If links weren't discovered by previous run
+        if not self.checkpoint.discovered:
             try:
-                r = requests.get(link)
+                r = self.fetcher.get(self.__projects_url)
             except requests.exceptions.ConnectionError:
-                print(f'[Fontys Web Scraper] Error for page <{link}>: connection refused!')
-                logging.exception(f'[Fontys Web Scraperr] Error for page <{link}>: connection refused!')
-                continue
+                logging.error(f'[Fontys Web Scraper] Error for page <{self.__projects_url}>: connection refused!')
+                return
             except Exception as e:
-                print(f'[Fontys Web Scraper] Error for page {link}: {e}.')
-                logging.exception(f'[Fontys Web Scraper] Error for page {link}: {e}.')
-                continue
+                logging.error(f'[Fontys Web Scraper] Error for page {self.__projects_url}: {e}.', exc_info=e)
+                return
+
+            # Page which wasn't read has no links, so discovery isn't finished and resumed run reads it again
+            if r.status_code not in (200, 304):
+                logging.error(f'[Fontys Web Scraper] Page <{self.__projects_url}> wasn\'t read due Error {r.status_code}, '
+                              f'discovery will be continued by resumed run.')
+                return
 
             try:
-                soup = BeautifulSoup(r.content, 'html.parser')
+                soup = make_soup(r.content, self.listing_tags)
+                a_tags = soup.find_all('a')
 
-                # Getting project title
-                title = soup.find('h1').text.replace('/', '').replace('\n', '')
+                # Adding links with projects
+                for a_tag in a_tags:
 
-                # Getting project content
-                content = soup.find('div', attrs={'class': 'columns small-12 medium-6 large-6 frd_column'})
+                    # Checking if link refers to project
+                    if '/SmartMan/Student-Projects/' in a_tag.get('href'):
+                        self.checkpoint.add_links(['https://fontys.nl/' + a_tag.get('href')])
 
-                # Getting project additional info
-                additional_info = soup.find_all('div', attrs={'class': 'columns small-12 large-4 frd_column'})
+                self.checkpoint.finish_discovery()
 
-                with open(self.path_to_results + f'{title}.txt', 'wt') as f:
-                    f.write(f'Title: {title} \n')
+            except Exception as e:
+                logging.exception(f'[Fontys Web Scraper] Error while extracting projects\' links: {e}.')
 
-                    # If project content is not empty
-                    if content:
-                        f.write(content.get_text(' '))
+        yield from self.checkpoint.pending()
 
-                    # If project additional info is not empty
-                    if additional_info:
-                        for elem in additional_info:
-                            f.write(elem.get_text(' '))
-                with open(self.path_to_results + 'Projects.txt', 'a+') as f1:
-                    f1.write(title + '\n')
+    @staticmethod
+    def extract_project(content):
+        """
+        Extracts project from its page. Runs in parse pool
+        :param content: Content of project page
+        :return: record in format {'title': .., 'text': .., 'persons': None, 'keywords': None}
+        """
+        with parsed(content, FontysWebScraper.project_tags) as soup:
+            # Getting project title
+            title = soup.find('h1').text.replace('/', '').replace('\n', '')
 
-            except Exception as e:
-                print(f'[Fontys Web Scraper] Error while scraping page <{link}>: {e}.')
-                logging.exception(f'[Fontys Web Scraper] Error while scraping page <{link}>: {e}.')
+            # Getting project content
+            content = soup.find('div', attrs={'class': 'columns small-12 medium-6 large-6 frd_column'})
+
+            # Getting project additional info
+            additional_info = soup.find_all('div', attrs={'class': 'columns small-12 large-4 frd_column'})
+
+            text = ''
+
+            # If project content is not empty
+            if content:
+                text += content.get_text(' ')
 
-        print(f'[Fontys Web Scraper] {len(project_links)} projects were scraped.')
-        logging.info(f'[Fontys Web Scraper] {len(project_links)} projects were scraped.')
+            # If project additional info is not empty
+            if additional_info:
+                for elem in additional_info:
+                    text += elem.get_text(' ')
 
+            return {'title': title, 'text': text, 'persons': None, 'keywords': None}
 
+
+@register('buas', export='export_projects', years=['2019', '2020', '2021'])
 class BuasWebScraper:
     """
     Web scraper for university "Breda University of Applied Sciences"
@@ -233,17 +580,44 @@ class BuasWebScraper:
 
     __projects_url = 'https://pure.buas.nl/en/projects/'
 
-    def __init__(self, years, path_to_results):
+    # Parts of pages which are parsed, everything else is skipped by parser
+    listing_tags = parse_only('a', ('li', {'class': 'next'}))
+    project_tags = parse_only('h1',
+                              ('div', {'class': 'projectdescription'}),
+                              ('ul', {'class': 'relations persons'}),
+                              ('li', {'class': 'userdefined-keyword'}))
+
+    def __init__(self, years, path_to_results, fetcher=None, browsers=None, incremental=False, resume=False, parser=None,
+                 writer=None, dedup=None, render_listing=False, tasks=None):
         """
         Creates the instance of web scraper for university "BUAS"
         :param years: List of years from which projects should be web scraped
         :param path_to_results: Path to the folder where the results should be
+        :param fetcher: Shared fetch engine. If not provided, new one is created
+        :param browsers: Shared pool of browsers. If not provided, new one is created
+        :param incremental: If True, only new or changed projects are written
+        :param resume: If True, crawl continues from the checkpoint of the previous run
+        :param parser: Shared pool of processes which parse pages. If not provided, new one is created
+        :param writer: Shared writer of results. If not provided, projects are written to .txt files
+        :param dedup: Shared deduplicator. If not provided, duplicate projects are written
+        :param render_listing: If True, pages with list of projects are rendered in browser instead of requests
+        :param tasks: Work queue of distributed crawl. If provided, links are leased from the queue instead of discovered
         """
         self.years = years
         self.path_to_results = path_to_results + '/BUAS_projects/'
+        self.fetcher = fetcher or ConcurrentFetcher(cache=ResponseCache(path_to_results + '/.cache/'))
+        self.browsers = browsers or BrowserPool()
+        self.manifest = CrawlManifest(self.path_to_results + 'manifest.json') if incremental else None
+        self.checkpoint = Checkpoint(self.path_to_results + 'checkpoint.db', resume,
+                                     on_save=self.save_state, on_done=self.page_done, on_failed=self.page_failed)
+        self.parser = parser or ParsePool()
+        self.writer = writer or TextWriter()
+        self.dedup = dedup
+        self.tasks = tasks
+        self.render_listing = render_listing
 
         if not isinstance(years, list):
-            print('[BUAS Web Scraper] Years should be provided as a list!')
+            logging.error('[BUAS Web Scraper] Years should be provided as a list!')
 
     def export_projects(self):
         """
@@ -251,11 +625,140 @@ class BuasWebScraper:
         :return: None
         """
 
-        project_links = []
-
         if not os.path.exists(self.path_to_results):
             os.makedirs(self.path_to_results)
 
+        # Number of project pages which were read in this run (completed or failed)
+        pages = 0
+
+        # Fetching links concurrently while they are still being discovered, pages are parsed in processes of parse pool
+        for link, r, record, error in self.parser.parse_all(self.fetcher.fetch_all(self.discover_links()), self.extract_project):
+            pages += 1
+            if isinstance(error, requests.exceptions.ConnectionError):
+                logging.error(f'[BUAS Web Scraper] Error for page <{link}>: connection refused!')
+                self.checkpoint.mark_failed(link)
+                continue
+            elif error and r is None:
+                logging.error(f'[BUAS Web Scraper] Error for page {link}: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+            elif error:
+                logging.error(f'[BUAS Web Scraper] Error while scraping page <{link}>: {error}.', exc_info=error)
+                self.checkpoint.mark_failed(link)
+                continue
+
+            # If project wasn't modified since previous run
+            if r.status_code == 304:
+                self.writer.keep(link)
+                self.checkpoint.mark_done(link)
+                continue
+            elif r.status_code != 200:
+                logging.error(f'[BUAS Web Scraper] Project <{link}> wasn\'t scraped due Error {r.status_code}.')
+                self.checkpoint.mark_failed(link)
+                continue
+
+            try:
+                title = record['title']
+                text = f'Title: {title} \n'
+
+                # If project content is not empty
+                if record['text']:
+                    text += record['text'] + '\n'
+
+                # If project persons is not empty
+                if record['persons']:
+                    text += f'Persons: {record["persons"]} \n'
+
+                # If project keywords is not empty
+                if record['keywords']:
+                    text += f'Keywords: {record["keywords"]} \n'
+
+                # If project didn't change since previous run
+                if self.manifest and not self.manifest.changed(link, text):
+                    self.writer.keep(link)
+                    self.checkpoint.mark_done(link)
+                    continue
+
+                # If the same project was already scraped from another page
+                original = self.dedup.duplicate(link, text) if self.dedup else None
+                if original:
+                    logging.info(f'[BUAS Web Scraper] Project <{link}> was skipped, it\'s duplicate of <{original}>.')
+                    self.checkpoint.mark_done(link)
+                    continue
+
+                # In incremental mode each project is listed only once
+                listing = self.path_to_results + 'Projects.txt' if not self.manifest or self.manifest.is_new(link) else None
+
+                result = make_record('BUAS', link, title, text, record['persons'], record['keywords'])
+                file = self.writer.write(result, self.path_to_results + f'{title}.txt', listing)
+
+                if self.manifest:
+                    self.manifest.record(link, text, file)
+
+                self.checkpoint.mark_done(link)
+
+            except Exception as e:
+                logging.exception(f'[BUAS Web Scraper] Error while scraping page <{link}>: {e}.')
+                self.checkpoint.mark_failed(link)
+
+        self.save_state()
+
+        # If crawl is finished, next run starts from scratch, otherwise resumed run continues it
+        # (progress of distributed crawl is kept by work queue)
+        if self.tasks or self.checkpoint.is_complete():
+            self.checkpoint.clear()
+        else:
+            self.checkpoint.save()
+            logging.warning('[BUAS Web Scraper] Crawl wasn\'t finished, checkpoint is kept for resumed run.')
+
+        logging.info(f'[BUAS Web Scraper] {pages - self.checkpoint.failed} projects were scraped, '
+                     f'{self.checkpoint.failed} failed.')
+
+    def page_done(self, url):
+        """
+        Called for each completed page: cached response of the page can be revalidated by the next run
+        and task of work queue is acknowledged
+        :param url: URL of the page
+        :return: None
+        """
+        self.fetcher.confirm(url)
+
+        if self.tasks:
+            self.tasks.ack(url)
+
+    def page_failed(self, url):
+        """
+        Called for each failed page: task of work queue is released, so it's retried or marked failed
+        :param url: URL of the page
+        :return: None
+        """
+        if self.tasks:
+            self.tasks.nack(url)
+
+    def save_state(self):
+        """
+        Flushes written projects and index of duplicates and saves manifest. Called before each save of checkpoint,
+        so pages are never marked completed before their results are stored
+        :return: None
+        """
+        self.writer.flush()
+
+        if self.manifest:
+            self.manifest.save()
+        if self.dedup:
+            self.dedup.save()
+
+    def discover_links(self):
+        """
+        Discovers links with projects. The first page is read to find the number of pages,
+        then all remaining pages are read at the same time
+        :return: generator of links with projects which weren't completed yet
+        """
+        # Links are discovered by coordinator of distributed crawl
+        if self.tasks:
+            yield from self.tasks.items()
+            return
+
         # The format of url for page with projects depends on number of years given
         if len(self.years) > 1:
             url = self.__projects_url
@@ -267,107 +770,152 @@ class BuasWebScraper:
         else:
             url = f'{self.__projects_url}?format=&projectStartYear={self.years[0]}'
 
-        try:
-            driver = webdriver.Safari()
-            driver.get(f'{url}')
-            html = driver.page_source
-        except Exception as e:
-            print(f'[BUAS Web Scraper] Error for page {url}: {e}.')
-            logging.exception(f'[BUAS Web Scraper] Error for page {url}: {e}.')
+        # Links discovered but not completed by previous run
+        yield from self.checkpoint.pending()
+
+        if self.checkpoint.discovered:
             return
 
-        try:
-            soup = BeautifulSoup(html, 'html.parser')
-            li_tags = soup.find_all('li', attrs={'class': 'next'})
+        last_page = self.checkpoint.cursor('last_page')
 
-            # If page contains pagination
-            if len(li_tags) != 0:
-                i = 0
-                while True:
-                    driver.get(f'{url}&page={i}')
-                    html = driver.page_source
-                    soup = BeautifulSoup(html, 'html.parser')
-                    li_tags = soup.find_all('li', attrs={'class': 'next'})
-                    a_tags = soup.find_all('a', attrs={'class': 'link', 'rel': 'UPMProject'})
+        # If number of pages isn't known from previous run
+        if last_page is None or not self.checkpoint.is_done(url):
+            [(_, soup, error)] = list(self.listing_pages([url]))
+            if error:
+                logging.error(f'[BUAS Web Scraper] Error for page {url}: {error}.', exc_info=error)
+                return
 
-                    # Adding links with projects
-                    for a_tag in a_tags:
+            yield from self.checkpoint.add_links(self.find_links(soup))
 
-                        # Checking if link refers to project
-                        if '/en/projects/' in a_tag.get('href'):
-                            project_links.append(a_tag.get('href'))
+            # If page doesn't contain pagination
+            if len(soup.find_all('li', attrs={'class': 'next'})) == 0:
+                self.checkpoint.finish_discovery()
+                return
+
+            last_page = self.find_last_page(soup)
+            self.checkpoint.set_cursor('last_page', last_page)
+            self.checkpoint.mark_done(url)
+
+        pages = list(range(1, last_page + 1))
+
+        # Discovery is finished only if all pages were read, otherwise resumed run requests failed pages again
+        complete = True
+
+        # Reading all pages at the same time. Pagination may not show all numbers of pages,
+        # so if the last known page still has button 'Next page', the next batch of pages is read
+        while pages:
+            next_pages = []
+
+            for i, soup, error in self.listing_pages([i for i in pages if not self.checkpoint.is_done(f'{url}&page={i}')],
+                                                     key=lambda i: f'{url}&page={i}'):
+                if error:
+                    logging.error(f'[BUAS Web Scraper] Error for page {url}&page={i}: {error}.', exc_info=error)
+                    complete = False
+                    continue
+
+                try:
+                    yield from self.checkpoint.add_links(self.find_links(soup))
+                    self.checkpoint.mark_done(f'{url}&page={i}')
+
+                    # If the last known page isn't the last one
+                    if i == last_page and len(soup.find_all('li', attrs={'class': 'next'})) != 0:
+                        next_pages = list(range(last_page + 1, max(self.find_last_page(soup), last_page + 1) + 1))
+
+                except Exception as e:
+                    logging.exception(f'[BUAS Web Scraper] Error while extracting project links from page <{url}&page={i}>: {e}.')
+                    complete = False
+
+            if next_pages:
+                last_page = next_pages[-1]
+                self.checkpoint.set_cursor('last_page', last_page)
+            pages = next_pages
+
+        if complete:
+            self.checkpoint.finish_discovery()
+        else:
+            logging.warning('[BUAS Web Scraper] Some pages with projects weren\'t read, discovery will be '
+                            'continued by resumed run.')
 
-                    # If all links were extracted (no button 'Next page')
-                    if len(li_tags) == 0:
-                        break
-                    i += 1
+    def listing_pages(self, items, key=None):
+        """
+        Reads pages with list of projects. Pure portal renders lists of projects on server, so pages are requested
+        over HTTP. Pages which have no projects that way (e.g. forbidden for requests) are rendered in browser,
+        and once it happens, browser is used for all following pages
+        :param items: Pages with list of projects (or any objects from which URL can be taken by key)
+        :param key: Function which returns URL for given item. If not provided, item itself is URL
+        :return: generator of tuples (item, parsed page, error) in order of completion
+        """
+        browser_items = items
 
-            # If page doesn't contain pagination
-            else:
-                a_tags = soup.find_all('a', attrs={'class': 'link', 'rel': 'UPMProject'})
+        if not self.render_listing:
+            browser_items = []
 
-                # Adding links with projects
-                for a_tag in a_tags:
+            for item, r, error in self.fetcher.fetch_all(items, key=key):
+                soup = make_soup(r.content, self.listing_tags) if r is not None and r.status_code in (200, 304) else None
 
-                    # Checking if link refers to project
-                    if '/en/projects/' in a_tag.get('href'):
-                        project_links.append(a_tag.get('href'))
-        except Exception as e:
-            print(f'[BUAS Web Scraper] Error while extracting project links from page <{url}>: {e}.')
-            logging.exception(f'[BUAS Web Scraper] Error while extracting project links from page <{url}>: {e}.')
-
-        # Iterating through links from list
-        for link in project_links:
-            try:
-                r = requests.get(link)
-            except requests.exceptions.ConnectionError:
-                print(f'[BUAS Web Scraper] Error for page <{link}>: connection refused!')
-                logging.exception(f'[BUAS Web Scraper] Error for page <{link}>: connection refused!')
-                continue
-            except Exception as e:
-                print(f'[BUAS Web Scraper] Error for page {link}: {e}.')
-                logging.exception(f'[BUAS Web Scraper] Error for page {link}: {e}.')
-                continue
+                # If page has projects
+                if soup is not None and self.find_links(soup):
+                    yield item, soup, None
+                else:
+                    browser_items.append(item)
 
-            try:
-                soup = BeautifulSoup(r.content, 'html.parser')
+            if browser_items:
+                logging.warning(f'[BUAS Web Scraper] {len(browser_items)} pages with projects couldn\'t be read '
+                                f'over HTTP, pages are rendered in browser.')
+                self.render_listing = True
 
-                # Getting project title
-                title = soup.find('h1').text.replace('/', '').replace('\n', '')
+        for item, html, error in self.fetcher.fetch_all(browser_items, key=key, fetch=self.browsers.render):
+            yield item, make_soup(html, self.listing_tags) if html is not None else None, error
+
+    @staticmethod
+    def extract_project(content):
+        """
+        Extracts project from its page. Runs in parse pool
+        :param content: Content of project page
+        :return: record in format {'title': .., 'text': .., 'persons': .., 'keywords': ..}
+        """
+        with parsed(content, BuasWebScraper.project_tags) as soup:
+            # Getting project title
+            title = soup.find('h1').text.replace('/', '').replace('\n', '')
 
-                # Getting project content
-                content = soup.find('div', attrs={'class': 'projectdescription'})
+            # Getting project content
+            content = soup.find('div', attrs={'class': 'projectdescription'})
 
-                # Getting project authors
-                persons = '\n'.join([e.text.replace('(PI)', '').replace('(CoI)', '') for e in soup.find_all('ul', attrs={'class': 'relations persons'})])
+            # Getting project authors
+            persons = '\n'.join([e.text.replace('(PI)', '').replace('(CoI)', '') for e in soup.find_all('ul', attrs={'class': 'relations persons'})])
 
-                # Getting project keywords
-                keywords = ', '.join([e.text for e in soup.find_all('li', attrs={'class': 'userdefined-keyword'})])
+            # Getting project keywords
+            keywords = ', '.join([e.text for e in soup.find_all('li', attrs={'class': 'userdefined-keyword'})])
 
-                with open(self.path_to_results + f'{title}.txt', 'wt') as f:
-                    f.write(f'Title: {title} \n')
+            return {'title': title, 'text': content.get_text(' ') if content else '', 'persons': persons, 'keywords': keywords}
 
-                    # If project content is not empty
-                    if content:
-                        f.write(content.get_text(' ') + '\n')
+    @staticmethod
+    def find_links(soup):
+        """
+        Finds all links with projects on page with list of projects
+        :param soup: Parsed page
+        :return: list of links with projects
+        """
+        links = []
 
-                    # If project persons is not empty
-                    if persons:
-                        f.write(f'Persons: {persons} \n')
+        for a_tag in soup.find_all('a', attrs={'class': 'link', 'rel': 'UPMProject'}):
 
-                    # If project keywords is not empty
-                    if keywords:
-                        f.write(f'Keywords: {keywords} \n')
-                with open(self.path_to_results + 'Projects.txt', 'a+') as f1:
-                    f1.write(title + '\n')
+            # Checking if link refers to project
+            if '/en/projects/' in str(a_tag.get('href')):
+                links.append(a_tag.get('href'))
 
-            except Exception as e:
-                print(f'[BUAS Web Scraper] Error while scraping page <{link}>: {e}.')
-                logging.exception(f'[BUAS Web Scraper] Error while scraping page <{link}>: {e}.')
+        return links
 
-        driver.close()
-        print(f'[BUAS Web Scraper] {len(project_links)} projects were scraped.')
-        logging.info(f'[BUAS Web Scraper] {len(project_links)} projects were scraped.')
+    @staticmethod
+    def find_last_page(soup):
+        """
+        Finds the highest number of page in pagination
+        :param soup: Parsed page
+        :return: number of the last page shown in pagination, 0 if there is no pagination
+        """
+        numbers = [int(n) for a_tag in soup.find_all('a', href=True)
+                   for n in re.findall(r'[?&]page=(\d+)', a_tag['href'])]
+        return max(numbers, default=0)
 
 
 
@@ -0,0 +1,489 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+
+
+def worker_name():
+    """
+    Returns name of this worker, unique across nodes
+    :return: name in format host-pid
+    """
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class SQLiteQueue:
+    """
+    Work queue of distributed crawl stored in SQLite file. Coordinator puts discovered items (links or rows),
+    workers lease them for a limited time and acknowledge completed ones or nack failed ones. Task which failed
+    or wasn't acknowledged before its lease expired (worker crashed) is leased again, up to max_attempts times,
+    then it's marked failed.
+    Queue also paces requests to each host across all workers, so politeness is kept globally.
+    Works for processes which share the file (one node or a volume with working locks), use RedisQueue across nodes.
+    """
+
+    def __init__(self, path, lease=120, max_attempts=3, worker=None):
+        """
+        Creates the instance of work queue. Tasks queued by previous runs are kept
+        :param path: Path to the queue file
+        :param lease: Time in seconds for which leased task is reserved for the worker
+        :param max_attempts: Number of leases of one task after which task is marked failed
+        :param worker: Name of this worker. If not provided, host name and process id are used
+        """
+        self.path = path
+        self.lease_time = lease
+        self.max_attempts = max_attempts
+        self.worker = worker or worker_name()
+
+        self.__lock = threading.Lock()
+
+        if os.path.dirname(self.path) and not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+
+        # Transactions are controlled explicitly, each of them locks the file for writing right away
+        self.__db = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS tasks (source TEXT, url TEXT, item TEXT, state TEXT, worker TEXT, '
+                          'leased_until REAL DEFAULT 0, attempts INTEGER DEFAULT 0, PRIMARY KEY (source, url))')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS tasks_state ON tasks (source, state, leased_until)')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, discovered INTEGER)')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, next_at REAL DEFAULT 0, '
+                          'blocked_until REAL DEFAULT 0)')
+
+    def source(self, name):
+        """
+        Returns work queue of one source
+        :param name: Name of the source, e.g. 'tudelft'
+        :return: SourceQueue
+        """
+        return SourceQueue(self, name)
+
+    def start(self, source, resume=False):
+        """
+        Starts discovery of the source
+        :param source: Name of the source
+        :param resume: If True, tasks of the previous crawl are kept, otherwise they are removed
+        :return: None
+        """
+        with self.__transaction() as db:
+            if not resume:
+                db.execute('DELETE FROM tasks WHERE source = ?', (source,))
+            db.execute('INSERT OR REPLACE INTO sources (source, discovered) VALUES (?, 0)', (source,))
+
+    def put(self, source, items):
+        """
+        Queues tasks, tasks which were already queued are ignored
+        :param source: Name of the source
+        :param items: List of tuples (URL, item)
+        :return: number of new tasks
+        """
+        with self.__transaction() as db:
+            before = db.total_changes
+            db.executemany('INSERT OR IGNORE INTO tasks (source, url, item, state) VALUES (?, ?, ?, \'queued\')',
+                           [(source, url, json.dumps(item)) for url, item in items])
+            return db.total_changes - before
+
+    def finish(self, source):
+        """
+        Marks that all tasks of the source were queued
+        :param source: Name of the source
+        :return: None
+        """
+        with self.__transaction() as db:
+            db.execute('INSERT OR REPLACE INTO sources (source, discovered) VALUES (?, 1)', (source,))
+
+    def lease(self, source, n=1):
+        """
+        Leases queued tasks (and tasks whose lease expired) to this worker
+        :param source: Name of the source
+        :param n: Maximum number of tasks
+        :return: list of tuples (URL, item)
+        """
+        now = time.time()
+
+        with self.__transaction() as db:
+            self.__reclaim(db, source, now)
+            rows = db.execute('SELECT rowid, url, item FROM tasks WHERE source = ? AND state = \'queued\' '
+                              'ORDER BY rowid LIMIT ?', (source, n)).fetchall()
+            db.executemany('UPDATE tasks SET state = \'leased\', worker = ?, leased_until = ?, attempts = attempts + 1 '
+                           'WHERE rowid = ?', [(self.worker, now + self.lease_time, rowid) for rowid, _, _ in rows])
+
+        return [(url, json.loads(item)) for _, url, item in rows]
+
+    def ack(self, source, url):
+        """
+        Acknowledges completed task
+        :param source: Name of the source
+        :param url: URL of the task
+        :return: None
+        """
+        with self.__transaction() as db:
+            db.execute('UPDATE tasks SET state = \'done\' WHERE source = ? AND url = ? AND state = \'leased\'',
+                       (source, url))
+
+    def nack(self, source, url):
+        """
+        Releases task which failed: it's queued again, or marked failed if it was leased max_attempts times
+        :param source: Name of the source
+        :param url: URL of the task
+        :return: None
+        """
+        with self.__transaction() as db:
+            db.execute('UPDATE tasks SET state = CASE WHEN attempts >= ? THEN \'failed\' ELSE \'queued\' END '
+                       'WHERE source = ? AND url = ? AND state = \'leased\' AND worker = ?',
+                       (self.max_attempts, source, url, self.worker))
+
+    def reclaim(self, source):
+        """
+        Queues tasks whose lease expired (worker crashed) again, or marks them failed if they were leased
+        max_attempts times. Called by lease and by coordinator which waits for workers
+        :param source: Name of the source
+        :return: None
+        """
+        with self.__transaction() as db:
+            self.__reclaim(db, source, time.time())
+
+    def drained(self, source):
+        """
+        Checks if all tasks are completed: all tasks were queued and none of them is queued or leased
+        (including leases of this worker which weren't acknowledged yet)
+        :param source: Name of the source
+        :return: True if worker may stop
+        """
+        with self.__lock:
+            discovered = self.__db.execute('SELECT discovered FROM sources WHERE source = ?', (source,)).fetchone()
+            remaining = self.__db.execute('SELECT COUNT(*) FROM tasks WHERE source = ? AND state IN '
+                                          '(\'queued\', \'leased\')', (source,)).fetchone()[0]
+
+        return bool(discovered and discovered[0]) and remaining == 0
+
+    def summary(self, source):
+        """
+        Returns number of tasks of the source in each state
+        :param source: Name of the source
+        :return: dict in format {state: number of tasks}
+        """
+        with self.__lock:
+            return dict(self.__db.execute('SELECT state, COUNT(*) FROM tasks WHERE source = ? GROUP BY state',
+                                          (source,)).fetchall())
+
+    def reserve(self, host, interval):
+        """
+        Reserves time of the next request to the host, requests of all workers are spaced by interval
+        :param host: Host
+        :param interval: Minimal time in seconds between two requests to the host
+        :return: delay in seconds before the request may be sent
+        """
+        now = time.time()
+
+        with self.__transaction() as db:
+            row = db.execute('SELECT next_at, blocked_until FROM hosts WHERE host = ?', (host,)).fetchone()
+            at = max(now, *row) if row else now
+            db.execute('INSERT OR REPLACE INTO hosts (host, next_at, blocked_until) VALUES (?, ?, ?)',
+                       (host, at + interval, row[1] if row else 0))
+
+        return at - now
+
+    def block(self, host, seconds):
+        """
+        Pauses requests of all workers to the host which throttles requests
+        :param host: Host
+        :param seconds: Duration of the pause
+        :return: None
+        """
+        with self.__transaction() as db:
+            db.execute('INSERT OR IGNORE INTO hosts (host) VALUES (?)', (host,))
+            db.execute('UPDATE hosts SET blocked_until = MAX(blocked_until, ?) WHERE host = ?',
+                       (time.time() + seconds, host))
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
+
+    def __transaction(self):
+        return _Transaction(self.__db, self.__lock)
+
+    def __reclaim(self, db, source, now):
+        db.execute('UPDATE tasks SET state = CASE WHEN attempts >= ? THEN \'failed\' ELSE \'queued\' END '
+                   'WHERE source = ? AND state = \'leased\' AND leased_until < ?', (self.max_attempts, source, now))
+
+
+class _Transaction:
+    """
+    Write transaction which holds the lock of the connection and locks the file right away
+    """
+
+    def __init__(self, db, lock):
+        self.db = db
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.db.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.lock.release()
+            raise
+        return self.db
+
+    def __exit__(self, error_type, error, traceback):
+        try:
+            self.db.execute('COMMIT' if error_type is None else 'ROLLBACK')
+        finally:
+            self.lock.release()
+
+
+class RedisQueue:
+    """
+    Work queue of distributed crawl stored in Redis, so workers on several nodes share it.
+    Has the same interface and semantics as SQLiteQueue (requires redis package)
+    """
+
+    # Requeues expired leases, or marks them failed if they were leased max_attempts times
+    __reclaim_script = """
+        local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+        for _, url in ipairs(expired) do
+            redis.call('ZREM', KEYS[2], url)
+            if tonumber(redis.call('HGET', KEYS[3], url) or '0') >= tonumber(ARGV[2]) then
+                redis.call('SADD', KEYS[4], url)
+            else
+                redis.call('LPUSH', KEYS[1], url)
+            end
+        end
+    """
+
+    # Leases up to n queued tasks
+    __lease_script = """
+        local result = {}
+        for i = 1, tonumber(ARGV[2]) do
+            local url = redis.call('LPOP', KEYS[1])
+            if not url then
+                break
+            end
+            redis.call('ZADD', KEYS[2], ARGV[1], url)
+            redis.call('HINCRBY', KEYS[4], url, 1)
+            redis.call('HSET', KEYS[5], url, ARGV[3])
+            table.insert(result, url)
+            table.insert(result, redis.call('HGET', KEYS[3], url))
+        end
+        return result
+    """
+
+    # Releases task leased by the worker, it's queued again or marked failed if it was leased max_attempts times
+    __nack_script = """
+        if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[3] or redis.call('ZREM', KEYS[2], ARGV[1]) == 0 then
+            return 0
+        end
+        if tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0') >= tonumber(ARGV[2]) then
+            redis.call('SADD', KEYS[5], ARGV[1])
+        else
+            redis.call('RPUSH', KEYS[1], ARGV[1])
+        end
+        return 1
+    """
+
+    # Reserves time of the next request to the host, returns delay as string (Lua numbers are truncated in replies)
+    __reserve_script = """
+        local now = tonumber(ARGV[1])
+        local next_at = tonumber(redis.call('HGET', KEYS[1], 'next_at') or '0')
+        local blocked_until = tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0')
+        local at = math.max(now, next_at, blocked_until)
+        redis.call('HSET', KEYS[1], 'next_at', tostring(at + tonumber(ARGV[2])))
+        redis.call('EXPIRE', KEYS[1], 86400)
+        return tostring(at - now)
+    """
+
+    __block_script = """
+        local blocked_until = tonumber(ARGV[1])
+        if blocked_until > tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0') then
+            redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked_until))
+        end
+        redis.call('EXPIRE', KEYS[1], 86400)
+    """
+
+    def __init__(self, url, lease=120, max_attempts=3, worker=None, prefix='crawl', client=None):
+        """
+        Creates the instance of work queue
+        :param url: URL of Redis, e.g. redis://localhost:6379/0
+        :param lease: Time in seconds for which leased task is reserved for the worker
+        :param max_attempts: Number of leases of one task after which task is marked failed
+        :param worker: Name of this worker. If not provided, host name and process id are used
+        :param prefix: Prefix of keys
+        :param client: Redis client with decoded responses (e.g. fakeredis.FakeRedis in checks). If provided,
+                       URL is ignored
+        """
+        self.lease_time = lease
+        self.max_attempts = max_attempts
+        self.worker = worker or worker_name()
+        self.prefix = prefix
+
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+
+        self.__redis = client
+        self.__reclaim = self.__redis.register_script(self.__reclaim_script)
+        self.__lease = self.__redis.register_script(self.__lease_script)
+        self.__nack = self.__redis.register_script(self.__nack_script)
+        self.__reserve = self.__redis.register_script(self.__reserve_script)
+        self.__block = self.__redis.register_script(self.__block_script)
+
+    def source(self, name):
+        return SourceQueue(self, name)
+
+    def start(self, source, resume=False):
+        if not resume:
+            self.__redis.delete(*[self.__key(source, name) for name in
+                                  ('queue', 'items', 'leased', 'attempts', 'workers', 'done', 'failed')])
+        self.__redis.set(self.__key(source, 'discovered'), 0)
+
+    def put(self, source, items):
+        added = 0
+
+        for url, item in items:
+            if self.__redis.hsetnx(self.__key(source, 'items'), url, json.dumps(item)):
+                self.__redis.rpush(self.__key(source, 'queue'), url)
+                added += 1
+
+        return added
+
+    def finish(self, source):
+        self.__redis.set(self.__key(source, 'discovered'), 1)
+
+    def lease(self, source, n=1):
+        self.reclaim(source)
+        result = self.__lease(keys=[self.__key(source, name) for name in
+                                    ('queue', 'leased', 'items', 'attempts', 'workers')],
+                              args=[time.time() + self.lease_time, n, self.worker])
+
+        return [(result[i], json.loads(result[i + 1])) for i in range(0, len(result), 2)]
+
+    def ack(self, source, url):
+        if self.__redis.zrem(self.__key(source, 'leased'), url):
+            self.__redis.sadd(self.__key(source, 'done'), url)
+
+    def nack(self, source, url):
+        self.__nack(keys=[self.__key(source, name) for name in ('queue', 'leased', 'workers', 'attempts', 'failed')],
+                    args=[url, self.max_attempts, self.worker])
+
+    def reclaim(self, source):
+        self.__reclaim(keys=[self.__key(source, name) for name in ('queue', 'leased', 'attempts', 'failed')],
+                       args=[time.time(), self.max_attempts])
+
+    def drained(self, source):
+        if self.__redis.get(self.__key(source, 'discovered')) != '1':
+            return False
+
+        return not self.__redis.llen(self.__key(source, 'queue')) and not self.__redis.zcard(self.__key(source, 'leased'))
+
+    def summary(self, source):
+        return {'queued': self.__redis.llen(self.__key(source, 'queue')),
+                'leased': self.__redis.zcard(self.__key(source, 'leased')),
+                'done': self.__redis.scard(self.__key(source, 'done')),
+                'failed': self.__redis.scard(self.__key(source, 'failed'))}
+
+    def reserve(self, host, interval):
+        return float(self.__reserve(keys=[f'{self.prefix}:host:{host}'], args=[time.time(), interval]))
+
+    def block(self, host, seconds):
+        self.__block(keys=[f'{self.prefix}:host:{host}'], args=[time.time() + seconds])
+
+    def close(self):
+        self.__redis.close()
+
+    def __key(self, source, name):
+        return f'{self.prefix}:{source}:{name}'
+
+
+class SourceQueue:
+    """
+    Work queue of one source, given to web scraper instead of discovering links itself
+    """
+
+    def __init__(self, queue, source, batch_size=8, poll_interval=2.0):
+        """
+        Creates the instance of work queue of the source
+        :param queue: Work queue (SQLiteQueue or RedisQueue)
+        :param source: Name of the source
+        :param batch_size: Number of tasks leased at once
+        :param poll_interval: Time in seconds between checks for new tasks when queue is empty
+        """
+        self.queue = queue
+        self.name = source
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+    def start(self, resume=False):
+        self.queue.start(self.name, resume)
+
+    def put(self, items, key=None):
+        """
+        Queues discovered items in batches while they are still being discovered
+        :param items: Items (links or any JSON-serializable objects), can be a generator
+        :param key: Function which returns URL for given item. If not provided, item itself is URL
+        :return: number of new tasks
+        """
+        batch, added = [], 0
+
+        for item in items:
+            batch.append((key(item) if key else item, item))
+
+            if len(batch) >= self.batch_size:
+                added += self.queue.put(self.name, batch)
+                batch = []
+
+        return added + (self.queue.put(self.name, batch) if batch else 0)
+
+    def finish(self):
+        self.queue.finish(self.name)
+
+    def items(self):
+        """
+        Leases tasks until all tasks of the source are completed. Tasks leased by this worker have to be acknowledged
+        or nacked, task of crashed worker is leased again when its lease expires
+        :return: generator of leased items
+        """
+        while True:
+            tasks = self.queue.lease(self.name, self.batch_size)
+
+            if tasks:
+                for _, item in tasks:
+                    yield item
+            elif self.queue.drained(self.name):
+                return
+            else:
+                time.sleep(self.poll_interval)
+
+    def ack(self, url):
+        """
+        Acknowledges completed task
+        :param url: URL of the task
+        :return: None
+        """
+        self.queue.ack(self.name, url)
+
+    def nack(self, url):
+        """
+        Releases task which failed, so it's retried or marked failed
+        :param url: URL of the task
+        :return: None
+        """
+        self.queue.nack(self.name, url)
+
+    def summary(self):
+        return self.queue.summary(self.name)
+
+
+def open_queue(location, **kwargs):
+    """
+    Opens work queue of distributed crawl
+    :param location: URL of Redis (redis://..) or path to SQLite file
+    :param kwargs: Additional keyword arguments for the queue
+    :return: SQLiteQueue or RedisQueue
+    """
+    if location.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisQueue(location, **kwargs)
+
+    return SQLiteQueue(location, **kwargs)